@@ -0,0 +1,53 @@
+"""
+Memory and build time per node for `Tensor` graphs vs `GraphStore`.
+
+    python benchmarks/graph_memory.py [num_nodes]
+"""
+import sys
+import time
+import tracemalloc
+
+from xpy.tensor.base import Tensor
+from xpy.tensor.graph_store import GraphStore
+from xpy.tensor.python_ast import build_ast
+
+
+def tensor_chain(n):
+    x = Tensor(shape=(8,))
+    y = x
+    for i in range(n):
+        y = Tensor.call(y, x, prim='add') if i % 2 else Tensor.call(y, prim='sum', params={'axis': 0, 'keepdims': True})
+    return y
+
+
+def store_chain(n):
+    s = GraphStore()
+    x = s.leaf((8,))
+    y = x
+    for i in range(n):
+        y = s.node('add', (y, x), shape=(8,)) if i % 2 else s.node('sum', (y,), {'axis': 0, 'keepdims': True}, (8,))
+    s.roots = (y,)
+    return s
+
+
+def measure(label, build, n):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    graph = build(n)
+    elapsed = time.perf_counter() - t0
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    build_ast(graph)
+    ast_time = time.perf_counter() - t0
+    print(f"{label:<12} {size / n:8.1f} B/node  build {elapsed * 1e6 / n:6.2f} us/node  "
+          f"build_ast {ast_time * 1e6 / n:6.2f} us/node")
+    return graph
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"{n} nodes")
+    measure("Tensor", tensor_chain, n)
+    measure("GraphStore", store_chain, n)
@@ -0,0 +1,84 @@
+import numpy as np
+
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward
+from xpy.tensor.base import Tensor
+from xpy.tensor.batching import batch_matmuls, sibling_groups
+from xpy.tensor.build_graph import topo_sort
+from xpy.tensor.cost import CostModel
+
+# dispatch dominates: stacking n operands costs about n dispatches, so a
+# group sharing one operand pays off from 5 members
+DISPATCH_BOUND = CostModel(dispatch=1e-3, flop_time=1e-15, byte_time=1e-15)
+
+
+def _prims(outputs):
+    return [n.prim for n in topo_sort(list(outputs)) if n.parents != ()]
+
+
+def _heads(n=8):
+    """Attention-style heads: per-head weights, a shared input."""
+    x = Tensor(shape=(5, 8))
+    Ws = [Tensor(shape=(8, 3)) for _ in range(n)]
+    return x, Ws, [F.tanh(x @ W) for W in Ws]
+
+
+def _values(x, Ws):
+    rng = np.random.default_rng(0)
+    return [rng.normal(size=x.shape)] + [rng.normal(size=W.shape) for W in Ws]
+
+
+def test_groups_are_independent_same_shape_matmuls():
+    x, Ws, outs = _heads()
+    chained = outs[0] @ Tensor(shape=(3, 3))  # depends on a head, another level
+    groups = sibling_groups(topo_sort(outs + [chained]))
+    assert len(groups) == 1 and len(groups[0]) == 8
+
+
+def test_batched_heads_match_unbatched():
+    x, Ws, outs = _heads()
+    batched = batch_matmuls(outs, model=DISPATCH_BOUND)
+    prims = _prims(batched)
+    assert prims.count("matmul") == 1 and prims.count("stack_operands") == 1
+    args = _values(x, Ws)
+    for got, want in zip(forward(batched, inputs=[x, *Ws])(*args), forward(outs, inputs=[x, *Ws])(*args)):
+        np.testing.assert_allclose(got, want, rtol=1e-12)
+
+
+def test_groups_on_consecutive_levels():
+    x, Ws, heads = _heads()
+    V = Tensor(shape=(3, 2))
+    outs = [h @ V for h in heads]
+    batched = batch_matmuls(outs, model=DISPATCH_BOUND)
+    assert _prims(batched).count("matmul") == 2
+
+    inputs = [x, *Ws, V]
+    args = _values(x, Ws) + [np.random.default_rng(1).normal(size=(3, 2))]
+    for got, want in zip(forward(batched, inputs=inputs)(*args), forward(outs, inputs=inputs)(*args)):
+        np.testing.assert_allclose(got, want, rtol=1e-12)
+
+
+def test_groups_stacking_both_operands_are_not_worth_it():
+    xs = [Tensor(shape=(4, 6)) for _ in range(8)]
+    Ws = [Tensor(shape=(6, 6)) for _ in range(8)]
+    outs = [x @ W for x, W in zip(xs, Ws)]
+    assert batch_matmuls(outs, model=DISPATCH_BOUND) == outs
+
+
+def test_identical_products_and_expensive_copies_are_left_alone():
+    x = Tensor(shape=(5, 8))
+    W = Tensor(shape=(8, 3))
+    same = [x @ W, x @ W]
+    assert _prims(batch_matmuls(same, model=DISPATCH_BOUND)).count("stack_operands") == 0
+
+    x, Ws, outs = _heads()
+    copy_bound = CostModel(dispatch=0.0, view_dispatch=0.0, flop_time=1e-15, byte_time=1e-9)
+    assert batch_matmuls(outs, model=copy_bound) == outs
+
+
+def test_forward_batch_matmuls_option():
+    x, Ws, outs = _heads()
+    args = _values(x, Ws)
+    got = forward(outs, inputs=[x, *Ws], batch_matmuls=True)(*args)
+    for g, w in zip(got, forward(outs, inputs=[x, *Ws])(*args)):
+        np.testing.assert_allclose(g, w, rtol=1e-12)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import xpy
+from xpy.tensor import functions as F
+
+
+def test_scan_cumulative_sum_and_carry():
+    @xpy.trace
+    def cumsum(xs):
+        return xpy.scan(lambda c, x: (c + x, c + x), xs[0] * 0.0, xs)
+
+    xs = np.arange(12.0).reshape(4, 3)
+    total, partial = cumsum(xs)
+    np.testing.assert_allclose(total, xs.sum(0))
+    np.testing.assert_allclose(partial, np.cumsum(xs, axis=0))
+
+
+def test_scan_with_tuples_captures_and_no_ys():
+    @xpy.trace
+    def rnn(h0, xs, W):
+        def step(carry, x):
+            h, n = carry
+            return (F.tanh(h @ W + x), n + 1.0), None
+        (h, n), ys = xpy.scan(step, (h0, h0[0] * 0.0), xs)
+        assert ys is None
+        return h, n
+
+    rng = np.random.default_rng(0)
+    h0, xs, W = rng.normal(size=3), rng.normal(size=(5, 3)), rng.normal(size=(3, 3))
+    h, n = rnn(h0, xs, W)
+    want = h0
+    for x in xs:
+        want = np.tanh(want @ W + x)
+    np.testing.assert_allclose(h, want)
+    assert float(n) == 5.0
+
+
+def test_scan_over_length_without_xs():
+    @xpy.trace
+    def powers(x):
+        return xpy.scan(lambda c, _: (c * 2.0, c), x, length=4)
+
+    final, ys = powers(np.ones(2))
+    np.testing.assert_allclose(final, [16.0, 16.0])
+    np.testing.assert_allclose(ys[:, 0], [1.0, 2.0, 4.0, 8.0])
+
+
+def test_scan_body_must_keep_the_carry():
+    with pytest.raises(ValueError, match="carry"):
+        xpy.trace(lambda xs: xpy.scan(lambda c, x: ((c, c), x), xs[0], xs))(np.ones((2, 2)))
+
+
+def test_while_loop_runs_data_dependent_trip_counts():
+    @xpy.trace
+    def doublings(x, limit):
+        def body(carry):
+            x, steps = carry
+            return x * 2.0, steps + 1
+        return xpy.while_loop(lambda c: F.less(c[0], limit), body, (x, limit * 0))
+
+    for start, want in ((100.0, 0), (3.0, 6), (0.1, 10)):
+        x, steps = doublings(np.array(start), np.array(100))
+        assert float(x) == start * 2 ** want and int(steps) == want
+    assert doublings.cache_info()["misses"] == 1
+
+
+def test_cond_runs_one_branch_with_captures():
+    @xpy.trace
+    def pick(p, x, y):
+        return xpy.cond(p, lambda a: a * y, lambda a: a - y, x)
+
+    x, y = np.arange(3.0), np.full(3, 2.0)
+    np.testing.assert_allclose(pick(np.array(True), x, y), x * y)
+    np.testing.assert_allclose(pick(np.array(False), x, y), x - y)
+
+
+def test_cond_branches_must_match():
+    with pytest.raises(ValueError, match="branches"):
+        xpy.trace(lambda p, x: xpy.cond(p, lambda a: (a, a), lambda a: a, x))(np.array(True), np.ones(2))
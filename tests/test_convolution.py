@@ -0,0 +1,96 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from xpy import convolution
+from xpy.convolution import conv, conv_params, conv_transpose
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward
+from xpy.tensor.base import Tensor
+
+CASES = [
+    # stride, padding, dilation
+    (1, 0, 1),
+    (2, 1, 1),
+    (1, 2, 2),
+    (3, 1, 2),
+]
+
+
+def naive_conv(x, w, stride, padding, dilation):
+    """Direct loop over output positions and kernel taps."""
+    nd = x.ndim - 2
+    stride, padding, dilation = conv_params(nd, stride, padding, dilation)
+    xp = np.pad(x, [(0, 0), (0, 0)] + list(padding))
+    kshape = w.shape[2:]
+    out_shape = [(xp.shape[2 + i] - dilation[i] * (kshape[i] - 1) - 1) // stride[i] + 1 for i in range(nd)]
+    out = np.zeros((x.shape[0], w.shape[0], *out_shape))
+    for o in itertools.product(*map(range, out_shape)):
+        for k in itertools.product(*map(range, kshape)):
+            tap = tuple(o[i] * stride[i] + k[i] * dilation[i] for i in range(nd))
+            out[(slice(None), slice(None)) + o] += xp[(slice(None), slice(None)) + tap] @ w[(slice(None), slice(None)) + k].T
+    return out
+
+
+@pytest.mark.parametrize("nd", [1, 2, 3])
+@pytest.mark.parametrize("channels", [2, 8])  # einsum and tensordot paths
+@pytest.mark.parametrize("stride, padding, dilation", CASES)
+def test_conv_matches_direct_loop(nd, channels, stride, padding, dilation):
+    rng = np.random.default_rng(nd)
+    x = rng.normal(size=(2, channels) + (9,) * nd)
+    w = rng.normal(size=(3, channels) + (3,) * nd)
+    got = conv(x, w, stride, padding, dilation)
+    want = naive_conv(x, w, stride, padding, dilation)
+    assert got.shape == want.shape
+    np.testing.assert_allclose(got, want, rtol=1e-10, atol=1e-10)
+
+
+def test_both_contraction_paths_agree(monkeypatch):
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(2, 4, 10, 10))
+    w = rng.normal(size=(5, 4, 3, 3))
+    small = conv(x, w, stride=2, padding=1)
+    monkeypatch.setattr(convolution, "SMALL_KERNEL_SIZE", 0)
+    np.testing.assert_allclose(conv(x, w, stride=2, padding=1), small, rtol=1e-12)
+
+
+def test_asymmetric_padding():
+    rng = np.random.default_rng(1)
+    x = rng.normal(size=(1, 2, 7, 6))
+    w = rng.normal(size=(2, 2, 2, 3))
+    padded = np.pad(x, [(0, 0), (0, 0), (0, 2), (1, 0)])
+    np.testing.assert_allclose(conv(x, w, padding=((0, 2), (1, 0))), conv(padded, w), rtol=1e-12)
+
+
+@pytest.mark.parametrize("nd", [1, 2])
+@pytest.mark.parametrize("stride, padding, dilation", CASES)
+def test_conv_transpose_is_the_adjoint_of_conv(nd, stride, padding, dilation):
+    rng = np.random.default_rng(2)
+    x = rng.normal(size=(2, 3) + (10,) * nd)
+    w = rng.normal(size=(4, 3) + (3,) * nd)
+    y = conv(x, w, stride, padding, dilation)
+    g = rng.normal(size=y.shape)
+    # output_padding restores the rows the strided conv dropped
+    extra = [x.shape[2 + i] - ((y.shape[2 + i] - 1) * stride - 2 * padding + dilation * 2 + 1) for i in range(nd)]
+    xt = conv_transpose(g, w, stride, padding, dilation, output_padding=extra)
+    assert xt.shape == x.shape
+    np.testing.assert_allclose(np.vdot(y, g), np.vdot(x, xt), rtol=1e-10)
+
+
+def test_channel_mismatch_raises():
+    with pytest.raises(ValueError, match="channel mismatch"):
+        conv(np.ones((1, 3, 5, 5)), np.ones((2, 4, 3, 3)))
+
+
+def test_graph_conv_infers_shapes_and_compiles():
+    x = Tensor(shape=(2, 3, 12, 12))
+    w = Tensor(shape=(4, 3, 3, 3))
+    y = F.conv(x, w, stride=2, padding=1)
+    z = F.conv_transpose(y, Tensor(shape=(4, 3, 3, 3)), stride=2, padding=1, output_padding=1)
+    assert y.shape == (2, 4, 6, 6)
+    assert z.shape == (2, 3, 12, 12)
+
+    rng = np.random.default_rng(3)
+    xv, wv = rng.normal(size=x.shape), rng.normal(size=w.shape)
+    np.testing.assert_allclose(forward(y, inputs=[x, w])(xv, wv), conv(xv, wv, stride=2, padding=1))
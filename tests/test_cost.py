@@ -0,0 +1,72 @@
+from xpy.base import (
+    elementwise_ops, linear_algebra_ops, reduction_ops, array_manip_ops,
+    optimization_ops, composite_ops,
+)
+from xpy.tensor import functions as F
+from xpy.tensor.base import Tensor
+from xpy.tensor.cost import _RULED, CostModel, choose_strategy, explain
+
+
+def test_every_primitive_has_a_cost_rule():
+    ops = elementwise_ops + linear_algebra_ops + reduction_ops + array_manip_ops + optimization_ops + composite_ops
+    assert sorted(set(ops) - _RULED) == []
+
+
+def _mlp(batch=64):
+    x = Tensor(shape=(batch, 32))
+    W = Tensor(shape=(32, 16))
+    return x, W, F.tanh(x @ W)
+
+
+def test_explain_counts_flops_bytes_and_peak_memory():
+    x, W, y = _mlp()
+    report = explain(y, CostModel(), itemsize=4)
+    matmul, tanh = report.rows
+    assert (matmul['prim'], tanh['prim']) == ('matmul', 'tanh')
+    assert matmul['flops'] == 2 * 64 * 16 * 32
+    assert matmul['bytes'] == (64 * 32 + 32 * 16 + 64 * 16) * 4
+    assert tanh['flops'] == 10 * 64 * 16
+    assert report.total_flops == matmul['flops'] + tanh['flops']
+    # x, W and x @ W are live while x @ W is computed
+    assert report.peak_bytes == (64 * 32 + 32 * 16 + 64 * 16) * 4
+    assert "matmul" in str(report) and "peak live memory" in str(report)
+
+
+def test_explain_unknown_shapes():
+    x = Tensor(shape=None)
+    report = explain(F.exp(x))
+    assert report.total_time is None and report.peak_bytes is None
+    assert "?" in str(report)
+
+
+def test_cost_model_save_and_load(tmp_path):
+    model = CostModel(flop_time=1e-9, workers=3)
+    path = str(tmp_path / "cost.json")
+    model.save(path)
+    assert CostModel.load(path).as_dict() == model.as_dict()
+    assert CostModel.load(str(tmp_path / "missing.json")).as_dict() == CostModel().as_dict()
+
+
+def test_choose_strategy_straight_for_small_graphs():
+    x, W, y = _mlp(batch=8)
+    strategy, estimates = choose_strategy(y, [x, W], model=CostModel(workers=4))
+    assert strategy == 'straight'
+    assert set(estimates) == {'straight', 'threads', 'processes'}
+
+
+def test_choose_strategy_splits_heavy_graphs():
+    x, W, y = _mlp(batch=1 << 16)
+    cheap_dispatch = CostModel(flop_time=1e-9, workers=4, thread_overhead=0.0, process_overhead=0.0)
+    strategy, estimates = choose_strategy(y, [x, W], model=cheap_dispatch)
+    assert strategy in ('threads', 'processes')
+    assert estimates[strategy] < estimates['straight']
+
+
+def test_choose_strategy_never_shards_cross_row_graphs():
+    x, W, y = _mlp(batch=1 << 16)
+    model = CostModel(flop_time=1e-9, workers=4, thread_overhead=0.0, process_overhead=0.0)
+    strategy, estimates = choose_strategy(y - F.mean(y, axis=0), [x, W], model=model)
+    assert strategy == 'straight' and set(estimates) == {'straight'}
+    # an unknown batch size can't be split either
+    x, W, y = _mlp(batch=None)
+    assert choose_strategy(y, [x, W], model=model)[0] == 'straight'
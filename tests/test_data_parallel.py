@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from xpy.tensor.base import Tensor
+from xpy.tensor import functions as F
+from xpy.tensor.data_parallel import DataParallel, ThreadParallel, WorkerPool, cross_shard_node
+
+
+@pytest.fixture(scope="module")
+def pool():
+    p = WorkerPool(2)
+    yield p
+    p.close()
+
+
+def _x():
+    return Tensor(shape=(8, 3), name="x")
+
+
+def test_batch_reduction_feeding_later_op_is_rejected(pool):
+    x = _x()
+    mean = F.mean(x, axis=0, keepdims=True)
+    g = F.subtract(x, mean)
+    assert cross_shard_node([g], [x]) is mean
+    with pytest.raises(ValueError, match="mean"):
+        ThreadParallel(g, [x], num_workers=2)
+    with pytest.raises(ValueError, match="mean"):
+        DataParallel(g, [x], pool=pool)
+
+
+def test_full_reduction_feeding_later_op_is_rejected():
+    x = _x()
+    out = F.multiply(F.sum(x), 2.0)
+    with pytest.raises(ValueError, match="sum"):
+        ThreadParallel(out, [x], num_workers=2)
+
+
+def test_reduction_of_tainted_node_is_rejected():
+    x = _x()
+    centered = F.subtract(x, F.mean(x, axis=0, keepdims=True))
+    with pytest.raises(ValueError):
+        ThreadParallel(F.sum(centered, axis=0), [x], num_workers=2)
+
+
+def test_shardable_graphs_match_dense(pool):
+    x = _x()
+    y = F.exp(x)
+    outputs = [F.sum(y, axis=0), F.mean(y), F.max(y, axis=0), F.sum(y, axis=1)]
+    data = np.random.default_rng(0).standard_normal((8, 3))
+    expected = [np.exp(data).sum(0), np.exp(data).mean(), np.exp(data).max(0), np.exp(data).sum(1)]
+    with ThreadParallel(outputs, [x], num_workers=2) as run:
+        for got, want in zip(run(data), expected):
+            np.testing.assert_allclose(got, want)
+    with DataParallel(outputs, [x], pool=pool) as run:
+        for got, want in zip(run(data), expected):
+            np.testing.assert_allclose(got, want)
+
+
+@pytest.mark.parametrize("build", [
+    lambda x: F.subtract(x, x[0]),
+    lambda x: F.matmul(x, x.T),
+    lambda x: F.matmul(x.T, x),
+    lambda x: x.reshape(24),
+    lambda x: F.broadcast_to(x, (2, 8, 3)),
+], ids=["row0", "x_xT", "xT_x", "reshape", "broadcast_to"])
+def test_ops_reading_other_rows_are_rejected(build, pool):
+    x = _x()
+    out = build(x)
+    with pytest.raises(ValueError, match="mixes rows"):
+        ThreadParallel(out, [x], num_workers=2)
+    with pytest.raises(ValueError, match="mixes rows"):
+        DataParallel(out, [x], pool=pool)
+
+
+def test_row_local_ops_match_dense(pool):
+    x = _x()
+    w = Tensor(shape=(3, 5), name="w")
+    outputs = [F.matmul(x, w), x[:, 1], F.add(x, F.sum(w, axis=1)), x.reshape(-1, 3, 1)]
+    data = np.random.default_rng(1).standard_normal((8, 3))
+    weights = np.random.default_rng(2).standard_normal((3, 5))
+    expected = [data @ weights, data[:, 1], data + weights.sum(1), data.reshape(-1, 3, 1)]
+    with ThreadParallel(outputs, [x, w], num_workers=2) as run:
+        for got, want in zip(run(data, weights), expected):
+            np.testing.assert_allclose(got, want)
+    with DataParallel(outputs, [x, w], pool=pool) as run:
+        for got, want in zip(run(data, weights), expected):
+            np.testing.assert_allclose(got, want)
@@ -0,0 +1,92 @@
+import ast
+
+import numpy as np
+import pytest
+
+import xpy
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward
+from xpy.tensor.base import Tensor
+from xpy.tensor.python_ast import build_ast
+
+
+def _outs(module: ast.Module):
+    """Argument names passed as `out=` in the generated code."""
+    return [k.value.id for n in ast.walk(module) if isinstance(n, ast.Call) for k in n.keywords if k.arg == "out"]
+
+
+def test_forward_writes_into_the_donated_buffer():
+    x = Tensor(shape=(4,))
+    f = forward(F.exp(x) + 1.0, inputs=[x], donate=[0], dtypes=[np.float64])
+    a = np.arange(4.0)
+    want = np.exp(a) + 1.0
+    out = f(a)
+    assert out is a
+    np.testing.assert_allclose(out, want)
+
+
+def test_result_dtype_must_match_the_buffer():
+    x = Tensor(shape=(4,))
+    f = forward(x * 0.5, inputs=[x], donate=[0], dtypes=[np.int64])
+    a = np.arange(4)
+    out = f(a)
+    assert out is not a and out.dtype == np.float64
+    np.testing.assert_array_equal(a, np.arange(4))
+
+
+def test_donation_needs_dtypes():
+    x = Tensor(shape=(4,))
+    with pytest.raises(ValueError, match="dtypes"):
+        forward(x * 2.0, inputs=[x], donate=[0])
+
+
+@pytest.mark.parametrize("kwds", [{"strategy": "tiered"}, {"strategy": "threads"}, {"incremental": True}])
+def test_strategies_that_cant_donate_raise(kwds):
+    x = Tensor(shape=(4,))
+    with pytest.raises(ValueError, match="donate"):
+        forward(x * 2.0, inputs=[x], donate=[0], dtypes=[np.float64], **kwds)
+
+
+def test_no_output_overwrites_an_input_still_read_later():
+    x = Tensor(shape=(3,))
+    a = F.exp(x)
+    b = a + x  # reads x after a is computed
+    module = build_ast([a, b], inputs=[x], donate=[x], dtypes={x: np.dtype(np.float64)})
+    assert _outs(module) == [module.body[0].args.args[0].arg]
+    f = forward([a, b], inputs=[x], donate=[0], dtypes=[np.float64])
+    v = np.array([0.0, 1.0, 2.0])
+    want = (np.exp(v), np.exp(v) + v)
+    got = f(v)
+    np.testing.assert_allclose(got[0], want[0])
+    np.testing.assert_allclose(got[1], want[1])
+    assert got[1] is v
+
+
+def test_views_of_the_donated_input_block_it_until_last_read():
+    x = Tensor(shape=(3, 3))
+    y = F.exp(x) + x.T  # x.T aliases x and is read by the last node
+    f = forward(y, inputs=[x], donate=[0], dtypes=[np.float64])
+    v = np.arange(9.0).reshape(3, 3)
+    want = np.exp(v) + v.T
+    np.testing.assert_allclose(f(v.copy()), want)
+
+
+def test_returned_inputs_and_shape_changes_are_not_donated():
+    x = Tensor(shape=(3,))
+    module = build_ast([F.exp(x), x], inputs=[x], donate=[x], dtypes={x: np.dtype(np.float64)})
+    assert _outs(module) == []
+    module = build_ast([F.sum(x)], inputs=[x], donate=[x], dtypes={x: np.dtype(np.float64)})
+    assert _outs(module) == []
+
+
+def test_trace_donates_by_argument_position():
+    @xpy.trace(donate=(0,))
+    def step(x, g):
+        return x - 0.1 * g
+
+    x, g = np.ones(3), np.full(3, 2.0)
+    assert step(x, g) is x
+    np.testing.assert_allclose(x, np.full(3, 0.8))
+    xi = np.ones(3, dtype=np.int64)
+    out = step(xi, g)
+    assert out is not xi and out.dtype == np.float64
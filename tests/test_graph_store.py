@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward, load
+from xpy.tensor.base import Tensor
+from xpy.tensor.build_graph import topo_sort
+from xpy.tensor.graph_store import GraphStore
+from xpy.tensor.python_ast import build_ast
+
+
+@pytest.mark.parametrize("a, b", [
+    ({"axis": 0}, {"axis": False}),
+    ({"axis": 1}, {"axis": True}),
+    ({"axis": 1}, {"axis": 1.0}),
+    ({"index": [0, 1]}, {"index": (0, 1)}),
+])
+def test_equal_but_distinct_params_are_not_merged(a, b):
+    store = GraphStore()
+    x = store.leaf((4, 4))
+    na = store.node("sum", [x], a)
+    nb = store.node("sum", [x], b)
+    (key,) = a
+    assert store.param_ids[na] != store.param_ids[nb]
+    assert type(store.params(na)[key]) is type(a[key])
+    assert type(store.params(nb)[key]) is type(b[key])
+
+
+def test_identical_params_are_interned():
+    store = GraphStore()
+    x = store.leaf((4, 4))
+    na = store.node("sum", [x], {"axis": (0, 1), "keepdims": True})
+    nb = store.node("sum", [x], {"keepdims": True, "axis": (0, 1)})
+    assert store.param_ids[na] == store.param_ids[nb]
+
+
+def _tensor_graph():
+    x = Tensor(shape=(4, 3))
+    w = Tensor(shape=(3, 2))
+    h = F.tanh(x @ w)
+    return [x, w], [F.sum(h, axis=0), h * 2.0]
+
+
+def test_from_tensors_keeps_structure():
+    (x, w), outs = _tensor_graph()
+    store = GraphStore.from_tensors(outs)
+    order = topo_sort(outs)
+    assert len(store) == len(order)
+    ids = {n: i for i, n in enumerate(order)}
+    for n in order:
+        nid = ids[n]
+        assert store.shape(nid) == tuple(n.shape)
+        if n.parents == ():
+            assert store.is_leaf(nid) and store.prim(nid) is None
+        else:
+            assert store.prim(nid) == n.prim
+            assert list(store.parents(nid)) == [ids[p] for p in n.parents]
+            assert store.params(nid) == n.params
+    assert store.roots == tuple(ids[r] for r in outs)
+    assert [store.shape(i) for i in store.leaves] == [(4, 3), (3, 2), ()]
+    assert store.values == {store.leaves[2]: 2.0}
+
+
+def test_compiled_store_matches_tensor_graph():
+    inputs, outs = _tensor_graph()
+    store = GraphStore.from_tensors(outs)
+    consts = list(store.values)
+    module = build_ast(store, name="from_store", consts=consts)
+    f = load(module, "from_store", [store.values[c] for c in consts], instrument=False)
+    rng = np.random.default_rng(0)
+    xv, wv = rng.normal(size=(4, 3)), rng.normal(size=(3, 2))
+    for got, want in zip(f(xv, wv), forward(outs, inputs=inputs)(xv, wv)):
+        np.testing.assert_allclose(got, want)
+
+
+def test_topo_order_prunes_and_stops():
+    store = GraphStore()
+    x = store.leaf((3,))
+    y = store.leaf((3,))
+    a = store.node("exp", [x], shape=(3,))
+    store.node("log", [y], shape=(3,))  # unreachable from the roots
+    b = store.node("add", [a, y], shape=(3,))
+    store.roots = (b,)
+    assert store.topo_order() == [x, y, a, b]
+    assert store.topo_order(stop=[a]) == [y, a, b]
+
+
+def test_parents_must_exist():
+    store = GraphStore()
+    x = store.leaf((3,))
+    with pytest.raises(IndexError):
+        store.node("add", [x, 5])
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward
+from xpy.tensor.base import Tensor
+from xpy.tensor.incremental import IncrementalCompiler
+
+STEPS = [
+    lambda h, x: F.tanh(h),
+    lambda h, x: h * 0.5 + x,
+    lambda h, x: F.sin(h),
+    lambda h, x: F.clip(h, -0.9, 0.9),
+    lambda h, x: h - F.cos(x),
+    lambda h, x: F.maximum(h, x * 0.1),
+    lambda h, x: F.exp(h * 0.1),
+]
+
+
+def _chain(length=240, edit=None):
+    """A long chain of elementwise steps; `edit` replaces one step with another prim."""
+    x = Tensor(shape=(5,))
+    h = x
+    for i in range(length):
+        h = F.arctan(h) if i == edit else STEPS[i % len(STEPS)](h, x)
+    return x, h
+
+
+def test_matches_straight_compile():
+    x, y = _chain()
+    v = np.linspace(-1, 1, 5)
+    f = IncrementalCompiler().compile(y, [x])
+    np.testing.assert_allclose(f(v), forward(y, inputs=[x])(v), rtol=1e-12)
+
+
+def test_identical_graph_reuses_every_fragment():
+    compiler = IncrementalCompiler()
+    x, y = _chain()
+    compiler.compile(y, [x])
+    first = dict(compiler.stats)
+    assert first['fragments'] > 1 and first['compiled'] >= 1
+    x, y = _chain()
+    compiler.compile(y, [x])
+    assert compiler.stats == {'fragments': first['fragments'], 'reused': first['fragments'], 'compiled': 0}
+
+
+def test_an_edit_recompiles_only_nearby_fragments():
+    compiler = IncrementalCompiler()
+    x, y = _chain()
+    compiler.compile(y, [x])
+    x, edited = _chain(edit=120)
+    f = compiler.compile(edited, [x])
+    assert 1 <= compiler.stats['compiled'] <= 2
+    assert compiler.stats['reused'] >= compiler.stats['fragments'] - 2
+    v = np.linspace(-1, 1, 5)
+    np.testing.assert_allclose(f(v), forward(edited, inputs=[x])(v), rtol=1e-12)
+
+
+def test_params_of_equal_value_but_different_type_are_not_shared():
+    compiler = IncrementalCompiler(fragment_size=1)
+    x = Tensor(shape=(3, 4))
+    compiler.compile(F.sum(x, axis=0), [x])
+    compiler.compile(F.sum(x, axis=False), [x])
+    assert compiler.stats['compiled'] == 1
+
+
+def test_constants_multiple_outputs_and_arity():
+    x = Tensor(shape=(3,))
+    w = Tensor.const(np.array([1.0, 2.0, 3.0]))
+    f = IncrementalCompiler().compile([x * w, F.exp(x)], [x])
+    a, b = f(np.ones(3))
+    np.testing.assert_allclose(a, [1.0, 2.0, 3.0])
+    np.testing.assert_allclose(b, np.full(3, np.e))
+    with pytest.raises(TypeError, match="expected 1 arguments"):
+        f()
+
+
+def test_cache_is_bounded():
+    compiler = IncrementalCompiler(fragment_size=4, max_fragments=8)
+    for n in range(3):
+        x, y = _chain(length=60, edit=n * 20)
+        compiler.compile(y, [x])
+    assert len(compiler.cache) <= 8
+
+
+def test_forward_incremental_option():
+    x, y = _chain(length=30)
+    v = np.linspace(-1, 1, 5)
+    np.testing.assert_allclose(forward(y, inputs=[x], incremental=True)(v), forward(y, inputs=[x])(v), rtol=1e-12)
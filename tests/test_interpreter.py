@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+import xpy
+from xpy import metrics
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward
+from xpy.tensor.base import Tensor
+from xpy.tensor.interpreter import Tiered, flatten
+
+
+def _graph():
+    x = Tensor(shape=(4, 3))
+    W = Tensor(shape=(3, 2))
+    h = F.tanh(x @ W)
+    return [x, W], [F.sum(h, axis=0), h * 2.0]
+
+
+def _args():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(4, 3)), rng.normal(size=(3, 2))
+
+
+def test_program_matches_compiled_code():
+    inputs, outs = _graph()
+    prog = flatten(outs, inputs)
+    assert len(prog) == 4  # matmul, tanh, sum, multiply
+    for got, want in zip(prog(*_args()), forward(outs, inputs=inputs)(*_args())):
+        np.testing.assert_allclose(got, want)
+
+
+def test_program_releases_temporaries_and_checks_arity():
+    inputs, outs = _graph()
+    prog = flatten(outs, inputs)
+    # x @ W is read only by tanh, tanh by both outputs
+    assert any(prog.dead)
+    assert all(s not in prog.outputs for d in prog.dead for s in d)
+    with pytest.raises(TypeError, match="2 arguments"):
+        prog(np.ones((4, 3)))
+
+
+def test_program_runs_subgraphs():
+    @xpy.trace
+    def body(xs):
+        return xpy.scan(lambda c, x: (c + x, c * x), xs[0] * 0.0, xs)
+
+    xs = np.arange(1.0, 7.0).reshape(3, 2)
+    inputs, outputs, _ = body.graph(xs)
+    for got, want in zip(flatten(outputs, inputs)(xs), body(xs)):
+        np.testing.assert_allclose(got, want)
+
+
+def test_tiered_promotes_after_threshold():
+    inputs, outs = _graph()
+    metrics.registry.functions.pop("tiered_test", None)
+    runner = Tiered(outs, inputs, name="tiered_test", threshold=3)
+    want = forward(outs, inputs=inputs)(*_args())
+    for call in range(1, 6):
+        for got, w in zip(runner(*_args()), want):
+            np.testing.assert_allclose(got, w)
+        assert runner.tier == ("interpreted" if call <= 3 else "compiled")
+    assert runner.program is None
+    assert metrics.snapshot("tiered_test")["calls"] == 5
+    assert metrics.snapshot("tiered_test")["compiles"] == 1
+
+
+def test_threshold_zero_compiles_on_first_call():
+    inputs, outs = _graph()
+    runner = Tiered(outs, inputs, threshold=0)
+    runner(*_args())
+    assert runner.tier == "compiled"
+
+
+def test_forward_tiered_strategy():
+    inputs, outs = _graph()
+    runner = forward(outs, inputs=inputs, strategy="tiered")
+    assert isinstance(runner, Tiered) and runner.tier == "interpreted"
+    for got, want in zip(runner(*_args()), forward(outs, inputs=inputs)(*_args())):
+        np.testing.assert_allclose(got, want)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward
+from xpy.tensor.base import Tensor
+from xpy.tensor.build_graph import topo_sort
+from xpy.tensor.layout import _Planner, plan_layout
+
+VIEWS = [
+    ("transpose", lambda x: F.transpose(x), lambda a: a.T),
+    ("transpose axes", lambda x: F.transpose(x, axes=(1, 0, 2)), lambda a: a.transpose(1, 0, 2)),
+    ("reshape view", lambda x: F.reshape(x, shape=(4, 15)), lambda a: a.reshape(4, 15)),
+    ("reshape of slice", lambda x: F.reshape(x[:, 1:3], shape=(8, 5)), lambda a: a[:, 1:3].reshape(8, 5)),
+    ("reshape copies", lambda x: F.reshape(F.transpose(x), shape=(60,)), lambda a: a.T.reshape(60)),
+    ("expand_dims", lambda x: F.expand_dims(x, axis=1), lambda a: np.expand_dims(a, 1)),
+    ("squeeze", lambda x: F.squeeze(x[:, :1], axis=1), lambda a: a[:, :1].squeeze(1)),
+    ("broadcast_to", lambda x: F.broadcast_to(x, shape=(2, 4, 3, 5)), lambda a: np.broadcast_to(a, (2, 4, 3, 5))),
+    ("getitem", lambda x: x[1:, ::2, None, -1], lambda a: a[1:, ::2, None, -1]),
+]
+
+
+@pytest.mark.parametrize("name, build, numpy_view", VIEWS, ids=[v[0] for v in VIEWS])
+def test_strides_follow_numpy(name, build, numpy_view):
+    x = Tensor(shape=(4, 3, 5))
+    node = build(x)
+    a = numpy_view(np.empty((4, 3, 5)))
+    got = _Planner().stride_of(node)
+    assert len(got) == a.ndim
+    # the stride of a length-1 axis is arbitrary
+    assert [s for s, n in zip(got, a.shape) if n != 1] == [s // a.itemsize for s, n in zip(a.strides, a.shape) if n != 1]
+
+
+def _prims(outputs):
+    return [n.prim for n in topo_sort(list(outputs)) if n.parents != ()]
+
+
+def test_strided_matmul_operand_is_copied_once():
+    x = Tensor(shape=(6, 8))
+    W = Tensor(shape=(4, 5))
+    xs = x[:, ::2]
+    out = plan_layout([xs @ W, F.exp(xs @ W)])
+    assert _prims(out).count("ascontiguousarray") == 1
+
+    rng = np.random.default_rng(0)
+    xv, Wv = rng.normal(size=(6, 8)), rng.normal(size=(4, 5))
+    got = forward(out, inputs=[x, W])(xv, Wv)
+    np.testing.assert_allclose(got[0], xv[:, ::2] @ Wv)
+    np.testing.assert_allclose(got[1], np.exp(xv[:, ::2] @ Wv))
+
+
+def test_copy_is_placed_at_the_smallest_array():
+    x = Tensor(shape=(100, 6))
+    W = Tensor(shape=(3, 2))
+    out = plan_layout(x[:2, ::2] @ W)
+    copy = next(n for n in topo_sort([out]) if n.prim == "ascontiguousarray")
+    assert copy.shape == (2, 3)
+
+
+def test_blas_ready_operands_are_left_alone():
+    x = Tensor(shape=(6, 8))
+    W = Tensor(shape=(6, 5))
+    y = F.transpose(x) @ W  # column-major is fine for BLAS
+    assert plan_layout(y) is y
+
+
+def test_explicit_broadcast_is_bypassed():
+    x = Tensor(shape=(4, 3))
+    b = Tensor(shape=(3,))
+    y = plan_layout(x + F.broadcast_to(b, shape=(4, 3)))
+    assert "broadcast_to" not in _prims([y])
+    assert y.parents[1] is b
+
+    xv, bv = np.ones((4, 3)), np.arange(3.0)
+    np.testing.assert_allclose(forward(y, inputs=[x, b])(xv, bv), xv + bv)
+
+
+def test_forward_with_layout_matches_without():
+    x = Tensor(shape=(8, 12))
+    W = Tensor(shape=(4, 3))
+    y = F.tanh(F.reshape(F.transpose(x)[::3], shape=(8, 4)) @ W)
+    rng = np.random.default_rng(1)
+    xv, Wv = rng.normal(size=(8, 12)), rng.normal(size=(4, 3))
+    np.testing.assert_allclose(
+        forward(y, inputs=[x, W], layout=True)(xv, Wv),
+        forward(y, inputs=[x, W])(xv, Wv),
+    )
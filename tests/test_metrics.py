@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+import xpy
+from xpy import metrics
+from xpy.metrics import MetricsRegistry
+from xpy.tensor import functions as F
+from xpy.tensor.api import DEFAULT_NAME, forward
+from xpy.tensor.base import Tensor
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A fresh, enabled registry in place of the process-wide one."""
+    fresh = MetricsRegistry(enabled=True)
+    monkeypatch.setattr(metrics, "registry", fresh)
+    return fresh
+
+
+def test_calls_latency_and_output_bytes(registry):
+    x = Tensor(shape=(4,))
+    f = forward(F.exp(x), inputs=[x], name="exp4")
+    for _ in range(3):
+        f(np.zeros(4))
+    snap = metrics.snapshot("exp4")
+    assert snap["calls"] == 3
+    assert snap["compiles"] == 1 and snap["compile_seconds"] > 0
+    assert snap["output_bytes"] == 3 * 4 * 8
+    assert 0 < snap["quantiles"][0.5] <= snap["quantiles"][0.99]
+    assert f.__wrapped__ is not None and f.metrics is registry.get("exp4")
+
+
+def test_returned_arguments_are_not_counted(registry):
+    f = registry.instrument(lambda a, b: (a, b + 1), "passthrough")
+    f(np.zeros(4), np.zeros(2))
+    assert registry.get("passthrough").output_bytes == 2 * 8
+
+
+def test_unnamed_compiles_share_one_series(registry):
+    x = Tensor(shape=(2,))
+    for _ in range(5):
+        forward(x * 2.0, inputs=[x])(np.ones(2))
+    assert list(registry.functions) == [DEFAULT_NAME]
+    assert registry.get(DEFAULT_NAME).compiles == 5
+
+
+def test_trace_cache_hits_and_misses(registry):
+    @xpy.trace
+    def scaled(x):
+        return x * 3.0
+
+    scaled(np.ones(2))
+    scaled(np.ones(2))
+    scaled(np.ones(3))
+    snap = metrics.snapshot("scaled")
+    assert (snap["cache_hits"], snap["cache_misses"], snap["calls"]) == (1, 2, 3)
+
+
+def test_latency_window_is_bounded(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "WINDOW", 8)
+    m = registry.get("window")
+    for i in range(20):
+        m.record_call(float(i), 0)
+    assert len(m._window) == 8 and min(m._window) == 12.0
+    assert m.calls == 20 and m.seconds == sum(range(20))
+
+
+def test_disabled_registry_returns_the_function():
+    assert MetricsRegistry(enabled=False).instrument(np.exp, "off") is np.exp
+
+
+def test_prometheus_exposition(registry, tmp_path):
+    f = registry.instrument(lambda a: a * 2, 'quote"d\nname')
+    f(np.zeros(3))
+    text = registry.prometheus()
+    lines = text.splitlines()
+    assert "# TYPE xpy_call_seconds summary" in lines
+    assert "# TYPE xpy_output_bytes_total counter" in lines
+    assert 'xpy_output_bytes_total{function="quote\\"d\\nname"} 24' in lines
+    assert 'xpy_call_seconds_count{function="quote\\"d\\nname"} 1' in lines
+    assert any(line.startswith('xpy_call_seconds{function="quote\\"d\\nname",quantile="0.99"} ') for line in lines)
+    assert text.endswith("\n")
+
+    path = tmp_path / "metrics" / "xpy.prom"
+    registry.dump_prometheus(str(path))
+    assert path.read_text() == text
+    assert [p.name for p in path.parent.iterdir()] == ["xpy.prom"]
+
+
+def test_runners_count_each_call_once(registry):
+    x = Tensor(shape=(8, 2))
+    runner = forward(F.exp(x), inputs=[x], strategy="threads", name="threaded")
+    try:
+        runner(np.zeros((8, 2)))
+        runner(np.zeros((8, 2)))
+    finally:
+        runner.close()
+    snap = metrics.snapshot("threaded")
+    assert snap["calls"] == 2
+    assert snap["output_bytes"] == 2 * 8 * 2 * 8
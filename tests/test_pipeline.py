@@ -0,0 +1,94 @@
+import threading
+
+import numpy as np
+import pytest
+
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward
+from xpy.tensor.base import Tensor
+from xpy.tensor.pipeline import Stream, stream
+
+
+def _batches(n, shape=(4, 3)):
+    return [np.full(shape, i, dtype=np.float64) for i in range(n)]
+
+
+@pytest.mark.parametrize("depth", [1, 2, 4])
+def test_outputs_come_in_batch_order(depth):
+    x = Tensor(shape=(4, 3))
+    f = forward(F.sum(x * 2.0, axis=1), inputs=[x])
+    outs = list(stream(f, _batches(20), depth=depth))
+    assert len(outs) == 20
+    for i, out in enumerate(outs):
+        np.testing.assert_array_equal(out, np.full(4, 6.0 * i))
+
+
+def test_outputs_aliasing_a_buffer_survive_later_batches():
+    outs = list(stream(lambda a, b: (a, b[1:], a + b), zip(_batches(6), _batches(6)), depth=1))
+    for i, (a, b_tail, s) in enumerate(outs):
+        np.testing.assert_array_equal(a, np.full((4, 3), i))
+        np.testing.assert_array_equal(b_tail, np.full((3, 3), i))
+        np.testing.assert_array_equal(s, np.full((4, 3), 2 * i))
+
+
+def test_dtype_conversion_per_argument():
+    seen = []
+    batches = [(np.arange(3), np.arange(3)) for _ in range(2)]
+    for _ in stream(lambda a, b: seen.append((a.dtype, b.dtype)), batches, dtype=[np.float32, None]):
+        pass
+    assert seen == [(np.float32, np.dtype(np.int64))] * 2
+
+
+def test_producer_stays_at_most_depth_ahead():
+    produced = []
+    consumed = []
+    lead = []
+
+    def source():
+        for i in range(12):
+            produced.append(i)
+            yield np.array([i])
+
+    def fn(a):
+        consumed.append(int(a[0]))
+        # prepared batches not yet consumed, including the one in use
+        lead.append(len(produced) - len(consumed))
+        return a
+
+    list(Stream(fn, source(), depth=2))
+    assert consumed == list(range(12))
+    assert max(lead) <= 2 + 2
+
+
+def test_producer_errors_are_raised_in_order():
+    def source():
+        yield np.zeros(2)
+        raise RuntimeError("bad batch")
+
+    it = iter(stream(lambda a: a + 1, source()))
+    np.testing.assert_array_equal(next(it), np.ones(2))
+    with pytest.raises(RuntimeError, match="bad batch"):
+        next(it)
+
+
+def test_stopping_early_releases_the_producer():
+    before = set(threading.enumerate())
+    s = stream(lambda a: a, (np.zeros(2) for _ in range(1000)), depth=1)
+    for i, _ in enumerate(s):
+        if i == 2:
+            break
+    started = [t for t in threading.enumerate() if t not in before]
+    for t in started:
+        t.join(timeout=5)
+    assert not any(t.is_alive() for t in started)
+    assert s.stats.batches == 3
+
+
+def test_stats_and_depth_validation():
+    s = stream(lambda a: a * 2, _batches(5))
+    list(s)
+    assert s.stats.batches == 5
+    assert 0.0 <= s.stats.stall_fraction <= 1.0
+    assert s.stats.as_dict()["batches"] == 5
+    with pytest.raises(ValueError):
+        Stream(lambda a: a, [], depth=0)
@@ -0,0 +1,68 @@
+import json
+import os
+import stat
+
+import pytest
+
+from xpy import python_packages
+
+
+@pytest.fixture
+def fake_env(tmp_path, monkeypatch):
+    """A PATH whose only nvidia-smi prints the lines of `gpus.txt`, and a private probe cache."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    gpus = tmp_path / "gpus.txt"
+    gpus.write_text("535.104.05\n535.104.05\n")
+    smi = bin_dir / "nvidia-smi"
+    smi.write_text(f"#!/bin/sh\ncat '{gpus}'\n")
+    smi.chmod(smi.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("XPY_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("XPY_PROBE_TTL", raising=False)
+    monkeypatch.setattr(python_packages, "_probe", None)
+    return gpus
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the fake nvidia-smi is a shell script")
+def test_probe_reads_nvidia_smi_and_writes_the_cache(fake_env):
+    env = python_packages.probe_environment()
+    assert env["driver_version"] == "535.104.05"
+    assert env["cuda_version"] == "12.2"
+    assert env["device_count"] == 2
+    path = python_packages.probe_cache_path()
+    assert os.path.dirname(path) == os.environ["XPY_CACHE_DIR"]
+    with open(path) as f:
+        assert json.load(f)["device_count"] == 2
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the fake nvidia-smi is a shell script")
+def test_probe_cache_ttl_and_refresh(fake_env, monkeypatch):
+    assert python_packages.probe_environment()["device_count"] == 2
+    fake_env.write_text("535.104.05\n")
+
+    # fresh entries are served from memory, then from the file in a new process
+    assert python_packages.probe_environment()["device_count"] == 2
+    monkeypatch.setattr(python_packages, "_probe", None)
+    assert python_packages.probe_environment()["device_count"] == 2
+
+    assert python_packages.probe_environment(refresh=True)["device_count"] == 1
+    fake_env.write_text("")
+    monkeypatch.setattr(python_packages, "_probe", None)
+    assert python_packages.probe_environment()["device_count"] == 1
+    assert python_packages.probe_environment(ttl=0)["device_count"] == 0
+    monkeypatch.setenv("XPY_PROBE_TTL", "0")
+    fake_env.write_text("535.104.05\n535.104.05\n535.104.05\n")
+    assert python_packages.probe_environment()["device_count"] == 3
+
+
+def test_probe_finds_any_cupy_distribution(tmp_path, monkeypatch):
+    site = tmp_path / "site"
+    (site / "cupy").mkdir(parents=True)
+    (site / "cupy" / "__init__.py").write_text("")
+    info = site / "cupy_rocm_5_0-13.0.0.dist-info"
+    info.mkdir()
+    (info / "METADATA").write_text("Metadata-Version: 2.1\nName: cupy-rocm-5-0\nVersion: 13.0.0\n")
+    (info / "top_level.txt").write_text("cupy\n")
+    monkeypatch.syspath_prepend(str(site))
+    assert python_packages._cupy_version() == "13.0.0"
@@ -0,0 +1,59 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from xpy import reductions
+from xpy.reductions import REDUCTIONS
+
+
+@pytest.fixture
+def blocked(monkeypatch):
+    """Force the blocked, thread-parallel path on small inputs."""
+    monkeypatch.setattr(reductions, "PARALLEL_MIN_SIZE", 16)
+    monkeypatch.setattr(reductions, "_workers", 4)
+
+
+@pytest.mark.parametrize("name", ["sum", "prod", "max", "min", "all", "any", "mean"])
+@pytest.mark.parametrize("axis", [None, 0, 1, -1, (0, 1)])
+@pytest.mark.parametrize("keepdims", [False, True])
+def test_blocked_matches_numpy(blocked, name, axis, keepdims):
+    x = np.random.default_rng(0).uniform(0.5, 1.5, (37, 23))
+    got = REDUCTIONS[name](x, axis=axis, keepdims=keepdims)
+    want = getattr(np, name)(x, axis=axis, keepdims=keepdims)
+    assert np.shape(got) == np.shape(want)
+    np.testing.assert_allclose(got, want, rtol=1e-12)
+
+
+def test_blocked_float32_sum_is_accurate(blocked, monkeypatch):
+    monkeypatch.setattr(reductions, "PARALLEL_MIN_SIZE", 1 << 10)
+    x = np.full(1 << 20, 0.1, dtype=np.float32)
+    exact = float(np.sum(x.astype(np.float64)))
+    assert abs(float(REDUCTIONS["sum"](x)) - exact) <= abs(float(np.add.reduce(x)) - exact) + 1e-3
+
+
+@pytest.mark.parametrize("axis", [2, -3, (0, 0)])
+def test_invalid_axes_raise_on_blocked_path(blocked, axis):
+    with pytest.raises((np.exceptions.AxisError, ValueError)):
+        REDUCTIONS["sum"](np.ones((40, 30)), axis=axis)
+
+
+def _child_sum(queue):
+    x = np.arange(600.0).reshape(20, 30)
+    queue.put(float(REDUCTIONS["sum"](x * 2, axis=1).sum()))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_blocked_reduction_after_fork(blocked):
+    # the parent's executor has live threads; a forked child must not reuse it
+    REDUCTIONS["sum"](np.ones((40, 30)))
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child_sum, args=(queue,))
+    proc.start()
+    try:
+        assert queue.get(timeout=30) == np.arange(600.0).sum() * 2
+    finally:
+        proc.join(timeout=5)
+        if proc.is_alive():
+            proc.terminate()
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+import xpy
+from xpy.sparse import COOMatrix, CSRMatrix, issparse, todense, tocoo, tocsr
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward
+from xpy.tensor.base import Tensor
+
+
+def _dense(shape=(6, 5), density=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=shape)
+    x[rng.random(shape) > density] = 0
+    return x
+
+
+@pytest.fixture(params=[CSRMatrix.from_dense, COOMatrix.from_dense], ids=["csr", "coo"])
+def sparse(request):
+    dense = _dense()
+    return request.param(dense), dense
+
+
+def test_round_trip(sparse):
+    s, dense = sparse
+    assert s.shape == dense.shape and s.nnz == np.count_nonzero(dense)
+    np.testing.assert_array_equal(s.todense(), dense)
+    np.testing.assert_array_equal(tocsr(s).todense(), dense)
+    np.testing.assert_array_equal(tocoo(s).todense(), dense)
+    np.testing.assert_array_equal(s.T.todense(), dense.T)
+    assert issparse(s) and not issparse(dense) and todense(dense) is dense
+
+
+def test_coo_sums_duplicates():
+    coo = COOMatrix([2, 0, 2, 1], [1, 3, 1, 0], [1.0, 2.0, 3.0, 4.0], shape=(3, 4))
+    want = np.zeros((3, 4))
+    want[2, 1], want[0, 3], want[1, 0] = 4.0, 2.0, 4.0
+    csr = coo.tocsr()
+    assert csr.nnz == 3
+    np.testing.assert_array_equal(csr.todense(), want)
+
+
+def test_matmul_against_dense(sparse):
+    s, dense = sparse
+    b = _dense((5, 4), density=1.0, seed=1)
+    a = _dense((3, 6), density=1.0, seed=2)
+    np.testing.assert_allclose(s @ b, dense @ b)
+    np.testing.assert_allclose(a @ s, a @ dense)
+    np.testing.assert_allclose(s @ b[:, 0], dense @ b[:, 0])
+    np.testing.assert_allclose(np.dot(s, b), dense @ b)
+
+    other = CSRMatrix.from_dense(_dense((5, 7), seed=3))
+    product = s @ other
+    assert isinstance(product, CSRMatrix)
+    np.testing.assert_allclose(product.todense(), dense @ other.todense())
+
+
+@pytest.mark.parametrize("name", ["sum", "mean", "prod", "max", "min", "all", "any"])
+@pytest.mark.parametrize("axis", [None, 0, 1, -1, (0, 1)])
+@pytest.mark.parametrize("keepdims", [False, True])
+def test_reductions_against_dense(sparse, name, axis, keepdims):
+    s, dense = sparse
+    got = getattr(np, name)(s, axis=axis, keepdims=keepdims)
+    want = getattr(np, name)(dense, axis=axis, keepdims=keepdims)
+    assert np.shape(got) == np.shape(want)
+    np.testing.assert_allclose(got, want)
+
+
+def test_reductions_of_all_negative_rows_count_implicit_zeros():
+    dense = np.array([[-1.0, 0.0], [-2.0, -3.0]])
+    s = CSRMatrix.from_dense(dense)
+    np.testing.assert_array_equal(np.max(s, axis=1), [0.0, -2.0])
+    np.testing.assert_array_equal(np.min(s, axis=0), [-2.0, -3.0])
+
+
+def test_elementwise_keeps_sparsity_when_zero_maps_to_zero(sparse):
+    s, dense = sparse
+    for got, want in ((-s, -dense), (s * 2.0, dense * 2.0), (np.sqrt(abs(s)), np.sqrt(abs(dense))),
+                      (s + s, dense + dense), (s * dense, dense * dense)):
+        assert isinstance(got, CSRMatrix)
+        np.testing.assert_allclose(got.todense(), want)
+    # the implicit zero becomes nonzero: the result is dense
+    with np.errstate(all="ignore"):
+        cases = ((s + 1.0, dense + 1.0), (np.exp(s), np.exp(dense)), (s / 0.0, dense / 0.0))
+    for got, want in cases:
+        assert isinstance(got, np.ndarray)
+        np.testing.assert_allclose(got, want)
+
+
+def test_unsupported_functions_raise():
+    s = CSRMatrix.from_dense(_dense())
+    with pytest.raises(TypeError):
+        np.concatenate([s, s])
+
+
+def test_compiled_graph_runs_on_sparse_input():
+    x = Tensor(shape=(6, 5))
+    W = Tensor(shape=(5, 3))
+    out = [F.sum(x @ W, axis=0), F.mean(x, axis=1)]
+    s, dense = CSRMatrix.from_dense(_dense()), _dense()
+    Wv = _dense((5, 3), density=1.0, seed=4)
+    f = forward(out, inputs=[x, W])
+    for got, want in zip(f(s, Wv), f(dense, Wv)):
+        np.testing.assert_allclose(got, want)
+
+
+def test_graph_conversions_and_traced_functions():
+    x = Tensor(shape=(6, 5))
+    f = forward(F.todense(F.tocsr(x) * 3.0), inputs=[x])
+    dense = _dense()
+    np.testing.assert_allclose(f(dense), dense * 3.0)
+
+    @xpy.trace
+    def project(a, b):
+        return a @ b
+
+    b = _dense((5, 2), density=1.0, seed=5)
+    np.testing.assert_allclose(project(CSRMatrix.from_dense(dense), b), dense @ b)
@@ -0,0 +1,64 @@
+import ast
+
+import numpy as np
+
+from xpy.tensor import functions as F
+from xpy.tensor.api import forward, lower, specialize
+from xpy.tensor.base import Tensor
+
+
+def _prims(module: ast.Module):
+    """Primitive names called by the generated code."""
+    return sorted(
+        n.func.attr for n in ast.walk(module)
+        if isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute)
+        and isinstance(n.func.value, ast.Name) and n.func.value.id == "PRIM"
+    )
+
+
+def _graph():
+    x = Tensor(shape=(3,))
+    W = Tensor(shape=(3, 3))
+    y = x @ W + F.sum(W @ W, axis=0)
+    return x, W, y
+
+
+def test_known_leaves_fold_and_dead_code_is_dropped():
+    x, W, y = _graph()
+    F.exp(y)  # a consumer of y that isn't an output
+    Wv = np.arange(9.0).reshape(3, 3)
+    module, consts = lower(y, {W: Wv})
+    assert _prims(module) == ["add", "matmul"]
+    # W and sum(W @ W) are read by live code, W @ W itself is not
+    assert len(consts) == 2
+    xv = np.array([1.0, -2.0, 0.5])
+    np.testing.assert_allclose(specialize(y, {W: Wv})(xv), xv @ Wv + (Wv @ Wv).sum(0))
+
+
+def test_fully_known_outputs_are_returned_directly():
+    _, W, y = _graph()
+    wb = y.parents[1]
+    Wv = np.eye(3)
+    module, consts = lower(wb, {W: Wv})
+    assert _prims(module) == []
+    np.testing.assert_allclose(specialize(wb, {W: Wv})(), np.ones(3))
+
+
+def test_const_leaves_are_folded_by_forward():
+    x = Tensor(shape=(4,))
+    scale = Tensor.const(np.full(4, 3.0))
+    f = forward(x * F.exp(scale), inputs=[x])
+    np.testing.assert_allclose(f(np.arange(4.0)), np.arange(4.0) * np.exp(3.0))
+    module, _ = lower(x * F.exp(scale), {})
+    assert _prims(module) == ["multiply"]
+
+
+def test_explicit_inputs_set_the_argument_order():
+    x, W, y = _graph()
+    b = Tensor(shape=(3,))
+    Wv = np.eye(3)
+    f = specialize([y, F.exp(b)], {W: Wv}, inputs=[b, x])
+    xv, bv = np.arange(3.0), np.zeros(3)
+    out_y, out_b = f(bv, xv)
+    np.testing.assert_allclose(out_y, xv + 1.0)
+    np.testing.assert_allclose(out_b, np.ones(3))
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import xpy
+from xpy.tensor import functions as F
+
+
+def test_cache_is_keyed_on_shape_dtype_and_static_args():
+    calls = []
+
+    @xpy.trace
+    def f(x, k):
+        calls.append(k)
+        return x * k
+
+    x = np.arange(4.0)
+    f(x, 2)
+    f(x + 1, 2)
+    assert f.cache_info() == {"hits": 1, "misses": 1, "size": 1}
+    f(np.arange(5.0), 2)           # new shape
+    f(np.arange(4), 2)             # new dtype
+    f(x, 3)                        # new static value
+    assert f.cache_info()["misses"] == 4
+    assert len(calls) == 4         # the Python function only runs to trace
+
+
+def test_equal_static_values_of_different_types_are_separate():
+    @xpy.trace
+    def f(x, k):
+        return x * k
+
+    x = np.arange(3)
+    assert f(x, 1).dtype == np.int64
+    assert f(x, 1.0).dtype == np.float64
+    assert f(x, True).dtype == np.int64
+    assert f.cache_info()["size"] == 3
+
+
+def test_keyword_arguments_are_static():
+    @xpy.trace
+    def f(x, axis=0):
+        return F.sum(x, axis=axis)
+
+    x = np.ones((2, 3))
+    np.testing.assert_array_equal(f(x, axis=0), np.full(3, 2.0))
+    np.testing.assert_array_equal(f(x, axis=1), np.full(2, 3.0))
+    assert f.cache_info()["misses"] == 2
+
+
+def test_unhashable_static_argument_raises():
+    @xpy.trace
+    def f(x, scale):
+        return x * scale[0]
+
+    with pytest.raises(TypeError, match="hashable"):
+        f(np.ones(2), [2.0])
+
+
+def test_operators_match_numpy():
+    @xpy.trace
+    def f(a, b):
+        return (a + b, a - b, a * b, 2 ** a, a @ b.T, -a, a[1:, ::2],
+                a < b, (a > 1) & (b < 5), a & 6, 3 | a, a ^ b, ~a)
+
+    a = np.arange(12).reshape(3, 4)
+    b = np.arange(12)[::-1].reshape(3, 4).copy()
+    want = (a + b, a - b, a * b, 2 ** a, a @ b.T, -a, a[1:, ::2],
+            a < b, (a > 1) & (b < 5), a & 6, 3 | a, a ^ b, ~a)
+    for got, w in zip(f(a, b), want):
+        assert got.dtype == w.dtype
+        np.testing.assert_array_equal(got, w)
+
+
+def test_single_element_tuple_stays_a_tuple():
+    @xpy.trace
+    def f(x):
+        return (x + 1,)
+
+    out = f(np.zeros(2))
+    assert isinstance(out, tuple) and len(out) == 1
+
+
+def test_python_control_flow_on_tensors_raises():
+    @xpy.trace
+    def branch(x):
+        return x if x > 0 else -x
+
+    with pytest.raises(TypeError, match="xpy.cond"):
+        branch(np.ones(3))
+
+    @xpy.trace
+    def rows(x):
+        return [r * i for i, r in enumerate(x)]
+
+    np.testing.assert_array_equal(rows(np.ones((3, 2)))[2], [2.0, 2.0])
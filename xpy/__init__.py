@@ -1,3 +1,9 @@
-from .python_packages import import_numpy, import_cupy, install_package, install_with_versions
-from .base import construct, primitive, funbuild
+from .python_packages import import_numpy, import_cupy, install_package, install_with_versions, probe_environment
+from .base import construct, primitive, primitives, funbuild
 
+from .tensor.trace import trace
+from .tensor.cost import explain, calibrate
+from .tensor.pipeline import stream
+from .tensor.control_flow import scan, while_loop, cond
+from . import metrics
+from . import sparse
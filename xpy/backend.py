@@ -53,20 +53,51 @@ def set_device(device: str):
 # set_device("auto")
 
 
-def xp():
+_detected = None
+
+def xp(refresh: bool = False):
+    """
+    Default array module: cupy when it is installed and a device answers, else numpy.
+    Detection runs once per process and skips importing cupy when the cached
+    environment probe already rules it out (see `probe_environment`).
+    """
+    global _detected
+    if _detected is not None and not refresh:
+        return _detected
+
+    from .python_packages import probe_environment
+    env = probe_environment(refresh=refresh)
+    _detected = _np
+    if env["cupy_version"] is None or env["device_count"] == 0:
+        return _detected
+
     try:
         import cupy as cp
         try:
             cp.cuda.runtime.getDeviceCount()
-            return cp
+            _detected = cp
         except Exception:
             pass
     except ImportError:
         pass
-
-    import numpy as np
-    return np
+    return _detected
 
 
 def get_device():
-    return _device
\ No newline at end of file
+    return _device
+
+_cupy = None  # the cupy module, or False once importing it failed
+
+def get_array_module(*arrays):
+    """Return the array module (numpy or cupy) that owns `arrays`."""
+    global _cupy
+    if _cupy is None:
+        # a failed import isn't cached by Python and costs a path search per call
+        try:
+            import cupy as cp
+            _cupy = cp
+        except ImportError:
+            _cupy = False
+    if _cupy is False:
+        return _np
+    return _cupy.get_array_module(*arrays)
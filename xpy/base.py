@@ -31,11 +31,16 @@ def add_prim_with_list(names: list[str]):
         add_prim(n)
 
 
-def primitive(device: str, name: str):
+def primitives(device: str):
+    """The primitive table for `device`, used as `PRIM` by compiled graphs."""
     table = {'cpu': NpPrimitives, 'cuda': CpPrimitives}
     cls = table.get(device)
     if cls is None:
         raise TypeError("device must be 'cpu' or 'cuda'")
+    return cls
+
+def primitive(device: str, name: str):
+    cls = primitives(device)
     attr = name.replace('.', '_')
     if not hasattr(cls, attr):
         raise KeyError(f"{name} not available for {device}")
@@ -56,6 +61,7 @@ elementwise_ops = [
     'greater', 'greater_equal', 'less', 'less_equal',
     'equal', 'not_equal', 'logical_and', 'logical_or',
     'logical_not', 'logical_xor',
+    'bitwise_and', 'bitwise_or', 'bitwise_xor', 'invert',
 ]
 
 # Linear algebra (must-haves for ML)
@@ -88,6 +94,14 @@ array_manip_ops = [
 # These help with compiler optimizations
 optimization_ops = [
     'broadcast_to',  # Explicit broadcasting for optimization
+    'ascontiguousarray',  # Layout normalization (see tensor/layout.py)
+]
+
+# ============ SPARSE ============
+# Conversions between dense arrays and `xpy.sparse` matrices (NumPy only);
+# matmul, dot, the reductions and the ufuncs take sparse operands as they are
+sparse_ops = [
+    'tocsr', 'tocoo', 'todense',
 ]
 
 # ============ COMPOSITE BUILDING BLOCKS ============
@@ -110,16 +124,40 @@ def funbuild():
 
 funbuild()
 
-def construct(func:Callable, name:str):
-    global CpPrimitives, NpPrimitives
-    lib = xp() 
-    import numpy as np
-
-    name = lib.__name__
-    ptype = CpPrimitives if name == 'cupy' else None
-    if ptype is None:
-        pass
-    else:
-        setattr(CpPrimitives, name, staticmethod(func))
-    setattr(NpPrimitives, name, staticmethod(func))
-
+def construct(func:Callable, name:str, devices=('cpu', 'cuda')):
+    """Register a Python-level implementation `func` as primitive `name` on the tables of `devices`."""
+    attr = name.replace('.', '_')
+    for device in devices:
+        setattr(primitives(device), attr, staticmethod(func))
+
+def getitem(x, index):
+    return x[index]
+
+def stack_operands(*arrays, axis=0):
+    """`stack` of the node's operands; a graph node can't take a list as one operand."""
+    from .backend import get_array_module
+    return get_array_module(*arrays).stack(arrays, axis=axis)
+
+def add_composites():
+    # Backend-agnostic implementations; they dispatch on the array module of their inputs
+    from .convolution import conv, conv_transpose
+    construct(conv, 'conv')
+    construct(conv_transpose, 'conv_transpose')
+    construct(getitem, 'getitem')
+    construct(stack_operands, 'stack_operands')
+
+    # blocked thread-parallel versions; they defer to the array module's own below a size threshold
+    from .reductions import REDUCTIONS
+    for name, func in REDUCTIONS.items():
+        construct(func, name)
+
+    from . import sparse
+    for name in sparse_ops:
+        construct(getattr(sparse, name), name, devices=('cpu',))
+
+    from .control_flow import scan, while_loop, cond
+    construct(scan, 'scan')
+    construct(while_loop, 'while_loop')
+    construct(cond, 'cond')
+
+add_composites()
@@ -0,0 +1,43 @@
+from .backend import get_array_module
+
+
+def _as_tuple(out):
+    return out if isinstance(out, tuple) else (out,)
+
+
+def scan(*operands, body, num_carry: int, num_xs: int, length: int):
+    """
+    Run `body(*carry, *x_slices, *consts) -> (*carry, *ys)` over the leading
+    axis of the `num_xs` sequence operands. Returns `(*carry, *stacked_ys)`.
+    The stacked outputs are allocated once after the first step and filled in place.
+    """
+    if length < 1:
+        raise ValueError("scan needs length >= 1")
+    carry = operands[:num_carry]
+    xs = operands[num_carry:num_carry + num_xs]
+    consts = operands[num_carry + num_xs:]
+
+    ys = None
+    for i in range(length):
+        out = _as_tuple(body(*carry, *[x[i] for x in xs], *consts))
+        carry, y = out[:num_carry], out[num_carry:]
+        if ys is None:
+            lib = get_array_module(*y) if y else None
+            ys = [lib.empty((length,) + lib.shape(v), dtype=lib.result_type(v)) for v in y]
+        for buf, v in zip(ys, y):
+            buf[i] = v
+    return tuple(carry) + tuple(ys)
+
+
+def while_loop(*operands, cond, body, num_carry: int):
+    """Iterate `carry = body(*carry, *consts)` while `cond(*carry, *consts)` holds."""
+    carry = operands[:num_carry]
+    consts = operands[num_carry:]
+    while bool(cond(*carry, *consts)[0]):
+        carry = _as_tuple(body(*carry, *consts))
+    return tuple(carry)
+
+
+def cond(pred, *operands, true_fn, false_fn):
+    """`true_fn(*operands)` if `pred` else `false_fn(*operands)`; both return tuples."""
+    return (true_fn if bool(pred) else false_fn)(*operands)
@@ -0,0 +1,139 @@
+from typing import Sequence, Tuple, Union
+from .backend import get_array_module
+
+IntOrSeq = Union[int, Sequence[int]]
+
+# Kernels whose contraction size (C_in * prod(kernel)) is at most this are
+# evaluated with einsum directly on the strided window view, which never
+# materializes the patch matrix. Larger kernels go through one tensordot
+# so BLAS does the heavy lifting.
+SMALL_KERNEL_SIZE = 64
+
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def _tuple(value: IntOrSeq, nd: int, what: str) -> Tuple[int, ...]:
+    if isinstance(value, int):
+        return (value,) * nd
+    value = tuple(value)
+    if len(value) != nd:
+        raise ValueError(f"{what} must have {nd} entries, got {len(value)}")
+    return value
+
+
+def _pairs(padding, nd: int) -> Tuple[Tuple[int, int], ...]:
+    if isinstance(padding, int):
+        return ((padding, padding),) * nd
+    padding = tuple(padding)
+    if len(padding) != nd:
+        raise ValueError(f"padding must have {nd} entries, got {len(padding)}")
+    return tuple((p, p) if isinstance(p, int) else (p[0], p[1]) for p in padding)
+
+
+def conv_params(nd: int, stride=1, padding=0, dilation=1):
+    """Normalize stride/padding/dilation for an `nd`-spatial convolution."""
+    stride = _tuple(stride, nd, "stride")
+    dilation = _tuple(dilation, nd, "dilation")
+    padding = _pairs(padding, nd)
+    if any(s < 1 for s in stride) or any(d < 1 for d in dilation):
+        raise ValueError("stride and dilation must be positive")
+    return stride, padding, dilation
+
+
+def _pad_or_crop(lib, x, pairs):
+    """Pad spatial axes of `x` (all but the first two); negative widths crop."""
+    if all(b == 0 and a == 0 for b, a in pairs):
+        return x
+    pad = [(0, 0), (0, 0)] + [(max(b, 0), max(a, 0)) for b, a in pairs]
+    if any(b > 0 or a > 0 for b, a in pad):
+        x = lib.pad(x, pad)
+    crop = (slice(None), slice(None)) + tuple(
+        slice(-min(b, 0), x.shape[i + 2] + min(a, 0)) for i, (b, a) in enumerate(pairs)
+    )
+    return x[crop]
+
+
+def _windows(lib, x, kshape, stride, dilation):
+    """
+    Strided view of `x` with shape (N, C, *out, *kernel).
+    No data is copied: stride and dilation are applied by slicing the view.
+    """
+    nd = len(kshape)
+    span = tuple(d * (k - 1) + 1 for k, d in zip(kshape, dilation))
+    if any(s > n for s, n in zip(span, x.shape[2:])):
+        raise ValueError(f"kernel span {span} larger than padded input {x.shape[2:]}")
+    view = lib.lib.stride_tricks.sliding_window_view(x, span, axis=tuple(range(2, 2 + nd)))
+    index = (slice(None), slice(None)) \
+        + tuple(slice(None, None, s) for s in stride) \
+        + tuple(slice(None, None, d) for d in dilation)
+    return view[index]
+
+
+def conv(x, w, stride: IntOrSeq = 1, padding=0, dilation: IntOrSeq = 1):
+    """
+    N-d cross-correlation (the `conv` of most ML frameworks).
+    - `x` has shape (N, C_in, *spatial), `w` has shape (C_out, C_in, *kernel).
+    - `padding` is an int, one int per spatial axis or one (before, after) pair per axis.
+    Returns an array of shape (N, C_out, *out_spatial).
+    """
+    lib = get_array_module(x, w)
+    nd = x.ndim - 2
+    if nd < 1 or w.ndim != x.ndim:
+        raise ValueError(f"conv expects x (N, C, *spatial) and w (C_out, C_in, *kernel), "
+                         f"got {x.shape} and {w.shape}")
+    if x.shape[1] != w.shape[1]:
+        raise ValueError(f"channel mismatch: x has {x.shape[1]}, w expects {w.shape[1]}")
+
+    stride, padding, dilation = conv_params(nd, stride, padding, dilation)
+    win = _windows(lib, _pad_or_crop(lib, x, padding), w.shape[2:], stride, dilation)
+
+    if w[0].size <= SMALL_KERNEL_SIZE:
+        # einsum walks the strided view in place; no patch matrix is built
+        o, k = _LETTERS[:nd], _LETTERS[nd:2 * nd]
+        return lib.einsum(f"NC{o}{k},DC{k}->ND{o}", win, w)
+
+    kernel = list(range(2 + nd, 2 + 2 * nd))
+    out = lib.tensordot(win, w, axes=([1] + kernel, [1] + list(range(2, 2 + nd))))
+    return lib.moveaxis(out, -1, 1)
+
+
+def conv_transpose(
+    x, w,
+    stride: IntOrSeq = 1,
+    padding=0,
+    dilation: IntOrSeq = 1,
+    output_padding: IntOrSeq = 0,
+):
+    """
+    N-d transposed convolution, the adjoint of `conv` with respect to its input.
+    - `x` has shape (N, C_in, *spatial), `w` has shape (C_in, C_out, *kernel).
+    - `output_padding` adds extra rows at the end of each spatial axis to
+      disambiguate the output size when stride > 1.
+    """
+    lib = get_array_module(x, w)
+    nd = x.ndim - 2
+    if nd < 1 or w.ndim != x.ndim:
+        raise ValueError(f"conv_transpose expects x (N, C, *spatial) and w (C_in, C_out, *kernel), "
+                         f"got {x.shape} and {w.shape}")
+    if x.shape[1] != w.shape[0]:
+        raise ValueError(f"channel mismatch: x has {x.shape[1]}, w expects {w.shape[0]}")
+
+    stride, padding, dilation = conv_params(nd, stride, padding, dilation)
+    output_padding = _tuple(output_padding, nd, "output_padding")
+    kshape = w.shape[2:]
+
+    # Spread the input out by `stride` ...
+    if any(s > 1 for s in stride):
+        up_shape = x.shape[:2] + tuple((n - 1) * s + 1 for n, s in zip(x.shape[2:], stride))
+        up = lib.zeros(up_shape, dtype=x.dtype)
+        up[(slice(None), slice(None)) + tuple(slice(None, None, s) for s in stride)] = x
+    else:
+        up = x
+
+    # ... then run a stride-1 conv with the flipped, channel-swapped kernel.
+    full = tuple(d * (k - 1) for k, d in zip(kshape, dilation))
+    pairs = tuple(
+        (f - b, f - a + op) for f, (b, a), op in zip(full, padding, output_padding)
+    )
+    flipped = lib.swapaxes(w, 0, 1)[(slice(None), slice(None)) + (slice(None, None, -1),) * nd]
+    return conv(_pad_or_crop(lib, up, pairs), flipped, stride=1, padding=0, dilation=dilation)
@@ -0,0 +1,206 @@
+"""
+Always-on counters for compiled functions.
+
+Every function returned by the compile path (`tensor.api.load`) is
+wrapped by `instrument`, which adds two `perf_counter` calls and a few
+attribute updates per call; runner objects (`Tiered`, `ThreadParallel`,
+`DataParallel`) time their `__call__` with `timed` instead, so a sharded
+call counts once. Unnamed compiles all report as `compiledfunction`, so
+the number of series stays bounded. Metrics are aggregated per function
+name:
+- calls, total latency and latency percentiles over the last
+  `WINDOW` calls,
+- bytes of the arrays returned (outputs that are one of the arguments,
+  e.g. donated buffers, are not counted),
+- compile count and time (AST building, `compile()` and `exec`),
+- trace cache hits and misses.
+
+`snapshot()` returns plain dicts; `dump_prometheus(path)` writes the
+Prometheus text exposition format atomically (suitable for the
+node_exporter textfile collector). Set `XPY_METRICS=0` to disable
+wrapping.
+"""
+import functools
+import os
+import time
+from array import array
+from typing import Callable, Dict, Optional
+
+WINDOW = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class FunctionMetrics:
+    """Counters of one compiled function name. Updates are unlocked; under the GIL a lost increment is the worst case."""
+    __slots__ = ('name', 'calls', 'seconds', 'output_bytes', 'compiles', 'compile_seconds',
+                 'cache_hits', 'cache_misses', '_window', '_pos')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.output_bytes = 0
+        self.compiles = 0
+        self.compile_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._window = array('d')
+        self._pos = 0
+
+    def record_call(self, seconds: float, nbytes: int):
+        self.calls += 1
+        self.seconds += seconds
+        self.output_bytes += nbytes
+        if len(self._window) < WINDOW:
+            self._window.append(seconds)
+        else:
+            self._window[self._pos] = seconds
+            self._pos = (self._pos + 1) % WINDOW
+
+    def record_compile(self, seconds: float):
+        self.compiles += 1
+        self.compile_seconds += seconds
+
+    def record_cache(self, hit: bool):
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+    def quantiles(self) -> Dict[float, float]:
+        window = sorted(self._window)
+        if not window:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: window[min(len(window) - 1, int(q * len(window)))] for q in QUANTILES}
+
+    def snapshot(self) -> dict:
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'mean_seconds': self.seconds / self.calls if self.calls else 0.0,
+            'quantiles': self.quantiles(),
+            'output_bytes': self.output_bytes,
+            'compiles': self.compiles,
+            'compile_seconds': self.compile_seconds,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def _result_bytes(out, args) -> int:
+    if isinstance(out, tuple):
+        return sum(_result_bytes(o, args) for o in out)
+    for a in args:
+        if out is a:
+            return 0
+    return getattr(out, 'nbytes', 0)
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.functions: Dict[str, FunctionMetrics] = {}
+
+    def get(self, name: str) -> FunctionMetrics:
+        m = self.functions.get(name)
+        if m is None:
+            m = self.functions.setdefault(name, FunctionMetrics(name))
+        return m
+
+    def instrument(self, fn: Callable, name: str) -> Callable:
+        """`fn` wrapped to record its calls under `name`; `fn` itself when disabled."""
+        if not self.enabled:
+            return fn
+        m = self.get(name)
+        clock = time.perf_counter
+
+        def instrumented(*args):
+            t0 = clock()
+            out = fn(*args)
+            m.record_call(clock() - t0, _result_bytes(out, args))
+            return out
+
+        instrumented.__name__ = instrumented.__qualname__ = getattr(fn, '__name__', name)
+        instrumented.__wrapped__ = fn
+        instrumented.metrics = m
+        return instrumented
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: m.snapshot() for name, m in self.functions.items()}
+
+    def reset(self):
+        self.functions.clear()
+
+    def prometheus(self) -> str:
+        """Everything in the Prometheus text exposition format."""
+        def label(name, **extra):
+            escaped = name.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            parts = [f'function="{escaped}"'] + [f'{k}="{v}"' for k, v in extra.items()]
+            return "{" + ",".join(parts) + "}"
+
+        functions = list(self.functions.values())
+        lines = []
+
+        def family(metric, kind, help, value):
+            lines.append(f"# HELP {metric} {help}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for m in functions:
+                lines.append(f"{metric}{label(m.name)} {value(m)}")
+
+        lines.append("# HELP xpy_call_seconds Latency of compiled function calls.")
+        lines.append("# TYPE xpy_call_seconds summary")
+        for m in functions:
+            for q, v in m.quantiles().items():
+                lines.append(f"xpy_call_seconds{label(m.name, quantile=q)} {v!r}")
+            lines.append(f"xpy_call_seconds_sum{label(m.name)} {m.seconds!r}")
+            lines.append(f"xpy_call_seconds_count{label(m.name)} {m.calls}")
+        family("xpy_output_bytes_total", "counter", "Bytes of the new arrays returned by compiled functions.",
+               lambda m: m.output_bytes)
+        family("xpy_compiles_total", "counter", "Compilations.", lambda m: m.compiles)
+        family("xpy_compile_seconds_total", "counter", "Time spent building, compiling and loading code.",
+               lambda m: repr(m.compile_seconds))
+        family("xpy_cache_hits_total", "counter", "Trace cache hits.", lambda m: m.cache_hits)
+        family("xpy_cache_misses_total", "counter", "Trace cache misses.", lambda m: m.cache_misses)
+        return "\n".join(lines) + "\n"
+
+    def dump_prometheus(self, path: str):
+        """Write `prometheus()` to `path` through a temporary file and a rename."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+
+registry = MetricsRegistry(enabled=os.environ.get("XPY_METRICS", "1") != "0")
+
+
+def instrument(fn: Callable, name: str) -> Callable:
+    return registry.instrument(fn, name)
+
+
+def timed(call: Callable) -> Callable:
+    """Decorator for the `__call__` of a runner object: records its calls under `self.name`, as `instrument` does."""
+    clock = time.perf_counter
+
+    @functools.wraps(call)
+    def timed_call(self, *args):
+        if not registry.enabled:
+            return call(self, *args)
+        t0 = clock()
+        out = call(self, *args)
+        registry.get(self.name).record_call(clock() - t0, _result_bytes(out, args))
+        return out
+    return timed_call
+
+
+def snapshot(name: Optional[str] = None) -> dict:
+    """Metrics of every function, or of `name` only."""
+    if name is not None:
+        return registry.get(name).snapshot()
+    return registry.snapshot()
+
+
+def dump_prometheus(path: str):
+    registry.dump_prometheus(path)
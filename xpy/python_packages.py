@@ -5,6 +5,14 @@ import subprocess
 import platform
 from typing import Optional, Tuple, Union, List
 
+_said = set()
+
+def _say_once(message: str):
+    """Print `message` the first time it comes up in this process"""
+    if message not in _said:
+        _said.add(message)
+        print(message)
+
 def import_numpy(numpy_version: Optional[str] = None) -> Optional[object]:
     """Import or install NumPy with optional version specification"""
     package_name = "numpy" if numpy_version is None else f"numpy=={numpy_version}"
@@ -13,12 +21,12 @@ def import_numpy(numpy_version: Optional[str] = None) -> Optional[object]:
         # Try to import without installing first
         numpy = importlib.import_module("numpy")
         current_version = numpy.__version__
-        print(f"NumPy {current_version} already imported")
+        _say_once(f"NumPy {current_version} already imported")
         
         # Check if specific version was requested
         if numpy_version and current_version != numpy_version:
-            print(f"Warning: Requested NumPy {numpy_version}, but found {current_version}")
-            print(f"Consider updating with: pip install numpy=={numpy_version}")
+            _say_once(f"Warning: Requested NumPy {numpy_version}, but found {current_version}\n"
+                      f"Consider updating with: pip install numpy=={numpy_version}")
             
         return numpy
     except ImportError:
@@ -54,7 +62,7 @@ def import_cupy(
     try:
         cupy = importlib.import_module("cupy")
         current_version = getattr(cupy, "__version__", "unknown")
-        print(f"CuPy {current_version} already imported")
+        _say_once(f"CuPy {current_version} already imported")
         return cupy
     except ImportError:
         pass
@@ -135,36 +143,49 @@ def import_cupy(
     warnings.warn("Could not install CuPy. Proceeding without GPU acceleration.")
     return None
 
-def detect_cuda_version() -> Optional[str]:
-    """Detect CUDA version on the system"""
-    
-    # Method 1: Check nvidia-smi
+_DRIVER_TO_CUDA = {
+    '535': '12.2', '530': '12.1', '525': '12.0',
+    '520': '11.8', '515': '11.7', '510': '11.6',
+    '495': '11.5', '470': '11.4', '465': '11.3',
+    '460': '11.2', '450': '11.0', '440': '10.2'
+}
+
+def _query_nvidia_smi() -> Tuple[Optional[str], Optional[int]]:
+    """(driver version, device count) from nvidia-smi, or (None, None) if it can't run"""
+    import shutil
+    exe = shutil.which("nvidia-smi")
+    if exe is None:
+        return None, None
     try:
         result = subprocess.run(
-            ["nvidia-smi", "--query-gpu=driver_version", "--format=csv,noheader"],
+            [exe, "--query-gpu=driver_version", "--format=csv,noheader"],
             capture_output=True,
             text=True,
             timeout=5
         )
-        if result.returncode == 0 and result.stdout.strip():
-            driver_version = result.stdout.strip().split('.')[0]
-            # Map driver version to approximate CUDA version
-            driver_mapping = {
-                '535': '12.2', '530': '12.1', '525': '12.0',
-                '520': '11.8', '515': '11.7', '510': '11.6',
-                '495': '11.5', '470': '11.4', '465': '11.3',
-                '460': '11.2', '450': '11.0', '440': '10.2'
-            }
-            for drv, cuda in driver_mapping.items():
-                if int(driver_version) >= int(drv):
-                    return cuda
-    except (FileNotFoundError, subprocess.TimeoutExpired, ValueError):
-        pass
-    
-    # Method 2: Check common CUDA installation paths
+    except (OSError, subprocess.TimeoutExpired):
+        return None, None
+    if result.returncode != 0:
+        return None, None
+    lines = [l.strip() for l in result.stdout.splitlines() if l.strip()]
+    return (lines[0] if lines else None), len(lines)
+
+def _cuda_from_driver(driver: Optional[str]) -> Optional[str]:
+    try:
+        major = int(driver.split('.')[0])
+    except (AttributeError, ValueError):
+        return None
+    # Map driver version to approximate CUDA version
+    for drv, cuda in _DRIVER_TO_CUDA.items():
+        if major >= int(drv):
+            return cuda
+    return None
+
+def _cuda_from_paths() -> Optional[str]:
     import os
+    import re
     from pathlib import Path
-    
+
     cuda_paths = []
     if platform.system() == "Windows":
         cuda_paths = [
@@ -183,17 +204,118 @@ def detect_cuda_version() -> Optional[str]:
         if version_file.exists():
             try:
                 with open(version_file) as f:
-                    content = f.read()
                     # Look for version pattern
-                    import re
-                    match = re.search(r"CUDA Version (\d+\.\d+)", content)
+                    match = re.search(r"CUDA Version (\d+\.\d+)", f.read())
                     if match:
                         return match.group(1)
-            except:
+            except OSError:
                 continue
-    
     return None
 
+def detect_cuda_version(refresh: bool = False) -> Optional[str]:
+    """Detect CUDA version on the system (cached, see `probe_environment`)"""
+    return probe_environment(refresh=refresh)["cuda_version"]
+
+# ============ ENVIRONMENT PROBE ============
+# nvidia-smi and package lookups are slow enough to matter at every worker
+# start, so the result is kept in a JSON file shared by all processes
+# running the same interpreter with the same relevant environment.
+
+PROBE_ENV_VARS = (
+    "PATH", "CUDA_PATH", "CUDA_HOME", "CUDA_VISIBLE_DEVICES",
+    "LD_LIBRARY_PATH", "VIRTUAL_ENV", "CONDA_PREFIX",
+)
+PROBE_TTL = 24 * 60 * 60  # seconds, override with XPY_PROBE_TTL
+
+_probe = None
+
+def _distribution_version(*names: str) -> Optional[str]:
+    from importlib import metadata
+    for name in names:
+        try:
+            return metadata.version(name)
+        except metadata.PackageNotFoundError:
+            continue
+    return None
+
+def _cupy_version() -> Optional[str]:
+    """Version of whichever distribution provides `cupy` (cupy, cupy-cuda1xx, cupy-rocm-*, ...), without importing it"""
+    from importlib import metadata, util
+    if util.find_spec("cupy") is None:
+        return None
+    # a source checkout on sys.path has no distribution metadata
+    return _distribution_version(*metadata.packages_distributions().get("cupy", ())) or "unknown"
+
+def probe_cache_path() -> str:
+    """Cache file for the current interpreter and environment (`XPY_CACHE_DIR` overrides the directory)"""
+    import hashlib
+    import json
+    import os
+    key = json.dumps([sys.executable, sys.version, [os.environ.get(v) for v in PROBE_ENV_VARS]])
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    base = os.environ.get("XPY_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "xpy"
+    )
+    return os.path.join(base, f"env-{digest}.json")
+
+def _run_probe() -> dict:
+    import time
+    driver, device_count = _query_nvidia_smi()
+    return {
+        "python": sys.executable,
+        "created": time.time(),
+        "driver_version": driver,
+        "cuda_version": _cuda_from_driver(driver) or _cuda_from_paths(),
+        "device_count": device_count,
+        "numpy_version": _distribution_version("numpy"),
+        "cupy_version": _cupy_version(),
+    }
+
+def probe_environment(refresh: bool = False, ttl: Optional[float] = None) -> dict:
+    """
+    CUDA/driver version, GPU count and NumPy/CuPy versions, without importing either.
+
+    The result is memoized in-process and persisted to `probe_cache_path()`;
+    entries older than `ttl` seconds (default `XPY_PROBE_TTL` or one day) or
+    `refresh=True` trigger a new probe. `device_count` is None when nvidia-smi
+    is unavailable, 0 when it ran and found no GPU.
+    """
+    import json
+    import os
+    import time
+    global _probe
+
+    if ttl is None:
+        ttl = float(os.environ.get("XPY_PROBE_TTL", PROBE_TTL))
+    path = probe_cache_path()
+
+    def fresh(result):
+        return time.time() - result["created"] < ttl
+
+    if not refresh:
+        if _probe is not None and _probe[0] == path and fresh(_probe[1]):
+            return _probe[1]
+        try:
+            with open(path) as f:
+                cached = json.load(f)
+            if fresh(cached):
+                _probe = (path, cached)
+                return cached
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    result = _run_probe()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp, path)  # atomic, concurrent workers never see a partial file
+    except OSError:
+        pass
+    _probe = (path, result)
+    return result
+
 def install_package(package_spec: str) -> bool:
     """Install a package using pip with error handling"""
     
@@ -228,6 +350,7 @@ def install_package(package_spec: str) -> bool:
         
         if result.returncode == 0:
             print(f"✓ Successfully installed {package_spec}")
+            probe_environment(refresh=True)  # cached package versions are stale now
             return True
         else:
             # Try without version specifier if versioned install failed
@@ -296,6 +419,8 @@ def setup_gpu_support(
     print("=" * 60)
     return numpy, cupy, has_gpu
 
+_installed = {}
+
 def install_with_versions(
     numpy_version: str|None = None,
     cuda_version: str|None = None,
@@ -304,8 +429,13 @@ def install_with_versions(
     """
     Simplified installer with version specifications
     
-    Returns dictionary with installed modules and status
+    Returns dictionary with installed modules and status.
+    Successful results are reused for repeated calls in the same process.
     """
+    key = (numpy_version, cuda_version, cupy_version)
+    if key in _installed:
+        return _installed[key]
+
     results = {
         "numpy": None,
         "cupy": None,
@@ -325,13 +455,19 @@ def install_with_versions(
         if results["cupy"]:
             results["cupy_version"] = getattr(results["cupy"], "__version__", "unknown")
             
-            # Check GPU availability
-            try:
-                from cupy import cuda as cp_cuda
-                results["has_gpu"] = cp_cuda.runtime.getDeviceCount() > 0
-            except:
-                pass
+            # Check GPU availability, nvidia-smi's count avoids initializing CUDA
+            device_count = probe_environment()["device_count"]
+            if device_count is not None:
+                results["has_gpu"] = device_count > 0
+            else:
+                try:
+                    from cupy import cuda as cp_cuda
+                    results["has_gpu"] = cp_cuda.runtime.getDeviceCount() > 0
+                except:
+                    pass
         
+        if results["numpy"] is not None:
+            _installed[key] = results
         return results
         
     except Exception as e:
@@ -0,0 +1,147 @@
+"""
+Blocked, thread-parallel reductions.
+
+Large NumPy inputs are cut into blocks along their longest axis and each
+block is reduced on a thread pool (NumPy releases the GIL inside
+reduction loops). When the cut axis is reduced, the per-block partials
+are combined pairwise in a balanced tree, which also bounds the rounding
+error of floating-point sums better than one long accumulation; when it
+is kept, the block results are concatenated. `axis`/`keepdims` behave as
+in NumPy and as `reduced_shape`/`max_min_shape` describe.
+
+Small inputs, non-NumPy arrays and calls with other keyword arguments
+(`dtype`, `out`, `where`, ...) go to the array module's own function.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Union
+
+import numpy as np
+try:
+    from numpy.lib.array_utils import normalize_axis_tuple
+except ImportError:  # NumPy < 2.0
+    from numpy.core.numeric import normalize_axis_tuple
+
+from .backend import get_array_module
+
+# below this many elements a single NumPy call is faster than splitting
+PARALLEL_MIN_SIZE = 1 << 22
+# blocks per worker thread, so uneven blocks still balance
+BLOCKS_PER_WORKER = 4
+
+Axis = Union[int, Sequence[int], None]
+
+# reduction -> (NumPy function, pairwise combiner)
+_COMBINE = {
+    'sum': (np.sum, np.add),
+    'prod': (np.prod, np.multiply),
+    'max': (np.max, np.maximum),
+    'min': (np.min, np.minimum),
+    'all': (np.all, np.logical_and),
+    'any': (np.any, np.logical_or),
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_workers = os.cpu_count() or 1
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(_workers, thread_name_prefix="xpy-reduce")
+    return _executor
+
+
+def _forget_pool():
+    # a forked child (e.g. a DataParallel worker) inherits the executor but
+    # not its threads; submitting to it would wait forever
+    global _executor
+    _executor = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_pool)
+
+
+def _axes(axis: Axis, ndim: int) -> tuple:
+    """Sorted non-negative axes; out-of-range or repeated ones raise as in NumPy."""
+    if axis is None:
+        return tuple(range(ndim))
+    return tuple(sorted(normalize_axis_tuple(axis, ndim)))
+
+
+def _pairwise(parts: list, combine):
+    while len(parts) > 1:
+        paired = [combine(a, b) for a, b in zip(parts[0::2], parts[1::2])]
+        if len(parts) % 2:
+            paired.append(parts[-1])
+        parts = paired
+    return parts[0]
+
+
+def _blocked(name: str, x: np.ndarray, axes: tuple, **kwds):
+    """`name` over `axes` with keepdims=True, computed block-wise."""
+    reduce, combine = _COMBINE[name]
+    split = max(range(x.ndim), key=lambda i: x.shape[i])
+    n = min(x.shape[split], _workers * BLOCKS_PER_WORKER)
+    bounds = [x.shape[split] * i // n for i in range(n + 1)]
+    index = [slice(None)] * x.ndim
+
+    def block(i):
+        index_i = list(index)
+        index_i[split] = slice(bounds[i], bounds[i + 1])
+        return reduce(x[tuple(index_i)], axis=axes, keepdims=True, **kwds)
+
+    parts = list(_pool().map(block, range(n)))
+    if split in axes:
+        return _pairwise(parts, combine)
+    return np.concatenate(parts, axis=split)
+
+
+def _finish(total, axes: tuple, keepdims: bool):
+    if keepdims:
+        return total
+    out = np.squeeze(total, axis=axes)
+    return out[()] if out.ndim == 0 else out
+
+
+def _use_numpy(x, kwds) -> bool:
+    return kwds or not isinstance(x, np.ndarray) or x.size < PARALLEL_MIN_SIZE or _workers < 2
+
+
+def _make(name: str):
+    def reduction(x, axis: Axis = None, keepdims: bool = False, **kwds):
+        if _use_numpy(x, kwds):
+            return getattr(get_array_module(x), name)(x, axis=axis, keepdims=keepdims, **kwds)
+        axes = _axes(axis, x.ndim)
+        if name in ('sum', 'prod') and x.dtype == np.float16:
+            # half-precision partials lose too much; combine them in float32
+            return _finish(_blocked(name, x, axes, dtype=np.float32).astype(np.float16), axes, keepdims)
+        return _finish(_blocked(name, x, axes), axes, keepdims)
+    reduction.__name__ = reduction.__qualname__ = name
+    reduction.__doc__ = f"`{name}` over `axis`, blocked and thread-parallel for large NumPy arrays."
+    return reduction
+
+
+def mean(x, axis: Axis = None, keepdims: bool = False, **kwds):
+    """`mean` over `axis`: a blocked sum (accumulated in float64 for integer and bool inputs) over the count."""
+    if _use_numpy(x, kwds):
+        return get_array_module(x).mean(x, axis=axis, keepdims=keepdims, **kwds)
+    axes = _axes(axis, x.ndim)
+    if x.dtype.kind in 'fc':
+        dtype = np.dtype(np.float32) if x.dtype == np.float16 else x.dtype
+    else:
+        dtype = np.dtype(np.float64)
+    total = _blocked('sum', x, axes, dtype=dtype)
+    count = 1
+    for a in axes:
+        count *= x.shape[a]
+    out = np.true_divide(total, count, dtype=dtype)
+    if x.dtype == np.float16:
+        out = out.astype(np.float16)
+    return _finish(out, axes, keepdims)
+
+
+# primitive name -> implementation, registered by `base.add_composites`
+REDUCTIONS = {name: _make(name) for name in _COMBINE}
+REDUCTIONS['mean'] = mean
@@ -0,0 +1,436 @@
+"""
+NumPy-only sparse matrices.
+
+`CSRMatrix` is the compute format (rows delimited by `indptr`, column
+`indices` sorted within a row, no duplicates); `COOMatrix` is for
+assembling one from (row, col, value) triplets and converts with
+`tocsr()`, which sums duplicates. Both are 2-D and take part in NumPy's
+dispatch protocols, so the registered primitives (`matmul`, `dot`, the
+reductions, the ufuncs) accept them unchanged and compiled graphs run on
+them in memory proportional to the nonzeros:
+- sparse @ dense and dense @ sparse give dense arrays, sparse @ sparse
+  a `CSRMatrix`,
+- `sum`/`mean`/`prod`/`max`/`min`/`all`/`any` over rows, columns or
+  everything give dense arrays or scalars, counting the implicit zeros,
+- an elementwise op keeps the sparsity pattern when it maps the implicit
+  zero to zero (`negative`, `sqrt`, `multiply` by anything finite,
+  `divide` by a nonzero scalar, `add` of two sparse matrices, ...),
+  checked on the actual operand values; any other op densifies its
+  sparse operands and gives a dense result.
+Functions outside these raise TypeError instead of densifying silently;
+call `todense` explicitly.
+"""
+from typing import Tuple
+
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+
+class SparseMatrix(NDArrayOperatorsMixin):
+    """Common base; operations run on the CSR form."""
+    ndim = 2
+
+    @property
+    def size(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self._arrays())
+
+    @property
+    def T(self) -> "CSRMatrix":
+        return self.transpose()
+
+    def transpose(self, axes=None) -> "CSRMatrix":
+        if axes is not None and tuple(axes) != (1, 0):
+            raise ValueError("axes don't match a 2-D sparse matrix")
+        return _transpose(self.tocsr())
+
+    def todense(self) -> np.ndarray:
+        return self.tocsr().todense()
+
+    toarray = todense
+
+    def astype(self, dtype) -> "CSRMatrix":
+        csr = self.tocsr()
+        return CSRMatrix(csr.data.astype(dtype), csr.indices, csr.indptr, csr.shape)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        return _ufunc(ufunc, method, inputs, kwargs)
+
+    def __array_function__(self, func, types, args, kwargs):
+        impl = _FUNCTIONS.get(func)
+        if impl is None:
+            return NotImplemented
+        return impl(*args, **kwargs)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(shape={self.shape}, nnz={self.nnz}, dtype={self.dtype})"
+
+
+class CSRMatrix(SparseMatrix):
+    __slots__ = ('data', 'indices', 'indptr', 'shape')
+
+    def __init__(self, data, indices, indptr, shape: Tuple[int, int]):
+        self.data = np.asarray(data)
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.indptr = np.asarray(indptr, dtype=np.intp)
+        self.shape = (int(shape[0]), int(shape[1]))
+        if self.indptr.shape != (self.shape[0] + 1,) or self.data.shape != self.indices.shape:
+            raise ValueError("inconsistent CSR arrays for shape %s" % (self.shape,))
+
+    def _arrays(self):
+        return (self.data, self.indices, self.indptr)
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    @classmethod
+    def from_dense(cls, x) -> "CSRMatrix":
+        x = np.asarray(x)
+        if x.ndim != 2:
+            raise ValueError(f"expected a 2-D array, got {x.ndim}-D")
+        rows, cols = np.nonzero(x)
+        indptr = np.zeros(x.shape[0] + 1, dtype=np.intp)
+        np.cumsum(np.bincount(rows, minlength=x.shape[0]), out=indptr[1:])
+        return cls(x[rows, cols], cols, indptr, x.shape)
+
+    def row_ids(self) -> np.ndarray:
+        """Row index of every stored value."""
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def tocsr(self) -> "CSRMatrix":
+        return self
+
+    def tocoo(self) -> "COOMatrix":
+        return COOMatrix(self.row_ids(), self.indices, self.data, self.shape)
+
+    def todense(self) -> np.ndarray:
+        out = np.zeros(self.shape, dtype=self.dtype)
+        out[self.row_ids(), self.indices] = self.data
+        return out
+
+    toarray = todense
+
+
+class COOMatrix(SparseMatrix):
+    __slots__ = ('row', 'col', 'data', 'shape')
+
+    def __init__(self, row, col, data, shape: Tuple[int, int]):
+        self.row = np.asarray(row, dtype=np.intp)
+        self.col = np.asarray(col, dtype=np.intp)
+        self.data = np.asarray(data)
+        self.shape = (int(shape[0]), int(shape[1]))
+        if not (self.row.shape == self.col.shape == self.data.shape) or self.data.ndim != 1:
+            raise ValueError("row, col and data must be 1-D and of equal length")
+
+    def _arrays(self):
+        return (self.row, self.col, self.data)
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    @classmethod
+    def from_dense(cls, x) -> "COOMatrix":
+        return CSRMatrix.from_dense(x).tocoo()
+
+    def tocoo(self) -> "COOMatrix":
+        return self
+
+    def tocsr(self) -> CSRMatrix:
+        """Sorted by (row, col); duplicate entries are summed."""
+        keys = self.row * self.shape[1] + self.col
+        order = np.argsort(keys, kind='stable')
+        keys, data = keys[order], self.data[order]
+        if len(keys):
+            first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            if len(first) != len(keys):
+                data = np.add.reduceat(data, first)
+                keys = keys[first]
+        return _from_keys(keys, data, self.shape)
+
+
+def _transpose(a: CSRMatrix) -> CSRMatrix:
+    return COOMatrix(a.indices, a.row_ids(), a.data, a.shape[::-1]).tocsr()
+
+
+def _from_keys(keys: np.ndarray, data: np.ndarray, shape) -> CSRMatrix:
+    """CSR from sorted, unique row-major `keys`."""
+    m, n = shape
+    rows = keys // n if n else keys
+    indptr = np.zeros(m + 1, dtype=np.intp)
+    np.cumsum(np.bincount(rows, minlength=m), out=indptr[1:])
+    return CSRMatrix(data, keys - rows * n, indptr, shape)
+
+
+def _keys(a: CSRMatrix) -> np.ndarray:
+    return a.row_ids() * a.shape[1] + a.indices
+
+
+# ============ MATMUL ============
+
+def _row_sums(values: np.ndarray, indptr: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """`out[i] = values[indptr[i]:indptr[i + 1]].sum(axis=0)` for every non-empty row i."""
+    counts = np.diff(indptr)
+    nonempty = np.flatnonzero(counts)
+    if len(nonempty):
+        out[nonempty] = np.add.reduceat(values, indptr[nonempty], axis=0)
+    return out
+
+
+def _csr_dense(a: CSRMatrix, b: np.ndarray) -> np.ndarray:
+    if b.ndim not in (1, 2) or b.shape[0] != a.shape[1]:
+        raise ValueError(f"matmul: shapes {a.shape} and {b.shape} not aligned")
+    dtype = np.result_type(a.data, b)
+    out = np.zeros((a.shape[0],) + b.shape[1:], dtype=dtype)
+    gathered = b[a.indices]
+    products = gathered * (a.data[:, None] if b.ndim == 2 else a.data)
+    return _row_sums(products, a.indptr, out)
+
+
+def _csr_csr(a: CSRMatrix, b: CSRMatrix) -> CSRMatrix:
+    """Every stored a[i, k] meets row k of b; the partial products are summed by output position."""
+    if a.shape[1] != b.shape[0]:
+        raise ValueError(f"matmul: shapes {a.shape} and {b.shape} not aligned")
+    starts = b.indptr[a.indices]
+    lengths = b.indptr[a.indices + 1] - starts
+    total = int(lengths.sum())
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - offsets, lengths) + np.arange(total)
+    rows = np.repeat(a.row_ids(), lengths)
+    values = np.repeat(a.data, lengths) * b.data[positions]
+    return COOMatrix(rows, b.indices[positions], values, (a.shape[0], b.shape[1])).tocsr()
+
+
+def matmul(a, b):
+    a_sparse, b_sparse = isinstance(a, SparseMatrix), isinstance(b, SparseMatrix)
+    if a_sparse and b_sparse:
+        return _csr_csr(a.tocsr(), b.tocsr())
+    if a_sparse:
+        b = np.asarray(b)
+        if b.ndim > 2:
+            return np.matmul(a.todense(), b)
+        return _csr_dense(a.tocsr(), b)
+    a = np.asarray(a)
+    if a.ndim > 2:
+        return np.matmul(a, b.todense())
+    # a @ b == (b.T @ a.T).T
+    return _csr_dense(_transpose(b.tocsr()), a.T).T
+
+
+def dot(a, b, out=None):
+    if out is not None:
+        raise TypeError("dot with a sparse operand doesn't support out=")
+    if np.ndim(a) == 0 or np.ndim(b) == 0:
+        return np.multiply(a, b)
+    return matmul(a, b)
+
+
+# ============ REDUCTIONS ============
+
+# reduction -> (ufunc combining values, result dtype for a given input dtype)
+_REDUCE = {
+    'sum': (np.add, lambda dt: np.sum(np.zeros(0, dt)).dtype),
+    'prod': (np.multiply, lambda dt: np.prod(np.zeros(0, dt)).dtype),
+    'max': (np.maximum, lambda dt: dt),
+    'min': (np.minimum, lambda dt: dt),
+    'all': (np.logical_and, lambda dt: np.dtype(bool)),
+    'any': (np.logical_or, lambda dt: np.dtype(bool)),
+}
+
+
+def _reduce_rows(name: str, a: CSRMatrix) -> np.ndarray:
+    """`name` over every row, implicit zeros included; a row without stored values reduces to zero."""
+    combine, result = _REDUCE[name]
+    dtype = result(a.dtype)
+    data = a.data.astype(dtype, copy=False)
+    out = np.zeros(a.shape[0], dtype=dtype)
+    counts = np.diff(a.indptr)
+    nonempty = np.flatnonzero(counts)
+    if len(nonempty):
+        values = combine.reduceat(data, a.indptr[nonempty])
+        partial = counts[nonempty] < a.shape[1]
+        values[partial] = combine(values[partial], np.zeros((), dtype))
+        out[nonempty] = values
+    return out
+
+
+def _reduce_all(name: str, a: CSRMatrix):
+    combine, result = _REDUCE[name]
+    dtype = result(a.dtype)
+    if a.size == 0 and name in ('max', 'min'):
+        raise ValueError(f"zero-size array to reduction operation {name} which has no identity")
+    if a.nnz == 0:
+        return combine.reduce(np.zeros(min(a.size, 1), dtype))
+    total = combine.reduce(a.data.astype(dtype, copy=False))
+    if a.nnz < a.size:
+        total = combine(total, np.zeros((), dtype))
+    return total
+
+
+def _axes(axis) -> tuple:
+    if axis is None:
+        return (0, 1)
+    axes = (axis,) if isinstance(axis, (int, np.integer)) else tuple(axis)
+    for ax in axes:
+        if not -2 <= ax < 2:
+            raise np.exceptions.AxisError(ax, 2)
+    return tuple(sorted({ax % 2 for ax in axes}))
+
+
+def _shape_result(out, axes: tuple, keepdims: bool, shape):
+    if not keepdims:
+        return out
+    return np.reshape(out, tuple(1 if i in axes else s for i, s in enumerate(shape)))
+
+
+def _reduction(name: str):
+    def reduction(a, axis=None, dtype=None, out=None, keepdims=False, **kwds):
+        if out is not None or kwds:
+            raise TypeError(f"{name} of a sparse matrix doesn't support {sorted(kwds) or ['out']}")
+        a = a.tocsr() if dtype is None else a.astype(dtype)
+        axes = _axes(axis)
+        if axes == (0, 1):
+            result = _reduce_all(name, a)
+        elif axes == (1,):
+            result = _reduce_rows(name, a)
+        elif axes == (0,):
+            result = _reduce_rows(name, _transpose(a))
+        else:
+            return a  # over no axes
+        return _shape_result(result, axes, keepdims, a.shape)
+    reduction.__name__ = reduction.__qualname__ = name
+    return reduction
+
+
+def mean(a, axis=None, dtype=None, out=None, keepdims=False, **kwds):
+    if dtype is None:
+        dtype = np.mean(np.zeros(1, a.dtype)).dtype
+    total = _FUNCTIONS[np.sum](a, axis=axis, dtype=dtype, out=out, keepdims=keepdims, **kwds)
+    count = 1
+    for ax in _axes(axis):
+        count *= a.shape[ax]
+    return np.true_divide(total, count, dtype=dtype)
+
+
+# ============ ELEMENTWISE ============
+
+def _maps_zero_to_zero(ufunc, args) -> bool:
+    """Whether `ufunc` gives zero wherever every sparse operand has an implicit zero."""
+    probe = [np.zeros((), a.dtype) if isinstance(a, SparseMatrix) else a for a in args]
+    with np.errstate(all='ignore'):
+        zero = ufunc(*probe)
+    return not np.any(zero)
+
+
+def _densify(args):
+    return [a.todense() if isinstance(a, SparseMatrix) else a for a in args]
+
+
+def _elementwise(ufunc, args):
+    sparse = [a.tocsr() for a in args if isinstance(a, SparseMatrix)]
+    shape = sparse[0].shape
+    if ufunc.nout != 1 or any(s.shape != shape for s in sparse) \
+            or any(np.ndim(a) > 2 for a in args) \
+            or np.broadcast_shapes(*[np.shape(a) for a in args]) != shape \
+            or not _maps_zero_to_zero(ufunc, args):
+        return ufunc(*_densify(args))
+
+    if len(sparse) == 1:
+        a = sparse[0]
+        rows = None
+        values = []
+        for x in args:
+            if isinstance(x, SparseMatrix):
+                values.append(a.data)
+            elif np.ndim(x) == 0:
+                values.append(x)
+            else:
+                if rows is None:
+                    rows = a.row_ids()
+                values.append(np.broadcast_to(x, shape)[rows, a.indices])
+        return CSRMatrix(ufunc(*values), a.indices, a.indptr, shape)
+
+    # several sparse operands: evaluate on the union of their patterns
+    keys = np.unique(np.concatenate([_keys(s) for s in sparse]))
+    rows, cols = np.divmod(keys, shape[1]) if shape[1] else (keys, keys)
+    values = []
+    for x in args:
+        if isinstance(x, SparseMatrix):
+            x = x.tocsr()
+            v = np.zeros(len(keys), x.dtype)
+            v[np.searchsorted(keys, _keys(x))] = x.data
+            values.append(v)
+        elif np.ndim(x) == 0:
+            values.append(x)
+        else:
+            values.append(np.broadcast_to(x, shape)[rows, cols])
+    return _from_keys(keys, ufunc(*values), shape)
+
+
+def _ufunc(ufunc, method, inputs, kwargs):
+    if method != '__call__':
+        return NotImplemented
+    if ufunc is np.matmul:
+        if kwargs:
+            return np.matmul(*_densify(inputs), **kwargs)
+        return matmul(*inputs)
+    if any(not isinstance(x, (SparseMatrix, np.ndarray, np.generic, int, float, complex, bool)) for x in inputs):
+        return NotImplemented
+    if kwargs:
+        # out=, where=, dtype=, ...: the dense path has the full semantics
+        return ufunc(*_densify(inputs), **kwargs)
+    return _elementwise(ufunc, inputs)
+
+
+# ============ CONVERSIONS ============
+
+def tocsr(x) -> CSRMatrix:
+    """`x` (dense 2-D, COO or CSR) as a CSR matrix."""
+    if isinstance(x, SparseMatrix):
+        return x.tocsr()
+    return CSRMatrix.from_dense(x)
+
+
+def tocoo(x) -> COOMatrix:
+    """`x` (dense 2-D, COO or CSR) as a COO matrix."""
+    if isinstance(x, SparseMatrix):
+        return x.tocoo()
+    return COOMatrix.from_dense(x)
+
+
+def todense(x) -> np.ndarray:
+    """`x` as a dense array; dense input is returned as is."""
+    if isinstance(x, SparseMatrix):
+        return x.todense()
+    return np.asarray(x)
+
+
+def issparse(x) -> bool:
+    return isinstance(x, SparseMatrix)
+
+
+# NumPy function -> implementation for sparse arguments (NEP 18 dispatch)
+_FUNCTIONS = {
+    np.dot: dot,
+    np.transpose: lambda a, axes=None: a.transpose(axes),
+    np.shape: lambda a: a.shape,
+    np.ndim: lambda a: 2,
+    np.size: lambda a, axis=None: a.size if axis is None else a.shape[axis],
+    np.mean: mean,
+}
+for _name in _REDUCE:
+    _FUNCTIONS[getattr(np, _name)] = _reduction(_name)
+_FUNCTIONS[np.amax] = _FUNCTIONS[np.max]
+_FUNCTIONS[np.amin] = _FUNCTIONS[np.min]
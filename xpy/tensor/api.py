@@ -1,20 +1,210 @@
-# from .python_ast import build_ast
-# from .base import Tensor
-# from ..base import NpPrimitives, CpPrimitives
-# from typing import Callable, Sequence, Optional
-
-
-# def forward(
-#     root: Tensor | Sequence[Tensor],
-#     name: Optional[str] = None,
-#     inputs: Optional[Sequence[Tensor]] = None
-# ):
-#     """
-#     Compile a computation graph into a Python function.
-#     - `inputs` explicitly defines the function arguments.
-#     """
-#     module = build_ast(root, name=name, inputs=inputs)
-#     code = compile(module, filename="compiledfunction", mode="exec")
-#     namespace = {"PRIM": Primitives()}
-#     exec(code, namespace)
-#     return namespace[name or "compiledfunction"]
+from .python_ast import build_ast, _as_roots, _value_dtype
+from .base import Tensor
+from .build_graph import topo_sort, collect_leaves
+from ..base import primitives
+from .. import metrics
+from typing import Any, Callable, Dict, Sequence, Optional, Tuple
+import ast
+import time
+import numpy as np
+
+
+# unnamed compiles share one metrics series, so the registry stays bounded
+DEFAULT_NAME = "compiledfunction"
+
+
+def load(
+    code,
+    name: str,
+    const_values: Sequence[Any] = (),
+    device: str = "cpu",
+    started: Optional[float] = None,
+    instrument: bool = True,
+) -> Callable:
+    """
+    Exec `code` (an AST module from `build_ast`/`lower`, or the code object
+    compiled from one) and return the function `name`, closed over
+    `const_values` when the module has a `make_<name>` factory.
+    - the compile time is recorded under `name` (see `xpy.metrics`),
+      counted from `started` (a `perf_counter()` value taken before
+      building the code) or from this call.
+    - the function is instrumented under `name` unless `instrument=False`
+      (runner objects time their own calls).
+    """
+    started = time.perf_counter() if started is None else started
+    if isinstance(code, ast.Module):
+        code = compile(code, filename="compiledfunction", mode="exec")
+    namespace = {"PRIM": primitives(device)}
+    exec(code, namespace)
+    if const_values:
+        fn = namespace[f"make_{name}"](*const_values)
+    else:
+        fn = namespace[name]
+    metrics.registry.get(name).record_compile(time.perf_counter() - started)
+    return metrics.instrument(fn, name) if instrument else fn
+
+
+def _arguments(root) -> list:
+    """The default function arguments: non-constant leaves in graph order (as `build_ast`)."""
+    return [n for n in topo_sort(_as_roots(root)) if n.parents == () and not n.is_const]
+
+
+def forward(
+    root: Tensor | Sequence[Tensor],
+    name: Optional[str] = None,
+    inputs: Optional[Sequence[Tensor]] = None,
+    device: str = "cpu",
+    strategy: str = "straight",
+    batch_argnums: Sequence[int] = (0,),
+    donate: Sequence[int] = (),
+    dtypes: Optional[Sequence[Any]] = None,
+    layout: bool = False,
+    batch_matmuls: bool = False,
+    incremental: bool = False,
+) -> Callable:
+    """
+    Compile a computation graph into a Python function.
+    - `name` names the function and its metrics (default: `DEFAULT_NAME`,
+      shared by all unnamed compiles, see `xpy.metrics`).
+    - `inputs` explicitly defines the function arguments.
+    - constant leaves (`Tensor.const`) are folded, see `specialize`.
+    - `strategy` is `'straight'` (one straight-line function), `'tiered'`
+      (interpreted until hot, see `interpreter.Tiered`), `'threads'`
+      (`ThreadParallel`), `'processes'` (`DataParallel`) or `'auto'`, which
+      picks one of those from the cost model (`cost.choose_strategy`).
+      The parallel runners shard the inputs in `batch_argnums` along axis 0.
+    - `donate` lists argument positions whose buffers may be overwritten,
+      see `build_ast`; it needs `dtypes`, the dtype of every argument.
+      Only straight-line code donates: other strategies and
+      `incremental=True` raise ValueError with `donate`.
+    - `batch_matmuls=True` first merges sibling matmuls where the cost model
+      says it pays (`batching.batch_matmuls`); `layout=True` then runs the
+      layout planner (`layout.plan_layout`).
+    - `incremental=True` compiles through the shared fragment cache of
+      `incremental.default_compiler()`, so recompiling an edited graph
+      reuses the code of its unchanged regions. Constants are bound, not folded.
+    """
+    name = name or DEFAULT_NAME
+    if donate and (strategy != "straight" or incremental):
+        raise ValueError("donate is only supported by straight-line code (strategy='straight', incremental=False)")
+    if batch_matmuls:
+        from .batching import batch_matmuls as batch_pass
+        inputs = _arguments(root) if inputs is None else inputs
+        root = batch_pass(root)
+    if layout:
+        from .layout import plan_layout
+        inputs = _arguments(root) if inputs is None else inputs
+        root = plan_layout(root)
+    if strategy == "tiered":
+        from .interpreter import Tiered
+        return Tiered(root, inputs=inputs, name=name, device=device)
+    if strategy != "straight":
+        from .data_parallel import DataParallel, ThreadParallel
+        inputs = _arguments(root) if inputs is None else inputs
+        if strategy == "auto":
+            from .cost import choose_strategy
+            strategy, _ = choose_strategy(root, inputs, batch_argnums)
+        if strategy == "threads":
+            return ThreadParallel(root, inputs, batch_argnums, device=device, name=name)
+        if strategy == "processes":
+            return DataParallel(root, inputs, batch_argnums, device=device, name=name)
+        if strategy != "straight":
+            raise ValueError(f"unknown strategy {strategy!r}")
+    if incremental:
+        from .incremental import default_compiler
+        return default_compiler().compile(root, inputs=inputs, device=device, name=name)
+    if any(leaf.is_const for leaf in collect_leaves(_as_roots(root))):
+        return specialize(root, {}, inputs=inputs, name=name, device=device, donate=donate, dtypes=dtypes)
+    donated, known_dtypes = (), None
+    if donate:
+        inputs = _arguments(root) if inputs is None else inputs
+        donated = [inputs[i] for i in donate]
+        if dtypes is not None:
+            known_dtypes = {t: np.dtype(d) for t, d in zip(inputs, dtypes)}
+    started = time.perf_counter()
+    module = build_ast(root, name=name, inputs=inputs, donate=donated, dtypes=known_dtypes)
+    return load(module, name, device=device, started=started)
+
+
+def eval_node(prim, node: Tensor, args: Sequence[Any]) -> Any:
+    """Run a single non-leaf node eagerly against the primitive table `prim`."""
+    return getattr(prim, node.prim)(*args, **node.params)
+
+
+def specialize(
+    outputs: Tensor | Sequence[Tensor],
+    known: Dict[Tensor, Any],
+    inputs: Optional[Sequence[Tensor]] = None,
+    name: Optional[str] = None,
+    device: str = "cpu",
+    donate: Sequence[int] = (),
+    dtypes: Optional[Sequence[Any]] = None,
+    instrument: bool = True,
+) -> Callable:
+    """
+    Compile only what `outputs` need with the leaves in `known` fixed;
+    see `lower` for what is pruned and folded, and `load` for `instrument`.
+    """
+    name = name or DEFAULT_NAME
+    started = time.perf_counter()
+    module, const_values = lower(outputs, known, inputs=inputs, name=name, device=device, donate=donate, dtypes=dtypes)
+    return load(module, name, const_values, device=device, started=started, instrument=instrument)
+
+
+def lower(
+    outputs: Tensor | Sequence[Tensor],
+    known: Dict[Tensor, Any],
+    inputs: Optional[Sequence[Tensor]] = None,
+    name: Optional[str] = None,
+    device: str = "cpu",
+    donate: Sequence[int] = (),
+    dtypes: Optional[Sequence[Any]] = None,
+) -> Tuple[ast.Module, list]:
+    """
+    Lower what `outputs` need, with the leaves in `known` fixed.
+    - Nodes unreachable from `outputs` are dropped.
+    - Constant leaves (`Tensor.const`) count as known.
+    - Every node that depends only on `known` leaves is evaluated once here;
+      those feeding the remaining graph are baked into the function's closure.
+    - The remaining (unknown) leaves become the arguments, unless `inputs`
+      says otherwise.
+    - `donate` are positions in the arguments whose buffers may be reused
+      for outputs (see `build_ast`); `dtypes`, the dtype of every argument,
+      restricts them to outputs of the same result dtype.
+    Returns the AST module and the values of its `make_<name>` factory
+    arguments (empty when nothing had to be baked in).
+    """
+    name = name or DEFAULT_NAME
+    roots = _as_roots(outputs)
+    prim = primitives(device)
+
+    topo = topo_sort(roots)
+    values = {}
+    for node in topo:
+        if node.parents == ():
+            if node in known:
+                values[node] = known[node]
+            elif node.is_const:
+                values[node] = node.value
+        elif all(p in values for p in node.parents):
+            values[node] = eval_node(prim, node, [values[p] for p in node.parents])
+
+    # Only folded values read by live code (or returned) are kept
+    consts = {r: None for r in roots if r in values}
+    for node in topo:
+        if node not in values:
+            for p in node.parents:
+                if p in values:
+                    consts[p] = None
+    consts = list(consts)
+
+    if inputs is None:
+        inputs = [n for n in topo if n.parents == () and n not in values]
+
+    known_dtypes = None
+    if dtypes is not None:
+        known_dtypes = {c: _value_dtype(values[c]) for c in consts}
+        known_dtypes.update((t, np.dtype(d)) for t, d in zip(inputs, dtypes))
+    module = build_ast(roots, name=name, inputs=inputs, consts=consts,
+                       donate=[inputs[i] for i in donate], dtypes=known_dtypes)
+    return module, [values[c] for c in consts]
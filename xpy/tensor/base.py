@@ -1,18 +1,30 @@
 from typing import Any, Sequence, Callable
-from .utils import name_filler
+from types import MappingProxyType
+from .utils import name_filler, infer_shape
 from ..backend  import xp
 lib = xp()
 
 import ast
 
 def literal_to_ast(v):
-  if isinstance(v, (int, float, str, bool, lib.ndarray)) or v is None:
+  if isinstance(v, (int, float, str, bool, lib.ndarray)) or v is None or v is Ellipsis:
     return ast.Constant(value=v)
-  elif isinstance(v, (list, tuple)):
+  elif isinstance(v, list):
     return ast.List(
       elts=[literal_to_ast(x) for x in v],
       ctx=ast.Load()
     )
+  elif isinstance(v, tuple):
+    return ast.Tuple(
+      elts=[literal_to_ast(x) for x in v],
+      ctx=ast.Load()
+    )
+  elif isinstance(v, slice):
+    return ast.Call(
+      func=ast.Name(id='slice', ctx=ast.Load()),
+      args=[literal_to_ast(v.start), literal_to_ast(v.stop), literal_to_ast(v.step)],
+      keywords=[],
+    )
   elif isinstance(v, dict):
     return ast.Dict(
       keys=[literal_to_ast(k) for k in v.keys()],
@@ -22,15 +34,43 @@ def literal_to_ast(v):
     raise TypeError(f"Unsupported literal type in AST: {type(v)}")
 
 
+_NO_PARAMS = MappingProxyType({})
+_NO_VALUE = object()
+
+
 class Tensor:
+  # Graphs can hold hundreds of thousands of nodes: no per-instance __dict__,
+  # names are only generated when asked for and AST kwds are built on demand.
+  __slots__ = ('_name', 'expr_given', 'shape', 'parents', 'prim', 'index', 'params', 'value', '__weakref__')
+
   def __init__(self, shape=(), parents=(), name=None, params:dict={}):
     self.expr_given = name is not None
-    self.name = name or name_filler.get_name(base="var")
+    self._name = name
     self.shape = shape
     self.parents = parents
     self.prim = None
     self.index = None 
-    self.kwds = {k:literal_to_ast(v) for k, v in params.items()}
+    self.params = dict(params) if params else _NO_PARAMS
+    self.value = _NO_VALUE
+
+  @property
+  def is_const(self):
+    """Leaf holding a value fixed at trace time (see `Tensor.const`)."""
+    return self.value is not _NO_VALUE
+
+  @property
+  def name(self):
+    if self._name is None:
+      self._name = name_filler.get_name(base="var")
+    return self._name
+
+  @name.setter
+  def name(self, value):
+    self._name = value
+
+  @property
+  def kwds(self):
+    return {k:literal_to_ast(v) for k, v in self.params.items()}
 
   def __str__(self):
       if hasattr(self, 'str'):
@@ -53,13 +93,103 @@ class Tensor:
   
   @staticmethod
   def call(*args, prim: str, params:dict={}):
-    out = Tensor(parents=args, name=prim, params=params)
+    shape = infer_shape(prim, [a.shape for a in args], params)
+    out = Tensor(shape=shape, parents=args, name=prim, params=params)
     out.prim = prim
     return out
   
   @staticmethod
   def constant(value:Any):
     return literal_to_ast(value)
+
+  @staticmethod
+  def const(value:Any):
+    """Leaf carrying a concrete value; compile paths fold it instead of taking it as an argument."""
+    import numpy as np
+    out = Tensor(shape=np.shape(value), name="const")
+    out.value = value
+    return out
+
+  # ---- operator overloading, maps onto the registered primitives ----
+  # __eq__/__ne__ are deliberately left alone: nodes are used as dict keys
+  # throughout the compiler. Use the `equal`/`not_equal` primitives instead.
+
+  def _binary(self, other, prim, reverse=False):
+    other = as_tensor(other)
+    return Tensor.call(other, self, prim=prim) if reverse else Tensor.call(self, other, prim=prim)
+
+  def __add__(self, other): return self._binary(other, 'add')
+  def __radd__(self, other): return self._binary(other, 'add', True)
+  def __sub__(self, other): return self._binary(other, 'subtract')
+  def __rsub__(self, other): return self._binary(other, 'subtract', True)
+  def __mul__(self, other): return self._binary(other, 'multiply')
+  def __rmul__(self, other): return self._binary(other, 'multiply', True)
+  def __truediv__(self, other): return self._binary(other, 'divide')
+  def __rtruediv__(self, other): return self._binary(other, 'divide', True)
+  def __pow__(self, other): return self._binary(other, 'power')
+  def __rpow__(self, other): return self._binary(other, 'power', True)
+  def __matmul__(self, other): return self._binary(other, 'matmul')
+  def __rmatmul__(self, other): return self._binary(other, 'matmul', True)
+  def __lt__(self, other): return self._binary(other, 'less')
+  def __le__(self, other): return self._binary(other, 'less_equal')
+  def __gt__(self, other): return self._binary(other, 'greater')
+  def __ge__(self, other): return self._binary(other, 'greater_equal')
+  def __and__(self, other): return self._binary(other, 'bitwise_and')
+  def __rand__(self, other): return self._binary(other, 'bitwise_and', True)
+  def __or__(self, other): return self._binary(other, 'bitwise_or')
+  def __ror__(self, other): return self._binary(other, 'bitwise_or', True)
+  def __xor__(self, other): return self._binary(other, 'bitwise_xor')
+  def __rxor__(self, other): return self._binary(other, 'bitwise_xor', True)
+
+  def __neg__(self): return Tensor.call(self, prim='negative')
+  def __pos__(self): return Tensor.call(self, prim='positive')
+  def __abs__(self): return Tensor.call(self, prim='absolute')
+  def __invert__(self): return Tensor.call(self, prim='invert')
+
+  def __getitem__(self, index):
+    return Tensor.call(self, prim='getitem', params={'index': index})
+
+  def __iter__(self):
+    # without it Python would iterate through __getitem__ with no end
+    if self.shape is None or len(self.shape) == 0 or self.shape[0] is None:
+      raise TypeError(f"can't iterate over a Tensor of shape {self.shape}; the length of axis 0 must be known")
+    return (self[i] for i in range(self.shape[0]))
+
+  def __bool__(self):
+    raise TypeError("the truth value of a traced Tensor is unknown until run time; "
+                    "use xpy.cond for data-dependent branches")
+
+  @property
+  def ndim(self):
+    return None if self.shape is None else len(self.shape)
+
+  @property
+  def T(self):
+    return Tensor.call(self, prim='transpose')
+
+  def transpose(self, axes=None):
+    return Tensor.call(self, prim='transpose', params={} if axes is None else {'axes': tuple(axes)})
+
+  def reshape(self, *shape):
+    shape = shape[0] if len(shape) == 1 and not isinstance(shape[0], int) else shape
+    return Tensor.call(self, prim='reshape', params={'shape': tuple(shape)})
+
+  def sum(self, axis=None, keepdims=False):
+    return Tensor.call(self, prim='sum', params={'axis': axis, 'keepdims': keepdims})
+
+  def mean(self, axis=None, keepdims=False):
+    return Tensor.call(self, prim='mean', params={'axis': axis, 'keepdims': keepdims})
+
+  def max(self, axis=None, keepdims=False):
+    return Tensor.call(self, prim='max', params={'axis': axis, 'keepdims': keepdims})
+
+  def min(self, axis=None, keepdims=False):
+    return Tensor.call(self, prim='min', params={'axis': axis, 'keepdims': keepdims})
+
+
+def as_tensor(value:Any) -> Tensor:
+  """`value` itself if it is a graph node, otherwise a constant leaf holding it."""
+  return value if isinstance(value, Tensor) else Tensor.const(value)
   
 
 class GFunc:
@@ -0,0 +1,116 @@
+"""
+Horizontal batching of independent matmuls.
+
+Sibling `matmul` nodes with identical operand shapes (attention heads,
+experts, ...) are rewritten into one batched `matmul` over
+`stack_operands` of their operands; each original result becomes a
+`getitem` view of the batched one. An operand shared by the whole group
+is not stacked, matmul broadcasting reuses it. A group is only rewritten
+when the cost model prices the stacking copies below the saved
+dispatches.
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+from .base import Tensor
+from .build_graph import topo_sort
+from .cost import CostModel, node_cost, default_model
+from .layout import _rebuild
+from .python_ast import _as_roots
+
+
+def _levels(topo) -> Dict[Tensor, int]:
+    """Longest path from a leaf; nodes on the same level never depend on each other."""
+    level = {}
+    for n in topo:
+        level[n] = 1 + max((level[p] for p in n.parents), default=-1)
+    return level
+
+
+def sibling_groups(topo, min_group: int = 2) -> List[List[Tensor]]:
+    """Independent `matmul` nodes with the same operand shapes, in graph order."""
+    level = _levels(topo)
+    groups = defaultdict(list)
+    for n in topo:
+        if n.prim != 'matmul' or len(n.parents) != 2 or n.params:
+            continue
+        a, b = n.parents
+        if a.shape is None or b.shape is None or len(a.shape) < 2 or len(b.shape) < 2:
+            continue
+        groups[(tuple(a.shape), tuple(b.shape), level[n])].append(n)
+    return [g for g in groups.values() if len(g) >= min_group]
+
+
+def _batch(group: Sequence[Tensor], new: Dict[Tensor, Tensor]) -> Optional[List[Tensor]]:
+    """Batched replacements for `group` (operands taken from `new`), or None if nothing is gained."""
+    operands = []
+    for side in (0, 1):
+        nodes = [new[m.parents[side]] for m in group]
+        if all(t is nodes[0] for t in nodes):
+            operands.append(nodes[0])
+        else:
+            operands.append(Tensor.call(*nodes, prim='stack_operands', params={'axis': 0}))
+    if all(o.prim != 'stack_operands' for o in operands):
+        return None  # the same product k times, nothing to batch
+    batched = Tensor.call(*operands, prim='matmul')
+    return [Tensor.call(batched, prim='getitem', params={'index': i}) for i in range(len(group))]
+
+
+def _time(nodes, model: CostModel, itemsize: int) -> Optional[float]:
+    total = 0.0
+    for n in nodes:
+        c = node_cost(n, itemsize)
+        if c is None:
+            return None
+        total += model.time(c)
+    return total
+
+
+def _new_nodes(outs: Sequence[Tensor], stop) -> list:
+    return [n for n in topo_sort(list(outs), stop=list(stop)) if n not in stop]
+
+
+def batch_matmuls(
+    outputs: Tensor | Sequence[Tensor],
+    model: Optional[CostModel] = None,
+    itemsize: int = 8,
+    min_group: int = 2,
+):
+    """
+    Rewrite sibling matmul groups of `outputs` (see module docstring) and
+    return the new outputs in the same structure. Leaves and untouched
+    nodes are reused.
+    """
+    model = model or default_model()
+    roots = _as_roots(outputs)
+    topo = topo_sort(roots)
+    level = _levels(topo)
+    group_of = {}
+    for g in sibling_groups(topo, min_group):
+        for m in g:
+            group_of[m] = g
+
+    # by level, so every member's operands are rebuilt before the group is
+    new: Dict[Tensor, Tensor] = {}
+    for n in sorted(topo, key=level.__getitem__):
+        if n in new:
+            continue
+        if n.parents == ():
+            new[n] = n
+            continue
+        group = group_of.get(n)
+        if group is not None:
+            outs = _batch(group, new)
+            if outs is not None:
+                before = _time(group, model, itemsize)
+                after = _time(_new_nodes(outs, set(new.values())), model, itemsize)
+                if before is not None and after is not None and after < before:
+                    for m, o in zip(group, outs):
+                        new[m] = o
+                    continue
+            for m in group:
+                group_of.pop(m, None)
+        new[n] = _rebuild(n, [new[p] for p in n.parents])
+
+    result = [new[r] for r in roots]
+    return result if isinstance(outputs, (list, tuple)) else result[0]
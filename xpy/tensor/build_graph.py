@@ -1,9 +1,17 @@
 from .base import Tensor
+from .graph_store import GraphStore
 
-def assign_names(topo):
+# primitives whose result is a view of their first operand (no data is touched)
+VIEW_OPS = frozenset({'reshape', 'expand_dims', 'squeeze', 'transpose', 'broadcast_to', 'getitem'})
+
+def assign_names(topo, consts=()):
 	names = {}
 	temp_i = 0
+	for i, c in enumerate(consts):
+		names[c] = f"c{i}"
 	for n in topo:
+		if n in names:
+			continue
 		if n.parents == ():
 				# Leaf nodes get parameter names
 			names[n] = f"x{n.index}"
@@ -12,70 +20,58 @@ def assign_names(topo):
 			temp_i += 1
 	return names
 
-# def collect_leaves(roots):
-# 	seen = set()
-# 	leaves = []
-
-# 	def visit(n):
-# 		if n in seen:
-# 				return
-# 		seen.add(n)
-
-# 		if n.parents == ():
-# 				leaves.append(n)
-# 		else:
-# 				for p in n.parents:
-# 						visit(p)
-
-# 	for r in roots:
-# 			visit(r)
-
-# 	return leaves
-
 def collect_leaves(roots):
     seen = set()
     leaves = []
+    # explicit stack instead of recursion so deep graphs don't hit the recursion limit
+    stack = list(reversed(roots))
 
-    def visit(n):
+    while stack:
+        n = stack.pop()
         if id(n) in seen:
-            return
+            continue
         seen.add(id(n))
 
         if n.parents == ():
             leaves.append(n)
         else:
-            for p in n.parents:
-                visit(p)
-
-    for r in roots:
-        visit(r)
+            stack.extend(reversed(n.parents))
 
     return leaves
 
-# def auto_index_leaves(roots):
-# 	leaves = collect_leaves(roots)
-# 	for i, leaf in enumerate(leaves):
-# 		leaf.index = i
-
 def auto_index_leaves(roots):
     leaves = collect_leaves(roots)
     for i, leaf in enumerate(leaves):
         leaf.index = i
 
-def topo_sort(roots):
+def topo_sort(roots, stop=()):
+	"""
+	Post-order of the nodes reachable from `roots`.
+	Nodes in `stop` are emitted but their parents are not visited.
+	A `GraphStore` is accepted in place of `roots`; its node ids are returned.
+	"""
+	if isinstance(roots, GraphStore):
+		return roots.topo_order(stop=stop)
+
 	auto_index_leaves(roots)
+	stop = set(stop)
 	seen = set()
 	order = []
 
-	def visit(n):
-		if n in seen:
-			return
-		seen.add(n)
-		for p in n.parents:
-			visit(p)
-		order.append(n)
-
 	for r in roots:
-		visit(r)
+		if r in seen:
+			continue
+		seen.add(r)
+		stack = [(r, iter(() if r in stop else r.parents))]
+		while stack:
+			n, parents = stack[-1]
+			for p in parents:
+				if p not in seen:
+					seen.add(p)
+					stack.append((p, iter(() if p in stop else p.parents)))
+					break
+			else:
+				stack.pop()
+				order.append(n)
 
 	return order
@@ -0,0 +1,143 @@
+"""
+Structured control flow for traced code.
+
+Loop bodies and branches are traced once on placeholders into `Subgraph`s
+that `build_ast` emits as helper functions, so the outer graph holds a
+single node per loop whatever the trip count. Outer nodes used inside a
+body are detected and passed to it as extra operands.
+"""
+from typing import Callable, List, Optional, Sequence
+from .base import Tensor, as_tensor
+from .build_graph import topo_sort
+from .python_ast import Subgraph
+
+
+def _flatten(value):
+    multi = isinstance(value, (tuple, list))
+    return [as_tensor(v) for v in (value if multi else (value,))], multi
+
+
+def _structure(values, multi):
+    return tuple(values) if multi else values[0]
+
+
+def _placeholders(tensors, drop_leading=False) -> List[Tensor]:
+    out = []
+    for t in tensors:
+        shape = t.shape
+        if shape is not None and drop_leading:
+            shape = tuple(shape[1:])
+        out.append(Tensor(shape=shape))
+    return out
+
+
+def _captures(placeholders: Sequence[Tensor], outputs: Sequence[Tensor]) -> List[Tensor]:
+    """
+    Outer-graph nodes a body reads: the nodes that do not depend on
+    `placeholders` but feed one that does, or are returned directly.
+    """
+    topo = topo_sort(outputs)
+    dependent = set(placeholders)
+    for n in topo:
+        if n not in dependent and any(p in dependent for p in n.parents):
+            dependent.add(n)
+
+    captures = {}
+    for n in topo:
+        if n in dependent:
+            for p in n.parents:
+                if p not in dependent:
+                    captures[p] = None
+    for o in outputs:
+        if o not in dependent:
+            captures[o] = None
+    return list(captures)
+
+
+def _union(*groups) -> List[Tensor]:
+    out = {}
+    for g in groups:
+        for t in g:
+            out[t] = None
+    return list(out)
+
+
+def _unpack(node: Tensor, shapes) -> List[Tensor]:
+    outs = []
+    for i, shape in enumerate(shapes):
+        t = Tensor.call(node, prim='getitem', params={'index': i})
+        t.shape = shape
+        outs.append(t)
+    return outs
+
+
+def scan(f: Callable, init, xs=None, length: Optional[int] = None):
+    """
+    Loop `carry, y = f(carry, x)` over the leading axis of `xs`.
+    - `init`/`xs` and the carry/y returned by `f` may be a Tensor or a tuple of them.
+    - `f` may return `None` for y. `length` is required when `xs` is None.
+    Returns `(final_carry, stacked_ys)`.
+    """
+    carry, carry_multi = _flatten(init)
+    xs_list, xs_multi = _flatten(xs) if xs is not None else ([], False)
+    if length is None:
+        if not xs_list or xs_list[0].shape is None:
+            raise ValueError("scan: `length` is required when it can't be read from `xs`")
+        length = xs_list[0].shape[0]
+
+    carry_ph = _placeholders(carry)
+    xs_ph = _placeholders(xs_list, drop_leading=True)
+    new_carry, y = f(_structure(carry_ph, carry_multi), _structure(xs_ph, xs_multi) if xs_list else None)
+
+    new_carry, _ = _flatten(new_carry)
+    if len(new_carry) != len(carry):
+        raise ValueError(f"scan: body returned {len(new_carry)} carry values, expected {len(carry)}")
+    ys, ys_multi = _flatten(y) if y is not None else ([], False)
+
+    outputs = new_carry + ys
+    captures = _captures(carry_ph + xs_ph, outputs)
+    body = Subgraph(carry_ph + xs_ph + captures, outputs)
+    node = Tensor.call(*carry, *xs_list, *captures, prim='scan', params={
+        'body': body, 'num_carry': len(carry), 'num_xs': len(xs_list), 'length': length,
+    })
+
+    shapes = [c.shape for c in carry] + [None if v.shape is None else (length,) + tuple(v.shape) for v in ys]
+    outs = _unpack(node, shapes)
+    final = _structure(outs[:len(carry)], carry_multi)
+    stacked = _structure(outs[len(carry):], ys_multi) if ys else None
+    return final, stacked
+
+
+def while_loop(cond_fun: Callable, body_fun: Callable, init):
+    """Repeat `carry = body_fun(carry)` while `cond_fun(carry)` is true."""
+    carry, multi = _flatten(init)
+    ph = _placeholders(carry)
+    pred = as_tensor(cond_fun(_structure(ph, multi)))
+    new_carry, _ = _flatten(body_fun(_structure(ph, multi)))
+    if len(new_carry) != len(carry):
+        raise ValueError(f"while_loop: body returned {len(new_carry)} values, expected {len(carry)}")
+
+    captures = _union(_captures(ph, [pred]), _captures(ph, new_carry))
+    node = Tensor.call(*carry, *captures, prim='while_loop', params={
+        'cond': Subgraph(ph + captures, [pred]),
+        'body': Subgraph(ph + captures, new_carry),
+        'num_carry': len(carry),
+    })
+    return _structure(_unpack(node, [c.shape for c in carry]), multi)
+
+
+def cond(pred, true_fun: Callable, false_fun: Callable, *operands):
+    """`true_fun(*operands)` if `pred` else `false_fun(*operands)`; only one branch runs."""
+    ops = [as_tensor(o) for o in operands]
+    ph = _placeholders(ops)
+    true_out, multi = _flatten(true_fun(*ph))
+    false_out, _ = _flatten(false_fun(*ph))
+    if len(true_out) != len(false_out):
+        raise ValueError(f"cond: branches return {len(true_out)} and {len(false_out)} values")
+
+    captures = _union(_captures(ph, true_out), _captures(ph, false_out))
+    node = Tensor.call(as_tensor(pred), *ops, *captures, prim='cond', params={
+        'true_fn': Subgraph(ph + captures, true_out),
+        'false_fn': Subgraph(ph + captures, false_out),
+    })
+    return _structure(_unpack(node, [t.shape for t in true_out]), multi)
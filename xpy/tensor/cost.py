@@ -0,0 +1,400 @@
+"""
+Roofline-style cost model for graph nodes.
+
+Each primitive is given a FLOP count and the bytes it moves, from the
+inferred shapes of its operands. A node is estimated at
+`dispatch + max(flops * flop_time, bytes * byte_time)`; views cost only
+the (smaller) `view_dispatch`. The coefficients default to conservative figures and can be
+measured on the host with `calibrate()`.
+"""
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+from .base import Tensor
+from .build_graph import topo_sort, VIEW_OPS
+from .python_ast import Subgraph, _as_roots
+from ..base import elementwise_ops, reduction_ops
+
+# FLOPs per output element for elementwise primitives (default 1)
+ELEMENT_FLOPS = {
+    'divide': 4, 'sqrt': 4, 'clip': 2, 'power': 10,
+    **{name: 10 for name in (
+        'exp', 'log', 'log1p', 'expm1',
+        'sin', 'cos', 'tan', 'sinh', 'cosh', 'tanh',
+        'arcsin', 'arccos', 'arctan', 'arcsinh', 'arccosh', 'arctanh',
+    )},
+}
+# data is moved but not computed on
+COPY_OPS = {'concatenate', 'stack', 'stack_operands', 'split', 'take', 'put', 'diag', 'ascontiguousarray'}
+
+
+def _size(shape) -> int:
+    return math.prod(shape)
+
+
+def _known(shape) -> bool:
+    """Whether every dimension of `shape` is known (batch axes may be None)."""
+    return shape is not None and None not in shape
+
+
+class Cost:
+    __slots__ = ('flops', 'bytes', 'out_bytes', 'steps', 'views')
+
+    def __init__(self, flops=0, bytes=0, out_bytes=0, steps=1, views=0):
+        self.flops = flops
+        self.bytes = bytes
+        self.out_bytes = out_bytes
+        self.steps = steps  # dispatches, > 1 for loops
+        self.views = views  # view-only dispatches
+
+
+def subgraph_cost(sub: Subgraph, itemsize: int) -> Optional[Cost]:
+    total = Cost(steps=0)
+    for n in topo_sort(list(sub.outputs), stop=sub.inputs):
+        if n.parents == () or n in sub.inputs:
+            continue
+        c = node_cost(n, itemsize)
+        if c is None:
+            return None
+        total.flops += c.flops
+        total.bytes += c.bytes
+        total.steps += c.steps
+        total.views += c.views
+    return total
+
+
+def _outputs_bytes(outputs, itemsize, stacked_from=None, length=1) -> Optional[int]:
+    """Bytes of a subgraph's results; outputs from `stacked_from` on are stacked `length` times."""
+    total = 0
+    for i, o in enumerate(outputs):
+        if not _known(o.shape):
+            return None
+        reps = length if stacked_from is not None and i >= stacked_from else 1
+        total += _size(o.shape) * itemsize * reps
+    return total
+
+
+def node_cost(node: Tensor, itemsize: int = 8) -> Optional[Cost]:
+    """FLOPs and bytes for one non-leaf node, or None when shapes are unknown."""
+    prim, params = node.prim, node.params
+
+    if prim in VIEW_OPS:
+        return Cost(0, 0, 0, steps=0, views=1)
+    if prim in ('scan', 'while_loop', 'cond'):
+        if prim == 'cond':
+            costs = [subgraph_cost(params['true_fn'], itemsize), subgraph_cost(params['false_fn'], itemsize)]
+            out_bytes = _outputs_bytes(params['true_fn'].outputs, itemsize)
+            if None in costs or out_bytes is None:
+                return None
+            c = max(costs, key=lambda c: c.flops + c.bytes)
+            return Cost(c.flops, c.bytes, out_bytes, c.steps + 1, c.views)
+        body = subgraph_cost(params['body'], itemsize)
+        # a while_loop's trip count is unknown; it is costed as one iteration
+        trips = params.get('length', 1)
+        out_bytes = _outputs_bytes(params['body'].outputs, itemsize, params.get('num_carry'), trips)
+        if body is None or out_bytes is None:
+            return None
+        return Cost(body.flops * trips, body.bytes * trips, out_bytes, body.steps * trips + 1, body.views * trips)
+
+    shapes = [p.shape for p in node.parents]
+    if not _known(node.shape) or not all(_known(s) for s in shapes):
+        return None
+    out = _size(node.shape)
+    out_bytes = out * itemsize
+    in_bytes = sum(_size(s) for s in shapes) * itemsize
+
+    if prim in ('stack', 'stack_operands', 'concatenate'):
+        # NumPy prepares every operand in Python: about one dispatch each
+        return Cost(0, in_bytes + out_bytes, out_bytes, steps=2 + len(shapes))
+    if prim in COPY_OPS:
+        return Cost(0, in_bytes + out_bytes, out_bytes)
+    if prim in ('matmul', 'dot'):
+        # a second dispatch for the BLAS call setup
+        k = shapes[0][-1] if shapes[0] else 1
+        return Cost(2 * out * k, in_bytes + out_bytes, out_bytes, steps=2)
+    if prim == 'tensordot':
+        # size(a) * size(b) = out * k^2 for any contraction
+        k = math.sqrt(_size(shapes[0]) * _size(shapes[1]) / max(out, 1))
+        return Cost(int(2 * out * k), in_bytes + out_bytes, out_bytes)
+    if prim == 'trace':
+        return Cost(min(shapes[0][:2]) * max(out, 1), in_bytes, out_bytes)
+    if prim == 'conv':
+        w = shapes[1]
+        return Cost(2 * out * _size(w[1:]), in_bytes + out_bytes, out_bytes)
+    if prim == 'conv_transpose':
+        w = shapes[1]
+        return Cost(2 * _size(shapes[0]) * _size(w[1:]), in_bytes + out_bytes, out_bytes)
+    if prim in reduction_ops:
+        return Cost(_size(shapes[0]), in_bytes + out_bytes, out_bytes)
+    if prim in ('softmax', 'log_softmax'):
+        return Cost(5 * out, in_bytes + 2 * out_bytes, out_bytes)
+    if prim in elementwise_ops or prim == 'where':
+        return Cost(ELEMENT_FLOPS.get(prim, 1) * out, in_bytes + out_bytes, out_bytes)
+    return None
+
+
+# primitives with a rule in `node_cost`; tests check it covers the op lists
+_RULED = VIEW_OPS | COPY_OPS | set(elementwise_ops) | set(reduction_ops) | {
+    'matmul', 'dot', 'tensordot', 'trace', 'conv', 'conv_transpose', 'softmax', 'log_softmax', 'where',
+}
+
+
+class CostModel:
+    """
+    Seconds per FLOP, per byte moved and per primitive dispatch (views
+    dispatch faster), plus the fixed overheads of the parallel runners.
+    """
+    FIELDS = ('flop_time', 'byte_time', 'dispatch', 'view_dispatch', 'thread_overhead', 'process_overhead', 'workers')
+
+    def __init__(
+        self,
+        flop_time: float = 1 / 20e9,
+        byte_time: float = 1 / 8e9,
+        dispatch: float = 2e-6,
+        view_dispatch: float = 3e-7,
+        thread_overhead: float = 50e-6,
+        process_overhead: float = 500e-6,
+        workers: Optional[int] = None,
+    ):
+        self.flop_time = flop_time
+        self.byte_time = byte_time
+        self.dispatch = dispatch
+        self.view_dispatch = view_dispatch
+        self.thread_overhead = thread_overhead
+        self.process_overhead = process_overhead
+        self.workers = workers or os.cpu_count() or 1
+
+    def time(self, cost: Cost) -> float:
+        return cost.steps * self.dispatch + cost.views * self.view_dispatch + max(cost.flops * self.flop_time, cost.bytes * self.byte_time)
+
+    def as_dict(self) -> dict:
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    @staticmethod
+    def path() -> str:
+        from ..python_packages import probe_cache_path
+        head, tail = os.path.split(probe_cache_path())
+        return os.path.join(head, tail.replace("env-", "cost-", 1))
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.as_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "CostModel":
+        """The calibrated model saved for this host, or the defaults."""
+        try:
+            with open(path or cls.path()) as f:
+                return cls(**{k: v for k, v in json.load(f).items() if k in cls.FIELDS})
+        except (OSError, ValueError, TypeError):
+            return cls()
+
+
+_default: Optional[CostModel] = None
+
+def default_model() -> CostModel:
+    global _default
+    if _default is None:
+        _default = CostModel.load()
+    return _default
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def calibrate(repeat: int = 5, processes: bool = False, save: bool = True) -> CostModel:
+    """
+    Measure the model's coefficients with micro-benchmarks on this host.
+    `processes=True` also times a round trip through a `WorkerPool` (starts processes).
+    """
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    global _default
+
+    model = CostModel()
+    n = 512
+    a, b = np.random.rand(n, n), np.random.rand(n, n)
+    model.flop_time = _best_of(lambda: a @ b, repeat) / (2 * n ** 3)
+
+    x, y = np.random.rand(1 << 22), np.random.rand(1 << 22)
+    out = np.empty_like(x)
+    model.byte_time = _best_of(lambda: np.add(x, y, out=out), repeat) / (3 * x.nbytes)
+
+    tiny = np.ones(1)
+    reps = 1000
+    model.dispatch = _best_of(lambda: [np.add(tiny, tiny) for _ in range(reps)], repeat) / reps
+    model.view_dispatch = _best_of(lambda: [tiny[0:] for _ in range(reps)], repeat) / reps
+
+    with ThreadPoolExecutor(model.workers) as ex:
+        model.thread_overhead = _best_of(lambda: ex.submit(int).result(), repeat * 10)
+
+    if processes:
+        from .data_parallel import WorkerPool
+        pool = WorkerPool(2)
+        try:
+            model.process_overhead = _best_of(lambda: pool.request({0: ('unload', None), 1: ('unload', None)}), repeat * 10)
+        finally:
+            pool.close()
+
+    if save:
+        model.save()
+    _default = model
+    return model
+
+
+# ============ EXPLAIN ============
+
+class Explanation:
+    """Per-node estimates for a graph; `str()` renders a table."""
+
+    def __init__(self, rows: List[dict], peak_bytes: Optional[int], model: CostModel):
+        self.rows = rows
+        self.peak_bytes = peak_bytes
+        self.model = model
+
+    @property
+    def total_time(self) -> Optional[float]:
+        times = [r['time'] for r in self.rows]
+        return None if None in times else sum(times)
+
+    @property
+    def total_flops(self) -> Optional[int]:
+        flops = [r['flops'] for r in self.rows]
+        return None if None in flops else sum(flops)
+
+    def __str__(self):
+        def fmt(v, scale=1.0, unit=""):
+            return "?" if v is None else f"{v * scale:,.1f}{unit}"
+
+        lines = [f"{'node':<8}{'prim':<16}{'shape':<22}{'MFLOP':>12}{'MB moved':>12}{'out MB':>10}{'est us':>12}"]
+        for r in self.rows:
+            lines.append(
+                f"{r['name']:<8}{r['prim']:<16}{str(r['shape']):<22}"
+                f"{fmt(r['flops'], 1e-6):>12}{fmt(r['bytes'], 1e-6):>12}"
+                f"{fmt(r['out_bytes'], 1e-6):>10}{fmt(r['time'], 1e6):>12}"
+            )
+        lines.append(f"total {fmt(self.total_time, 1e6, ' us')}, "
+                     f"{fmt(self.total_flops, 1e-6, ' MFLOP')}, "
+                     f"peak live memory {fmt(self.peak_bytes, 1e-6, ' MB')}")
+        return "\n".join(lines)
+
+    __repr__ = __str__
+
+
+def explain(graph: Tensor | Sequence[Tensor], model: Optional[CostModel] = None, itemsize: int = 8) -> Explanation:
+    """
+    Estimated time, FLOPs, bytes moved and output memory of every node in
+    `graph`, plus the peak memory held by live values when run in
+    topological order. `itemsize` is the assumed bytes per element.
+    """
+    model = model or default_model()
+    roots = _as_roots(graph)
+    topo = topo_sort(roots)
+
+    last_use: Dict[Tensor, int] = {}
+    for i, n in enumerate(topo):
+        for p in n.parents:
+            last_use[p] = i
+    for r in roots:
+        last_use[r] = len(topo)
+
+    rows = []
+    live = {}
+    peak = 0
+    known_memory = True
+    temp = 0
+    for i, n in enumerate(topo):
+        if n.parents == ():
+            size = _size(n.shape) * itemsize if _known(n.shape) else None
+            live[n] = size
+        else:
+            cost = node_cost(n, itemsize)
+            rows.append({
+                'node': n,
+                'name': f"t{temp}",
+                'prim': n.prim,
+                'shape': n.shape,
+                'flops': None if cost is None else cost.flops,
+                'bytes': None if cost is None else cost.bytes,
+                'out_bytes': None if cost is None else cost.out_bytes,
+                'time': None if cost is None else model.time(cost),
+            })
+            temp += 1
+            live[n] = None if cost is None else cost.out_bytes
+
+        sizes = list(live.values())
+        if None in sizes:
+            known_memory = False
+        else:
+            peak = max(peak, sum(sizes))
+        for p in n.parents:
+            if last_use.get(p) == i:
+                live.pop(p, None)
+
+    return Explanation(rows, peak if known_memory else None, model)
+
+
+# ============ STRATEGY ============
+
+def choose_strategy(
+    outputs: Tensor | Sequence[Tensor],
+    inputs: Sequence[Tensor],
+    batch_argnums: Sequence[int] = (0,),
+    model: Optional[CostModel] = None,
+    itemsize: int = 8,
+):
+    """
+    Pick 'straight', 'threads' or 'processes' for running `outputs`.
+    Returns `(strategy, estimates)` with the estimated seconds per call of
+    each strategy considered.
+    Graphs that can't be sharded (`data_parallel.cross_shard_node`) always
+    run straight.
+    - straight: dispatch + compute, one thread.
+    - threads: every shard pays dispatch under the GIL, compute splits.
+    - processes: dispatch and compute split, plus pool overhead and
+      copying the arguments and results through shared memory.
+    """
+    model = model or default_model()
+    report = explain(outputs, model, itemsize)
+    if report.total_time is None:
+        return 'straight', {}
+
+    dispatch = len(report.rows) * model.dispatch
+    compute = report.total_time - dispatch
+    estimates = {'straight': report.total_time}
+
+    batch = [inputs[i].shape for i in batch_argnums if i < len(inputs)]
+    if not batch or any(s is None or not s or s[0] is None for s in batch):
+        return 'straight', estimates
+    n = min(model.workers, batch[0][0])
+    if n < 2:
+        return 'straight', estimates
+    from .data_parallel import cross_shard_node
+    roots = _as_roots(outputs)
+    if cross_shard_node(roots, [inputs[i] for i in batch_argnums]) is not None:
+        return 'straight', estimates
+
+    rows = {r['node']: r for r in report.rows}
+    out_bytes = 0
+    for root in roots:
+        if root in rows:
+            out_bytes += rows[root]['out_bytes'] or 0
+        elif _known(root.shape):
+            out_bytes += _size(root.shape) * itemsize
+    io_bytes = sum(_size(t.shape) * itemsize for t in inputs if _known(t.shape)) + out_bytes
+    estimates['threads'] = n * dispatch + compute / n + n * model.thread_overhead
+    estimates['processes'] = (dispatch + compute) / n + model.process_overhead + 2 * io_bytes * model.byte_time
+    return min(estimates, key=estimates.get), estimates
@@ -0,0 +1,550 @@
+"""
+Data-parallel execution of a graph over a persistent pool of processes.
+
+The batch (leading) axis of the sharded inputs is split into contiguous
+row ranges, one per worker. Arrays travel through
+`multiprocessing.shared_memory` blocks that are reused across calls; only
+small descriptors (block name, shape, dtype, row range) are pickled. The
+compiled code object is sent to each worker once.
+
+Each output is combined according to how it depends on the batch axis:
+- `'concat'`: batch-major output, every worker writes its own rows in place.
+- `'sum'`, `'mean'`, `'prod'`, `'max'`, `'min'`, `'all'`, `'any'`: reduction
+  over the batch axis; workers write partials that are reduced here
+  (`'mean'` is weighted by shard size).
+- `'first'`: does not depend on sharded inputs; taken from worker 0.
+Every other node computed from a sharded input must keep rows local on
+axis 0 (elementwise ops, matmul with the sharded operand on the left,
+reductions over other axes, ...). A graph that mixes rows of different
+shards (`x - x.mean(axis=0)`, `z - z[0]`, `x @ x.T`) is rejected with
+ValueError when the runner is built (see `cross_shard_node`).
+"""
+import atexit
+import itertools
+import marshal
+import math
+import os
+import time
+import traceback
+import weakref
+from multiprocessing import get_context, shared_memory
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from .base import Tensor
+from .api import DEFAULT_NAME, lower, load, specialize
+from .build_graph import topo_sort
+from .python_ast import _as_roots
+from .. import metrics
+from ..base import elementwise_ops
+
+REDUCTIONS = ('sum', 'mean', 'prod', 'max', 'min', 'all', 'any')
+
+
+# ============ WORKER SIDE ============
+
+def _worker_main(conn):
+    fns = {}
+    blocks = {}
+
+    def view(name, shape, dtype):
+        shm = blocks.get(name)
+        if shm is None:
+            shm = blocks[name] = shared_memory.SharedMemory(name=name)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    while True:
+        msg = conn.recv()
+        op = msg[0]
+        if op == 'close':
+            break
+        try:
+            if op == 'load':
+                _, key, code, name, const_values, device = msg
+                fns[key] = (load(marshal.loads(code), name, const_values, device=device, instrument=False), device)
+            elif op == 'unload':
+                fns.pop(msg[1], None)
+            elif op == 'drop':
+                for name in msg[1]:
+                    shm = blocks.pop(name, None)
+                    if shm is not None:
+                        shm.close()
+            elif op == 'run':
+                _, key, ins, outs, start, stop, slot = msg
+                fn, device = fns[key]
+                args = []
+                for name, shape, dtype, sharded in ins:
+                    arr = view(name, shape, dtype)
+                    args.append(arr[start:stop] if sharded else arr)
+                if device != 'cpu':
+                    from ..utils import shift_device_
+                    args = [shift_device_(a, device) for a in args]
+                res = fn(*args)
+                res = res if isinstance(res, tuple) else (res,)
+                for (name, shape, dtype, kind), r in zip(outs, res):
+                    if device != 'cpu':
+                        r = shift_device_(r, 'cpu')
+                    out = view(name, shape, dtype)
+                    if kind == 'concat':
+                        dst = out[start:stop]
+                    elif kind == 'first':
+                        if slot != 0:
+                            continue
+                        dst = out
+                    else:
+                        dst = out[slot, ...]
+                    if np.shape(r) != dst.shape:
+                        raise ValueError(f"output has shape {np.shape(r)} for a '{kind}' slot of shape {dst.shape}")
+                    dst[...] = r
+            conn.send(('ok', None))
+        except Exception:
+            conn.send(('err', traceback.format_exc()))
+
+    for shm in blocks.values():
+        shm.close()
+
+
+# ============ POOL ============
+
+class WorkerPool:
+    """Persistent worker processes, each driven over its own pipe."""
+
+    def __init__(self, num_workers: Optional[int] = None, context: Optional[str] = None):
+        ctx = get_context(context)
+        try:
+            # workers must share the parent's tracker; one started lazily inside
+            # a worker would "clean up" blocks the parent still owns
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+        except ImportError:
+            pass
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self._conns = []
+        self._procs = []
+        for _ in range(self.num_workers):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        self.loaded = [set() for _ in range(self.num_workers)]
+
+    def request(self, messages: Dict[int, tuple]):
+        """Send one message per worker id, then wait for every reply."""
+        for w, msg in messages.items():
+            self._conns[w].send(msg)
+        errors = []
+        for w in messages:
+            status, info = self._conns[w].recv()
+            if status != 'ok':
+                errors.append(f"worker {w}:\n{info}")
+        if errors:
+            raise RuntimeError("data-parallel worker failed\n" + "\n".join(errors))
+
+    def close(self):
+        for conn, proc in zip(self._conns, self._procs):
+            try:
+                conn.send(('close',))
+            except (OSError, BrokenPipeError):
+                pass
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+            conn.close()
+        self._conns, self._procs = [], []
+
+
+_pools: Dict[int, WorkerPool] = {}
+
+def get_pool(num_workers: Optional[int] = None) -> WorkerPool:
+    """Shared pool with `num_workers` processes, started on first use."""
+    n = num_workers or os.cpu_count() or 1
+    pool = _pools.get(n)
+    if pool is None:
+        pool = _pools[n] = WorkerPool(n)
+    return pool
+
+@atexit.register
+def _close_pools():
+    for pool in _pools.values():
+        pool.close()
+    _pools.clear()
+
+
+# ============ RUNNER ============
+
+def _reduces_batch_axis(node: Tensor) -> bool:
+    axis = node.params.get('axis')
+    if axis is None:
+        return True
+    axes = (axis,) if isinstance(axis, int) else tuple(axis)
+    ndim = node.parents[0].ndim
+    return any(a == 0 or (ndim is not None and a % ndim == 0) for a in axes)
+
+
+def _dependent(outputs: Sequence[Tensor], sharded: Sequence[Tensor]) -> set:
+    """Nodes of the graph of `outputs` computed from a sharded input."""
+    dependent = set(sharded)
+    for n in topo_sort(list(outputs)):
+        if n not in dependent and any(p in dependent for p in n.parents):
+            dependent.add(n)
+    return dependent
+
+
+def _is_full_slice(index) -> bool:
+    return isinstance(index, slice) and index == slice(None)
+
+
+def _keeps_axis0(axis, ndim: Optional[int]) -> bool:
+    """`axis` (an int or tuple of ints, for an array of `ndim` dimensions) never names axis 0."""
+    if axis is None or ndim is None:
+        return False
+    axes = (axis,) if isinstance(axis, int) else tuple(axis)
+    return all(a % ndim != 0 for a in axes)
+
+
+def _row_local(node: Tensor, dependent: set, rank: Dict[Tensor, Optional[int]]) -> bool:
+    """
+    Whether row i of `node` only reads row i of its sharded operands and its
+    axis 0 is still the batch axis, so per-shard results can be
+    concatenated. Ops not known to be are rejected. `rank` holds the number
+    of dimensions of the nodes seen so far (shapes may be unknown when the
+    batch size is).
+    """
+    prim, params, parents = node.prim, node.params, node.parents
+    ranks = [rank.get(p) for p in parents]
+    if None in ranks:
+        return False
+    first, r0 = parents[0], ranks[0]
+    if prim in elementwise_ops or prim == 'where':
+        # sharded operands keep axis 0 in place; the others must not span it
+        ndim = max(ranks)
+        for p, r in zip(parents, ranks):
+            if p in dependent:
+                if r != ndim:
+                    return False
+            elif r == ndim and (p.shape is None or p.shape[0] != 1):
+                return False
+        rank[node] = ndim
+        return ndim > 0
+    if any(p in dependent for p in parents[1:]):
+        # only the first operand of the ops below may be sharded
+        return False
+    ok = False
+    if prim in REDUCTIONS or prim in ('softmax', 'log_softmax'):
+        ok = _keeps_axis0(params.get('axis'), r0)
+    elif prim in ('matmul', 'dot'):
+        other, r1 = parents[1], ranks[1]
+        # a 1-D first operand has axis 0 contracted
+        ok = r0 >= 2 and (r1 < r0 or (r1 == r0 and (r1 == 2 or (other.shape is not None and other.shape[0] == 1))))
+    elif prim == 'getitem':
+        index = params['index']
+        index = index if isinstance(index, tuple) else (index,)
+        if all(i is None or i is Ellipsis or isinstance(i, (int, slice)) for i in index):
+            if index and index[0] is Ellipsis:
+                ok = sum(i is not None and i is not Ellipsis for i in index) < r0
+            else:
+                ok = not index or _is_full_slice(index[0])
+    elif prim == 'transpose':
+        axes = params.get('axes')
+        ok = r0 == 1 if axes is None else axes[0] % r0 == 0
+    elif prim == 'reshape':
+        new = params.get('shape', params.get('newshape'))
+        new = (new,) if isinstance(new, int) else tuple(new)
+        ok = (first.shape is not None and len(new) > 0 and new[0] == -1 and -1 not in new[1:]
+              and None not in first.shape[1:] and math.prod(new[1:]) == math.prod(first.shape[1:]))
+    elif prim == 'expand_dims':
+        axis = params.get('axis')
+        ok = _keeps_axis0(axis, r0 + (1 if isinstance(axis, int) else len(axis or ())))
+    elif prim == 'squeeze':
+        ok = _keeps_axis0(params.get('axis'), r0)
+    elif prim in ('ascontiguousarray', 'conv', 'conv_transpose'):
+        ok = True  # axis 0 of a conv's x is the batch
+    return ok
+
+
+def cross_shard_node(outputs: Sequence[Tensor], sharded: Sequence[Tensor]) -> Optional[Tensor]:
+    """
+    A node the outputs need that mixes rows of different shards, or None.
+    A reduction over the batch axis is allowed as an output itself (its
+    partials are combined), not as an input to later operations; every
+    other node computed from a sharded input must be `_row_local`.
+    """
+    dependent = _dependent(outputs, sharded)
+    # node -> the first batch reduction it is, or is computed from
+    source: Dict[Tensor, Tensor] = {}
+    rank: Dict[Tensor, Optional[int]] = {}
+    for n in topo_sort(list(outputs)):
+        rank[n] = n.ndim
+        if n.parents == () or n not in dependent:
+            continue
+        upstream = next((source[p] for p in n.parents if p in source), None)
+        if upstream is not None:
+            source[n] = upstream
+        elif n.prim in REDUCTIONS and _reduces_batch_axis(n) \
+                and not any(p in dependent for p in n.parents[1:]):
+            source[n] = n
+        elif not _row_local(n, dependent, rank):
+            return n
+    for o in outputs:
+        if source.get(o, o) is not o:
+            return source[o]
+    return None
+
+
+def output_kinds(outputs: Sequence[Tensor], sharded: Sequence[Tensor]) -> list:
+    """How each output combines across shards (see the module docstring); ValueError if it can't."""
+    bad = cross_shard_node(outputs, sharded)
+    if bad is not None:
+        raise ValueError(
+            f"can't shard the batch axis: the '{bad.prim}' node {bad.name} mixes rows of "
+            f"different shards; run this graph unsharded"
+        )
+    dependent = _dependent(outputs, sharded)
+
+    kinds = []
+    for o in outputs:
+        if o not in dependent:
+            kinds.append('first')
+        elif o.prim in REDUCTIONS and _reduces_batch_axis(o):
+            kinds.append(o.prim)
+        else:
+            kinds.append('concat')
+    return kinds
+
+
+def resolve_kinds(outputs, inputs, batch_argnums, combine=None) -> list:
+    """`output_kinds` for the inputs at `batch_argnums`, with `combine` overrides by output position."""
+    kinds = output_kinds(outputs, [inputs[i] for i in batch_argnums])
+    for i, kind in (combine or {}).items():
+        if kind not in REDUCTIONS + ('concat', 'first'):
+            raise ValueError(f"unknown combine kind '{kind}'")
+        kinds[i] = kind
+    return kinds
+
+
+def combine_partials(stacked, kind: str, sizes):
+    """Reduce per-shard partials stacked on axis 0; `sizes` are the shard row counts."""
+    if kind == 'mean':
+        w = (sizes / sizes.sum()).reshape((-1,) + (1,) * (stacked.ndim - 1))
+        return (stacked * w).sum(axis=0).astype(stacked.dtype, copy=False)
+    return getattr(np, kind)(stacked, axis=0)
+
+
+def shard_bounds(rows: int, workers: int) -> list:
+    n = max(1, min(workers, rows))
+    return [rows * k // n for k in range(n + 1)]
+
+
+def _release(blocks):
+    for shm in blocks.values():
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+    blocks.clear()
+
+
+class DataParallel:
+    """
+    Run a graph with its batch axis sharded over a `WorkerPool`.
+
+    `outputs`/`inputs` describe the graph as for `forward`; `batch_argnums`
+    selects the inputs split along axis 0 (the others are copied whole to
+    every worker). `combine` overrides the inferred per-output kind, by
+    output position. Calls are recorded under `name` (see `xpy.metrics`).
+    """
+    _keys = itertools.count()
+
+    def __init__(
+        self,
+        outputs: Tensor | Sequence[Tensor],
+        inputs: Sequence[Tensor],
+        batch_argnums: Sequence[int] = (0,),
+        num_workers: Optional[int] = None,
+        combine: Optional[Dict[int, str]] = None,
+        device: str = "cpu",
+        pool: Optional[WorkerPool] = None,
+        name: Optional[str] = None,
+    ):
+        self.name = name or DEFAULT_NAME
+        self.multi = isinstance(outputs, (list, tuple))
+        self.outputs = _as_roots(outputs)
+        self.inputs = tuple(inputs)
+        self.batch_argnums = tuple(batch_argnums)
+        self.device = device
+        self.pool = pool or get_pool(num_workers)
+        self.kinds = resolve_kinds(self.outputs, self.inputs, self.batch_argnums, combine)
+
+        started = time.perf_counter()
+        module, self._const_values = lower(list(self.outputs), {}, inputs=self.inputs, name=self.name)
+        self._code = compile(module, filename="compiledfunction", mode="exec")
+        self._local = load(self._code, self.name, self._const_values, device=device, started=started,
+                           instrument=False)
+        self._key = next(self._keys)
+        self._specs: Dict[Any, list] = {}
+        self._blocks: Dict[str, shared_memory.SharedMemory] = {}
+        self._finalizer = weakref.finalize(self, _release, self._blocks)
+
+    # ---- shared memory buffers, grown on demand and reused across calls ----
+
+    def _block(self, role: str, nbytes: int) -> shared_memory.SharedMemory:
+        shm = self._blocks.get(role)
+        if shm is not None and shm.size >= nbytes:
+            return shm
+        if shm is not None:
+            self.pool.request({w: ('drop', [shm.name]) for w in range(self.pool.num_workers)})
+            _release({role: shm})
+        shm = self._blocks[role] = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        return shm
+
+    def _output_specs(self, args, rows: int) -> list:
+        """(shape, dtype) of every output buffer, probed once per input signature on a 1-row shard."""
+        sig = tuple((a.shape[1:] if i in self.batch_argnums else a.shape, a.dtype.str) for i, a in enumerate(args))
+        specs = self._specs.get(sig)
+        if specs is None:
+            probe = [a[:1] if i in self.batch_argnums else a for i, a in enumerate(args)]
+            res = self._local(*probe)
+            res = res if isinstance(res, tuple) else (res,)
+            specs = self._specs[sig] = [(np.shape(r), np.result_type(r)) for r in res]
+        out = []
+        for (shape, dtype), kind in zip(specs, self.kinds):
+            if kind == 'concat':
+                out.append(((rows,) + tuple(shape[1:]), dtype))
+            else:
+                out.append((tuple(shape), dtype))
+        return out
+
+    @metrics.timed
+    def __call__(self, *args):
+        args = [np.asarray(a) for a in args]
+        rows = {args[i].shape[0] for i in self.batch_argnums}
+        if len(rows) != 1:
+            raise ValueError(f"sharded inputs disagree on batch size: {sorted(rows)}")
+        rows = rows.pop()
+        bounds = shard_bounds(rows, self.pool.num_workers)
+        n = len(bounds) - 1
+
+        # ship the code once per worker
+        missing = {w: ('load', self._key, marshal.dumps(self._code), self.name, self._const_values, self.device)
+                   for w in range(n) if self._key not in self.pool.loaded[w]}
+        if missing:
+            self.pool.request(missing)
+            for w in missing:
+                self.pool.loaded[w].add(self._key)
+
+        ins = []
+        for i, a in enumerate(args):
+            shm = self._block(f"in{i}", a.nbytes)
+            np.copyto(np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf), a)
+            ins.append((shm.name, a.shape, a.dtype.str, i in self.batch_argnums))
+
+        outs = []
+        for j, ((shape, dtype), kind) in enumerate(zip(self._output_specs(args, rows), self.kinds)):
+            if kind not in ('concat', 'first'):
+                shape = (n,) + shape
+            shm = self._block(f"out{j}", int(np.prod(shape, dtype=np.int64)) * dtype.itemsize)
+            outs.append((shm.name, shape, dtype.str, kind))
+
+        self.pool.request({
+            w: ('run', self._key, ins, outs, bounds[w], bounds[w + 1], w) for w in range(n)
+        })
+
+        sizes = np.diff(bounds)
+        results = []
+        for j, (name, shape, dtype, kind) in enumerate(outs):
+            buf = np.ndarray(shape, dtype=dtype, buffer=self._blocks[f"out{j}"].buf)
+            results.append(buf.copy() if kind in ('concat', 'first') else combine_partials(buf, kind, sizes))
+        return tuple(results) if self.multi else results[0]
+
+    def close(self):
+        """Free the shared memory blocks and drop the code from the workers."""
+        self.pool.request({w: ('unload', self._key) for w in range(self.pool.num_workers)
+                           if self._key in self.pool.loaded[w]})
+        for loaded in self.pool.loaded:
+            loaded.discard(self._key)
+        names = [shm.name for shm in self._blocks.values()]
+        if names:
+            self.pool.request({w: ('drop', names) for w in range(self.pool.num_workers)})
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ThreadParallel:
+    """
+    The sharding and combining of `DataParallel` on a thread pool in this
+    process. Pays off when the primitives release the GIL (BLAS, large
+    ufuncs); no copies are made, shards are views of the inputs. Calls are
+    recorded under `name` once each, not per shard.
+    """
+
+    def __init__(
+        self,
+        outputs: Tensor | Sequence[Tensor],
+        inputs: Sequence[Tensor],
+        batch_argnums: Sequence[int] = (0,),
+        num_workers: Optional[int] = None,
+        combine: Optional[Dict[int, str]] = None,
+        device: str = "cpu",
+        name: Optional[str] = None,
+    ):
+        from concurrent.futures import ThreadPoolExecutor
+        self.name = name or DEFAULT_NAME
+        self.multi = isinstance(outputs, (list, tuple))
+        self.outputs = _as_roots(outputs)
+        self.inputs = tuple(inputs)
+        self.batch_argnums = tuple(batch_argnums)
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.kinds = resolve_kinds(self.outputs, self.inputs, self.batch_argnums, combine)
+        self._fn = specialize(list(self.outputs), {}, inputs=self.inputs, name=self.name, device=device,
+                              instrument=False)
+        self._executor = ThreadPoolExecutor(self.num_workers)
+
+    def _run(self, args):
+        res = self._fn(*args)
+        return res if isinstance(res, tuple) else (res,)
+
+    @metrics.timed
+    def __call__(self, *args):
+        rows = {args[i].shape[0] for i in self.batch_argnums}
+        if len(rows) != 1:
+            raise ValueError(f"sharded inputs disagree on batch size: {sorted(rows)}")
+        bounds = shard_bounds(rows.pop(), self.num_workers)
+        futures = [
+            self._executor.submit(self._run, [
+                a[start:stop] if i in self.batch_argnums else a for i, a in enumerate(args)
+            ])
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        parts = [f.result() for f in futures]
+
+        from ..backend import get_array_module
+        sizes = np.diff(bounds)
+        results = []
+        for j, kind in enumerate(self.kinds):
+            col = [p[j] for p in parts]
+            lib = get_array_module(*col)
+            if kind == 'concat':
+                results.append(lib.concatenate(col))
+            elif kind == 'first':
+                results.append(col[0])
+            else:
+                results.append(combine_partials(lib.stack(col), kind, sizes))
+        return tuple(results) if self.multi else results[0]
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,29 @@
+"""
+Graph-building counterparts of the registered primitives.
+
+Every name in the op lists of `xpy.base` gets a function here taking the
+operands positionally and the primitive's options as keywords, e.g.
+`exp(x)`, `sum(x, axis=0)`, `clip(x, 0.0, 1.0)`. Non-`Tensor` operands are
+wrapped as constants.
+"""
+from .base import Tensor, as_tensor
+from ..base import (
+    elementwise_ops, linear_algebra_ops, reduction_ops, array_manip_ops,
+    optimization_ops, composite_ops, sparse_ops,
+)
+
+
+def _make(prim: str):
+    def fn(*args, **params):
+        return Tensor.call(*[as_tensor(a) for a in args], prim=prim, params=params)
+    fn.__name__ = fn.__qualname__ = prim
+    fn.__doc__ = f"Graph node for the `{prim}` primitive."
+    return fn
+
+
+__all__ = []
+for _ops in (elementwise_ops, linear_algebra_ops, reduction_ops, array_manip_ops,
+             optimization_ops, composite_ops, sparse_ops):
+    for _prim in _ops:
+        globals()[_prim] = _make(_prim)
+        __all__.append(_prim)
@@ -0,0 +1,165 @@
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def _freeze(v):
+    """
+    Hashable key for a param value; lists/dicts are converted recursively.
+    Values are tagged with their type: 0, False and 0.0 (or a list and a
+    tuple index) compare equal but are different params.
+    """
+    if isinstance(v, (list, tuple)):
+        return (type(v), tuple(_freeze(x) for x in v))
+    if isinstance(v, dict):
+        return (type(v), tuple(sorted((k, _freeze(x)) for k, x in v.items())))
+    hash(v)
+    return (type(v), v)
+
+
+class GraphStore:
+    """
+    Structure-of-arrays computation graph.
+
+    Nodes are dense integer ids handed out in creation order, which is also a
+    valid topological order since a node can only reference existing ids.
+    - `opcodes[i]` indexes `ops` (interned prim names); leaves hold `LEAF`.
+    - parents of node i are `indices[indptr[i]:indptr[i + 1]]` (CSR).
+    - `param_ids[i]` indexes `param_table` (interned keyword dicts, 0 is `{}`).
+    - `shape_ids[i]` indexes `shape_table` (interned shapes).
+    - `values` maps constant leaves to their value; pass them to `build_ast`
+      as `consts` (and to `load`) to bake them in.
+    """
+    LEAF = -1
+
+    __slots__ = (
+        "ops", "_op_ids", "opcodes", "indptr", "indices",
+        "param_table", "_param_ids", "param_ids",
+        "shape_table", "_shape_ids", "shape_ids",
+        "leaves", "values", "roots",
+    )
+
+    def __init__(self):
+        self.ops: List[str] = []
+        self._op_ids: Dict[str, int] = {}
+        self.opcodes = array("i")
+        self.indptr = array("q", [0])
+        self.indices = array("q")
+        self.param_table: List[dict] = [{}]
+        self._param_ids: Dict[Any, int] = {(): 0}
+        self.param_ids = array("i")
+        self.shape_table: List[tuple] = []
+        self._shape_ids: Dict[tuple, int] = {}
+        self.shape_ids = array("i")
+        self.leaves = array("q")
+        self.values: Dict[int, Any] = {}
+        self.roots: Tuple[int, ...] = ()
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def _intern_shape(self, shape) -> int:
+        shape = tuple(shape)
+        sid = self._shape_ids.get(shape)
+        if sid is None:
+            sid = self._shape_ids[shape] = len(self.shape_table)
+            self.shape_table.append(shape)
+        return sid
+
+    def _intern_params(self, params: Optional[dict]) -> int:
+        if not params:
+            return 0
+        try:
+            key = _freeze(params)
+        except TypeError:
+            # unhashable values (arrays) are stored as they come
+            self.param_table.append(dict(params))
+            return len(self.param_table) - 1
+        pid = self._param_ids.get(key)
+        if pid is None:
+            pid = self._param_ids[key] = len(self.param_table)
+            self.param_table.append(dict(params))
+        return pid
+
+    def leaf(self, shape=()) -> int:
+        """Append an input node and return its id."""
+        nid = len(self.opcodes)
+        self.opcodes.append(self.LEAF)
+        self.indptr.append(self.indptr[-1])
+        self.param_ids.append(0)
+        self.shape_ids.append(self._intern_shape(shape))
+        self.leaves.append(nid)
+        return nid
+
+    def node(self, prim: str, parents: Sequence[int], params: Optional[dict] = None, shape=()) -> int:
+        """Append `prim(*parents, **params)` and return its id."""
+        nid = len(self.opcodes)
+        if parents and (min(parents) < 0 or max(parents) >= nid):
+            raise IndexError(f"parent ids {tuple(parents)} must refer to existing nodes")
+        op = self._op_ids.get(prim)
+        if op is None:
+            op = self._op_ids[prim] = len(self.ops)
+            self.ops.append(prim)
+        self.opcodes.append(op)
+        self.indices.extend(parents)
+        self.indptr.append(len(self.indices))
+        self.param_ids.append(self._intern_params(params))
+        self.shape_ids.append(self._intern_shape(shape))
+        return nid
+
+    def is_leaf(self, nid: int) -> bool:
+        return self.opcodes[nid] == self.LEAF
+
+    def prim(self, nid: int) -> Optional[str]:
+        op = self.opcodes[nid]
+        return None if op == self.LEAF else self.ops[op]
+
+    def parents(self, nid: int):
+        return self.indices[self.indptr[nid]:self.indptr[nid + 1]]
+
+    def params(self, nid: int) -> dict:
+        return self.param_table[self.param_ids[nid]]
+
+    def shape(self, nid: int) -> tuple:
+        return self.shape_table[self.shape_ids[nid]]
+
+    def topo_order(self, roots: Optional[Sequence[int]] = None, stop=()) -> List[int]:
+        """
+        Ids reachable from `roots` (default `self.roots`) in ascending order.
+        Nodes in `stop` are kept but their parents are not followed.
+        """
+        roots = self.roots if roots is None else roots
+        stop = set(stop)
+        live = bytearray(len(self.opcodes))
+        for r in roots:
+            live[r] = 1
+        indptr, indices = self.indptr, self.indices
+        # ids are topologically ordered, so one backward sweep marks everything
+        for nid in range(max(roots, default=-1), -1, -1):
+            if live[nid] and nid not in stop:
+                for k in range(indptr[nid], indptr[nid + 1]):
+                    live[indices[k]] = 1
+        return [i for i in range(len(live)) if live[i]]
+
+    @classmethod
+    def from_tensors(cls, roots) -> "GraphStore":
+        """Copy a `Tensor` graph into a store; `store.roots` holds the root ids."""
+        from .build_graph import topo_sort
+        if not isinstance(roots, (list, tuple)):
+            roots = (roots,)
+        store = cls()
+        ids = {}
+        for n in topo_sort(roots):
+            if n.parents == ():
+                ids[n] = store.leaf(n.shape)
+                if n.is_const:
+                    store.values[ids[n]] = n.value
+            else:
+                ids[n] = store.node(n.prim, [ids[p] for p in n.parents], n.params, n.shape)
+        store.roots = tuple(ids[r] for r in roots)
+        return store
+
+    def nbytes(self) -> int:
+        """Bytes held by the per-node arrays (interned tables excluded)."""
+        return sum(a.buffer_info()[1] * a.itemsize for a in (
+            self.opcodes, self.indptr, self.indices, self.param_ids, self.shape_ids, self.leaves,
+        ))
@@ -0,0 +1,220 @@
+"""
+Incremental compilation with memoized code fragments.
+
+The topological order of a graph is cut into fragments at content-defined
+boundaries (a node whose local hash - prim and params - hits a mask), so
+an edit moves at most the boundaries around it. Every fragment is
+compiled into its own function taking the values it reads from outside
+and returning the ones read later. Its code depends only on its canonical
+form (prims, params and operand positions with external values
+numbered by first use), which is the cache key: recompiling an edited
+graph regenerates only fragments whose form changed. The compiled
+function runs the fragments over a slot list, as `interpreter.Program` does.
+"""
+import ast
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .api import DEFAULT_NAME
+from .base import Tensor
+from .build_graph import topo_sort
+from .python_ast import Subgraph, _as_roots, _function_def, _kwds, _prim_assign, _return
+from ..base import primitives
+from .. import metrics
+
+FRAGMENT_SIZE = 32
+
+
+def _key(value):
+    """Hashable key of a param value that tells apart everything that renders to different code."""
+    if isinstance(value, Subgraph):
+        return ('subgraph', _canonical(
+            [n for n in topo_sort(list(value.outputs), stop=list(value.inputs)) if n not in value.inputs],
+            value.inputs, value.outputs,
+        ))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_key(v) for v in value)
+    if isinstance(value, dict):
+        return ('dict',) + tuple(sorted((k, _key(v)) for k, v in value.items()))
+    try:
+        hash(value)
+    except TypeError:
+        return ('object', id(value))  # unhashable (arrays): only the same object matches
+    return (type(value).__name__, value)
+
+
+def _canonical(nodes: Sequence[Tensor], inputs: Sequence[Tensor], outputs: Sequence[Tensor]) -> tuple:
+    """Structure of `nodes` with operands as ('in', i) / ('t', j) references."""
+    ref = {t: ('in', i) for i, t in enumerate(inputs)}
+    body = []
+    for j, n in enumerate(nodes):
+        body.append((n.prim, _key(dict(n.params)), tuple(ref[p] for p in n.parents)))
+        ref[n] = ('t', j)
+    return (len(inputs), tuple(body), tuple(ref[o] for o in outputs))
+
+
+def _local_hash(node: Tensor) -> int:
+    return hash((node.prim, _key(dict(node.params))))
+
+
+class Fragment:
+    __slots__ = ('nodes', 'inputs', 'outputs', 'key')
+
+    def __init__(self, nodes: List[Tensor]):
+        self.nodes = nodes
+        self.inputs: List[Tensor] = []
+        self.outputs: List[Tensor] = []
+        self.key = None
+
+
+def split_fragments(topo: Sequence[Tensor], roots: Sequence[Tensor], skip, size: int = FRAGMENT_SIZE) -> List[Fragment]:
+    """
+    Cut the computed nodes of `topo` (not in `skip`) into fragments of about
+    `size` nodes, and fill in each fragment's external inputs, exported
+    outputs and cache key.
+    """
+    mask = max(1, size)
+    fragments, current = [], []
+    for n in topo:
+        if n.parents == () or n in skip:
+            continue
+        current.append(n)
+        if (len(current) >= mask // 4 and _local_hash(n) % mask == 0) or len(current) >= 4 * mask:
+            fragments.append(Fragment(current))
+            current = []
+    if current:
+        fragments.append(Fragment(current))
+
+    home = {n: i for i, f in enumerate(fragments) for n in f.nodes}
+    exported = {r for r in roots}
+    for i, f in enumerate(fragments):
+        seen = {}
+        for n in f.nodes:
+            for p in n.parents:
+                if home.get(p) != i:
+                    seen.setdefault(p, None)
+                    exported.add(p)
+        f.inputs = list(seen)
+    for f in fragments:
+        f.outputs = [n for n in f.nodes if n in exported]
+        f.key = _canonical(f.nodes, f.inputs, f.outputs)
+    return fragments
+
+
+def _fragment_code(f: Fragment):
+    helpers = []
+    args = [f"a{i}" for i in range(len(f.inputs))]
+    names = dict(zip(f.inputs, args))
+    body = []
+    for j, n in enumerate(f.nodes):
+        names[n] = f"t{j}"
+        body.append(_prim_assign(names[n], n.prim, [names[p] for p in n.parents], _kwds(n.params, helpers)))
+    body.append(_return([names[o] for o in f.outputs], as_tuple=True))
+    module = ast.Module(body=helpers + [_function_def("fragment", args, body)], type_ignores=[])
+    return compile(ast.fix_missing_locations(module), filename="fragment", mode="exec")
+
+
+class IncrementalCompiler:
+    """
+    Compiles graphs through a cache of fragment code shared by every graph
+    it compiles. `stats` describes the last compilation; `hits`/`misses`
+    count fragments over the compiler's lifetime. At most `max_fragments`
+    are kept (least recently used are evicted).
+    """
+
+    def __init__(self, fragment_size: int = FRAGMENT_SIZE, max_fragments: int = 4096):
+        self.fragment_size = fragment_size
+        self.max_fragments = max_fragments
+        self.cache: "OrderedDict[Any, list]" = OrderedDict()  # key -> [code, {device: fn}]
+        self.hits = 0
+        self.misses = 0
+        self.stats: Dict[str, int] = {}
+
+    def _function(self, f: Fragment, device: str) -> Callable:
+        entry = self.cache.get(f.key)
+        if entry is None:
+            self.misses += 1
+            self.stats['compiled'] += 1
+            entry = self.cache[f.key] = [_fragment_code(f), {}]
+            if len(self.cache) > self.max_fragments:
+                self.cache.popitem(last=False)
+        else:
+            self.hits += 1
+            self.stats['reused'] += 1
+            self.cache.move_to_end(f.key)
+        code, fns = entry
+        fn = fns.get(device)
+        if fn is None:
+            namespace = {"PRIM": primitives(device)}
+            exec(code, namespace)
+            fn = fns[device] = namespace["fragment"]
+        return fn
+
+    def compile(
+        self,
+        outputs: Tensor | Sequence[Tensor],
+        inputs: Optional[Sequence[Tensor]] = None,
+        device: str = "cpu",
+        name: Optional[str] = None,
+    ) -> Callable:
+        """
+        A function of `inputs` (default: non-constant leaves in graph order)
+        computing `outputs`; constant leaves are bound in. It is
+        instrumented under `name` (see `xpy.metrics`).
+        """
+        name = name or DEFAULT_NAME
+        started = time.perf_counter()
+        roots = _as_roots(outputs)
+        topo = topo_sort(roots, stop=list(inputs or ()))
+        if inputs is None:
+            inputs = [n for n in topo if n.parents == () and not n.is_const]
+        inputs = list(inputs)
+
+        slot = {t: i for i, t in enumerate(inputs)}
+        consts = {}
+        for n in topo:
+            if n.parents == () and n not in slot:
+                if not n.is_const:
+                    raise ValueError("graph has a leaf that is neither an input nor a constant")
+                slot[n] = len(slot)
+                consts[slot[n]] = n.value
+
+        self.stats = {'fragments': 0, 'reused': 0, 'compiled': 0}
+        steps = []
+        for f in split_fragments(topo, roots, set(slot), self.fragment_size):
+            for o in f.outputs:
+                slot[o] = len(slot)
+            steps.append((self._function(f, device), [slot[t] for t in f.inputs], [slot[o] for o in f.outputs]))
+        self.stats['fragments'] = len(steps)
+
+        num_inputs, num_slots = len(inputs), len(slot)
+        out_slots = [slot[r] for r in roots]
+        multi = len(roots) > 1
+
+        def run(*args):
+            if len(args) != num_inputs:
+                raise TypeError(f"expected {num_inputs} arguments ({len(args)} given)")
+            slots = [None] * num_slots
+            slots[:num_inputs] = args
+            for s, v in consts.items():
+                slots[s] = v
+            for fn, ins, outs in steps:
+                for s, v in zip(outs, fn(*[slots[i] for i in ins])):
+                    slots[s] = v
+            if multi:
+                return tuple(slots[s] for s in out_slots)
+            return slots[out_slots[0]]
+
+        metrics.registry.get(name).record_compile(time.perf_counter() - started)
+        return metrics.instrument(run, name)
+
+
+_default: Optional[IncrementalCompiler] = None
+
+def default_compiler() -> IncrementalCompiler:
+    """The process-wide compiler used by `forward(incremental=True)`."""
+    global _default
+    if _default is None:
+        _default = IncrementalCompiler()
+    return _default
@@ -0,0 +1,183 @@
+"""
+Tiered execution: interpret a graph first, compile it once it is hot.
+
+`flatten` turns a graph into a `Program`: a flat list of instructions
+`(opcode, input slots, output slot, params)` in topological order over a
+register file of slots. Running it is one loop over the primitive table,
+with no `build_ast`/`compile`/`exec` up front. `Tiered` counts calls and
+swaps in the compiled function from `forward` after `threshold` calls.
+"""
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .api import DEFAULT_NAME, specialize
+from .base import Tensor
+from .build_graph import topo_sort
+from .python_ast import Subgraph, _as_roots
+from ..base import primitives
+from .. import metrics
+
+# calls served by the interpreter before a graph is compiled
+DEFAULT_THRESHOLD = int(os.environ.get("XPY_TIER_THRESHOLD", 10))
+
+
+class Program:
+    """
+    Flattened graph. Slots `0..len(inputs)-1` hold the arguments, then the
+    constants, then one slot per instruction. After each instruction the
+    slots read for the last time are cleared so temporaries are released
+    as in compiled code.
+    """
+    __slots__ = ('opcodes', 'in_slots', 'out_slots', 'params', 'dead',
+                 'num_slots', 'num_inputs', 'consts', 'outputs', 'as_tuple', '_tables')
+
+    def __init__(self):
+        self.opcodes: List[str] = []
+        self.in_slots: List[tuple] = []
+        self.out_slots: List[int] = []
+        self.params: List[dict] = []
+        self.dead: List[tuple] = []
+        self.num_slots = 0
+        self.num_inputs = 0
+        self.consts: Dict[int, Any] = {}
+        self.outputs: tuple = ()
+        self.as_tuple = False
+        self._tables: Dict[str, list] = {}
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def resolve(self, device: str) -> list:
+        """Primitive functions for every instruction, looked up once per device."""
+        fns = self._tables.get(device)
+        if fns is None:
+            table = primitives(device)
+            fns = self._tables[device] = [getattr(table, op) for op in self.opcodes]
+        return fns
+
+    def run(self, args: Sequence[Any], device: str = "cpu"):
+        if len(args) != self.num_inputs:
+            raise TypeError(f"program takes {self.num_inputs} arguments ({len(args)} given)")
+        slots = [None] * self.num_slots
+        slots[:self.num_inputs] = args
+        for slot, value in self.consts.items():
+            slots[slot] = value
+        for fn, ins, out, params, dead in zip(self.resolve(device), self.in_slots, self.out_slots, self.params, self.dead):
+            slots[out] = fn(*[slots[i] for i in ins], **params)
+            for i in dead:
+                slots[i] = None
+        if len(self.outputs) == 1 and not self.as_tuple:
+            return slots[self.outputs[0]]
+        return tuple(slots[i] for i in self.outputs)
+
+    def __call__(self, *args):
+        from ..backend import get_array_module
+        device = "cuda" if args and get_array_module(*args).__name__ == "cupy" else "cpu"
+        return self.run(args, device)
+
+
+def flatten(
+    outputs: Tensor | Sequence[Tensor],
+    inputs: Optional[Sequence[Tensor]] = None,
+    as_tuple: bool = False,
+) -> Program:
+    """
+    Flatten the graph of `outputs` into a `Program`.
+    - `inputs` are the argument nodes (default: non-constant leaves in
+      graph order, as `build_ast`); interior nodes listed are cut points.
+    - constant leaves are stored in the program.
+    - `Subgraph` params (loop bodies, branches) are flattened too and
+      passed to the primitive as interpreted callables.
+    """
+    roots = _as_roots(outputs)
+    topo = topo_sort(roots, stop=list(inputs or ()))
+    if inputs is None:
+        inputs = [n for n in topo if n.parents == () and not n.is_const]
+
+    prog = Program()
+    prog.as_tuple = as_tuple
+    slot = {t: i for i, t in enumerate(inputs)}
+    prog.num_inputs = len(slot)
+    count = len(slot)
+    for n in topo:
+        if n in slot:
+            continue
+        if n.parents == ():
+            if not n.is_const:
+                raise ValueError("graph has a leaf that is neither an input nor a constant")
+            slot[n] = count
+            prog.consts[count] = n.value
+            count += 1
+
+    last_read = {}
+    for n in topo:
+        if n in slot:
+            continue
+        slot[n] = count
+        count += 1
+        prog.opcodes.append(n.prim)
+        prog.in_slots.append(tuple(slot[p] for p in n.parents))
+        prog.out_slots.append(slot[n])
+        prog.params.append({
+            k: flatten(v.outputs, v.inputs, as_tuple=True) if isinstance(v, Subgraph) else v
+            for k, v in n.params.items()
+        })
+        for p in n.parents:
+            last_read[slot[p]] = len(prog.opcodes) - 1
+    prog.num_slots = count
+
+    kept = {slot[r] for r in roots} | set(prog.consts)
+    dead = [[] for _ in prog.opcodes]
+    for s, i in last_read.items():
+        if s not in kept:
+            dead[i].append(s)
+    prog.dead = [tuple(d) for d in dead]
+    prog.outputs = tuple(slot[r] for r in roots)
+    return prog
+
+
+class Tiered:
+    """
+    Run a graph with the interpreter until it has been called `threshold`
+    times, then compile it with `specialize` and call the compiled function
+    from then on. `threshold=0` compiles on the first call. Calls are
+    recorded under `name` in either tier (see `xpy.metrics`).
+    """
+
+    def __init__(
+        self,
+        outputs: Tensor | Sequence[Tensor],
+        inputs: Optional[Sequence[Tensor]] = None,
+        name: Optional[str] = None,
+        device: str = "cpu",
+        threshold: Optional[int] = None,
+    ):
+        self.outputs = outputs
+        self.inputs = inputs
+        self.name = name or DEFAULT_NAME
+        self.device = device
+        self.threshold = DEFAULT_THRESHOLD if threshold is None else threshold
+        self.calls = 0
+        self.program = flatten(outputs, inputs)
+        self.compiled: Optional[Callable] = None
+
+    @property
+    def tier(self) -> str:
+        return "interpreted" if self.compiled is None else "compiled"
+
+    def promote(self) -> Callable:
+        """Compile now; the program is dropped."""
+        if self.compiled is None:
+            self.compiled = specialize(self.outputs, {}, inputs=self.inputs, name=self.name,
+                                       device=self.device, instrument=False)
+            self.program = None
+        return self.compiled
+
+    @metrics.timed
+    def __call__(self, *args):
+        self.calls += 1
+        if self.compiled is not None:
+            return self.compiled(*args)
+        if self.calls > self.threshold:
+            return self.promote()(*args)
+        return self.program.run(args, self.device)
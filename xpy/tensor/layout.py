@@ -0,0 +1,231 @@
+"""
+Layout planning for view-producing primitives.
+
+Strides (in elements) are propagated through the graph assuming every
+leaf and every computed array is C-contiguous; `transpose`, `reshape`,
+`expand_dims`, `squeeze`, `broadcast_to` and basic `getitem` produce
+views whose strides follow from their operand's. `plan_layout` then
+rewrites the graph:
+- `broadcast_to` feeding an operation that broadcasts implicitly to the
+  same result shape is bypassed.
+- each operand of a stride-sensitive consumer that is not in a layout the
+  consumer can use directly gets one `ascontiguousarray`, placed at the
+  smallest array along its chain of views from which the remaining views
+  keep a usable layout. Copies at the same point are shared.
+"""
+import math
+from typing import Dict, Optional, Sequence, Tuple
+
+from .base import Tensor
+from .build_graph import topo_sort, VIEW_OPS
+from .python_ast import _as_roots
+from .utils import infer_shape
+from ..base import elementwise_ops
+
+Strides = Optional[Tuple[int, ...]]
+
+# consumers that broadcast their operands implicitly
+IMPLICIT_BROADCAST = frozenset(elementwise_ops) | {'where', 'matmul'}
+
+
+def contiguous_strides(shape) -> Tuple[int, ...]:
+    strides = []
+    step = 1
+    for n in reversed(shape):
+        strides.append(step)
+        step *= n
+    return tuple(reversed(strides))
+
+
+def _blas_ready(shape, strides) -> bool:
+    """The trailing matrix is row- or column-major with a valid leading dimension."""
+    if len(shape) < 2:
+        return len(shape) == 0 or shape[0] == 1 or strides[0] == 1
+    (m, n), (sm, sn) = shape[-2:], strides[-2:]
+    if m == 1 or n == 1:
+        return (sn == 1 or n == 1) or (sm == 1 or m == 1)
+    return (sn == 1 and sm >= n) or (sm == 1 and sn >= m)
+
+
+# consumer prim -> predicate on (shape, strides) of an operand
+STRIDE_SENSITIVE = {
+    'matmul': _blas_ready,
+    'dot': _blas_ready,
+}
+
+
+def _reshape_strides(shape, strides, newshape) -> Strides:
+    """Strides of `reshape` as a view, or None when NumPy has to copy (as `_attempt_nocopy_reshape`)."""
+    old = [(n, s) for n, s in zip(shape, strides) if n != 1]
+    if not old:
+        return (0,) * len(newshape)
+    if math.prod(newshape) == 0:
+        return contiguous_strides(newshape)
+    oldn, olds = [n for n, _ in old], [s for _, s in old]
+    new = list(newshape)
+    out = [0] * len(new)
+    oi, oj, ni, nj = 0, 1, 0, 1
+    while ni < len(new) and oi < len(oldn):
+        np_, op = new[ni], oldn[oi]
+        while np_ != op:
+            if np_ < op:
+                np_ *= new[nj]
+                nj += 1
+            else:
+                op *= oldn[oj]
+                oj += 1
+        for ok in range(oi, oj - 1):
+            if olds[ok] != oldn[ok + 1] * olds[ok + 1]:
+                return None
+        out[nj - 1] = olds[oj - 1]
+        for nk in range(nj - 1, ni, -1):
+            out[nk - 1] = out[nk] * new[nk]
+        ni, nj, oi, oj = nj, nj + 1, oj, oj + 1
+    return tuple(out)
+
+
+def _getitem_strides(shape, strides, index) -> Strides:
+    import numpy as np
+    parts = index if isinstance(index, tuple) else (index,)
+    if not all(p is None or p is Ellipsis or isinstance(p, (int, slice)) for p in parts):
+        return None  # advanced indexing copies
+    # basic indexing never touches data, so a fake strided view is enough
+    base = np.lib.stride_tricks.as_strided(np.empty(1, dtype=np.int8), shape, strides)
+    return base[index].strides
+
+
+def view_strides(node: Tensor, strides: Strides) -> Strides:
+    """
+    Strides of a view node given its operand's, None when unknown.
+    Non-view nodes are contiguous.
+    """
+    if node.shape is None:
+        return None
+    prim, params = node.prim, node.params
+    if prim not in VIEW_OPS:
+        return contiguous_strides(node.shape)
+    src = node.parents[0].shape
+    if strides is None or src is None:
+        return None
+    if prim == 'transpose':
+        axes = params.get('axes')
+        return strides[::-1] if axes is None else tuple(strides[a] for a in axes)
+    if prim == 'reshape':
+        # a reshape that can't be a view copies into a contiguous array
+        return _reshape_strides(src, strides, node.shape) or contiguous_strides(node.shape)
+    if prim == 'expand_dims':
+        axis = params['axis']
+        axes = {a % len(node.shape) for a in ((axis,) if isinstance(axis, int) else axis)}
+        it = iter(strides)
+        return tuple(0 if i in axes else next(it) for i in range(len(node.shape)))
+    if prim == 'squeeze':
+        axis = params.get('axis')
+        if axis is None:
+            return tuple(st for n, st in zip(src, strides) if n != 1)
+        axes = {a % len(src) for a in ((axis,) if isinstance(axis, int) else axis)}
+        return tuple(st for i, st in enumerate(strides) if i not in axes)
+    if prim == 'broadcast_to':
+        lead = len(node.shape) - len(src)
+        return (0,) * lead + tuple(
+            0 if n != m else s for n, m, s in zip(node.shape[lead:], src, strides)
+        )
+    return _getitem_strides(src, strides, params['index'])
+
+
+def _rebuild(node: Tensor, parents) -> Tensor:
+    if all(a is b for a, b in zip(parents, node.parents)):
+        return node
+    out = Tensor.call(*parents, prim=node.prim, params=node.params)
+    out.shape = node.shape
+    return out
+
+
+class _Planner:
+    def __init__(self):
+        self.strides: Dict[Tensor, Strides] = {}
+        self.copies: Dict[Tensor, Tensor] = {}
+
+    def stride_of(self, node: Tensor) -> Strides:
+        s = self.strides.get(node)
+        if s is None and node not in self.strides:
+            if node.parents == ():
+                s = None if node.shape is None else contiguous_strides(node.shape)
+            else:
+                s = view_strides(node, self.stride_of(node.parents[0]) if node.parents else None)
+            self.strides[node] = s
+        return s
+
+    def bypass_broadcast(self, node: Tensor, parents: list) -> list:
+        if node.prim not in IMPLICIT_BROADCAST or node.shape is None:
+            return parents
+        for i, p in enumerate(parents):
+            if p.prim != 'broadcast_to':
+                continue
+            trial = parents[:i] + [p.parents[0]] + parents[i + 1:]
+            if infer_shape(node.prim, [t.shape for t in trial], node.params) == tuple(node.shape):
+                parents = trial
+        return parents
+
+    def contiguous_operand(self, operand: Tensor, ok) -> Tensor:
+        """`operand`, or a copy of it in a layout accepted by `ok`."""
+        strides = self.stride_of(operand)
+        if strides is None or ok(operand.shape, strides):
+            return operand
+
+        # chain of views from the operand back to the first non-view node;
+        # copying above a broadcast can't remove its zero strides
+        chain = [operand]
+        while chain[-1].prim in VIEW_OPS and chain[-1].prim != 'broadcast_to' \
+                and chain[-1].parents and chain[-1].parents[0].shape is not None:
+            chain.append(chain[-1].parents[0])
+
+        best = None
+        for k, point in enumerate(chain):
+            # copy `point`, then replay the views between it and the operand
+            s = contiguous_strides(point.shape)
+            for view in reversed(chain[:k]):
+                s = view_strides(view, s)
+                if s is None:
+                    break
+            if s is None or not ok(operand.shape, s):
+                continue
+            size = math.prod(point.shape)
+            if best is None or size <= best[0]:
+                best = (size, k)
+        if best is None:
+            return operand
+
+        k = best[1]
+        point = chain[k]
+        copy = self.copies.get(point)
+        if copy is None:
+            copy = self.copies[point] = Tensor.call(point, prim='ascontiguousarray')
+            self.strides[copy] = contiguous_strides(point.shape)
+        out = copy
+        for view in reversed(chain[:k]):
+            out = _rebuild(view, [out] + list(view.parents[1:]))
+        return out
+
+
+def plan_layout(outputs: Tensor | Sequence[Tensor]):
+    """
+    Rewrite the graph of `outputs` as described in the module docstring and
+    return the new outputs in the same structure. Leaves are kept as they
+    are, unchanged nodes are reused; graphs with unknown shapes are left
+    alone where the layout can't be derived.
+    """
+    roots = _as_roots(outputs)
+    planner = _Planner()
+    new: Dict[Tensor, Tensor] = {}
+    for node in topo_sort(roots):
+        if node.parents == ():
+            new[node] = node
+            continue
+        parents = planner.bypass_broadcast(node, [new[p] for p in node.parents])
+        ok = STRIDE_SENSITIVE.get(node.prim)
+        if ok is not None:
+            parents = [planner.contiguous_operand(p, ok) for p in parents]
+        new[node] = _rebuild(node, parents)
+
+    result = [new[r] for r in roots]
+    return result if isinstance(outputs, (list, tuple)) else result[0]
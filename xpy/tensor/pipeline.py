@@ -0,0 +1,177 @@
+"""
+Streaming execution with input prefetch.
+
+A background thread pulls batches from an iterator, converts them into a
+small ring of reusable buffers (dtype conversion, then `shift_device_`)
+and queues them while the compiled function runs on the previous batch,
+so loading overlaps compute. Time the consumer spends waiting for a batch
+is reported as stall time.
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+import numpy as np
+
+from ..backend import get_array_module
+from ..utils import shift_device_
+
+_END = object()
+
+
+class _Failure:
+    __slots__ = ('exc',)
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class StreamStats:
+    """Counters of a `Stream`; times are in seconds."""
+    __slots__ = ('batches', 'stall_time', 'compute_time', 'prepare_time')
+
+    def __init__(self):
+        self.batches = 0
+        self.stall_time = 0.0    # consumer waiting for a prepared batch
+        self.compute_time = 0.0  # inside the function
+        self.prepare_time = 0.0  # loading + conversion on the background thread
+
+    @property
+    def stall_fraction(self) -> float:
+        total = self.stall_time + self.compute_time
+        return self.stall_time / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__} | {'stall_fraction': self.stall_fraction}
+
+    def __repr__(self):
+        return (f"StreamStats(batches={self.batches}, stall={self.stall_time:.3f}s, "
+                f"compute={self.compute_time:.3f}s, prepare={self.prepare_time:.3f}s)")
+
+
+class Stream:
+    """
+    Iterate `fn(*batch)` over `batches`, preparing up to `depth` batches ahead.
+    - a batch is an array or a tuple/list of arrays (the arguments of `fn`).
+    - `dtype` is one dtype for every argument or one per argument
+      (None keeps the argument's dtype).
+    - `depth + 1` buffer sets are reused round-robin; outputs that alias an
+      input buffer are copied before they are yielded.
+    - `stats` is updated as the stream is consumed.
+    """
+
+    def __init__(
+        self,
+        fn: Callable,
+        batches: Iterable,
+        depth: int = 2,
+        dtype: Any = None,
+        device: str = "cpu",
+    ):
+        if depth < 1:
+            raise ValueError("depth must be >= 1")
+        self.fn = fn
+        self.batches = batches
+        self.depth = depth
+        self.dtype = dtype
+        self.device = device
+        self.stats = StreamStats()
+
+    def _dtype(self, i: int):
+        if isinstance(self.dtype, (list, tuple)):
+            return self.dtype[i]
+        return self.dtype
+
+    def _prepare(self, batch, buffers: list) -> tuple:
+        """Copy `batch` into the host buffers in `buffers` (reallocated on shape/dtype change)."""
+        args = batch if isinstance(batch, (tuple, list)) else (batch,)
+        while len(buffers) < len(args):
+            buffers.append(None)
+        out = []
+        for i, a in enumerate(args):
+            a = np.asarray(a)
+            dtype = np.dtype(self._dtype(i) or a.dtype)
+            host, dev = buffers[i] or (None, None)
+            if host is None or host.shape != a.shape or host.dtype != dtype:
+                host, dev = np.empty(a.shape, dtype=dtype), None
+            np.copyto(host, a, casting='unsafe')
+            if self.device == "cpu":
+                dev = host
+            elif dev is None:
+                dev = shift_device_(host, self.device)
+            else:
+                dev.set(host)
+            buffers[i] = (host, dev)
+            out.append(dev)
+        return tuple(out)
+
+    def _producer(self, ready: queue.Queue, free: queue.Queue, stop: threading.Event):
+        try:
+            for batch in self.batches:
+                slot = free.get()
+                if stop.is_set():
+                    return
+                t0 = time.perf_counter()
+                args = self._prepare(batch, slot)
+                self.stats.prepare_time += time.perf_counter() - t0
+                ready.put((slot, args))
+                if stop.is_set():
+                    return
+            ready.put(_END)
+        except BaseException as e:
+            ready.put(_Failure(e))
+
+    @staticmethod
+    def _detach(out, args):
+        def own(o):
+            # host or device arrays: a cupy output can be a view, the input itself or a donated buffer
+            if not (isinstance(o, np.ndarray) or hasattr(o, '__cuda_array_interface__')):
+                return o
+            lib = get_array_module(o)
+            if any(isinstance(a, type(o)) and lib.may_share_memory(o, a) for a in args):
+                return o.copy()
+            return o
+        return tuple(own(o) for o in out) if isinstance(out, tuple) else own(out)
+
+    def __iter__(self):
+        # the ring has one more slot than the queue so the producer never
+        # blocks on `ready` while holding a buffer the consumer needs
+        ready = queue.Queue(maxsize=self.depth + 1)
+        free = queue.Queue()
+        for _ in range(self.depth + 1):
+            free.put([])
+        stop = threading.Event()
+        thread = threading.Thread(target=self._producer, args=(ready, free, stop), daemon=True)
+        thread.start()
+        stats = self.stats
+        try:
+            while True:
+                t0 = time.perf_counter()
+                item = ready.get()
+                stats.stall_time += time.perf_counter() - t0
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exc
+                slot, args = item
+                t0 = time.perf_counter()
+                out = self._detach(self.fn(*args), args)
+                stats.compute_time += time.perf_counter() - t0
+                stats.batches += 1
+                free.put(slot)
+                yield out
+        finally:
+            stop.set()
+            free.put([])  # wake the producer if it waits for a buffer
+
+
+def stream(
+    fn: Callable,
+    batches: Iterable,
+    depth: int = 2,
+    dtype: Any = None,
+    device: str = "cpu",
+) -> Stream:
+    """`Stream(fn, batches, ...)`: iterate it to get `fn`'s outputs batch by batch."""
+    return Stream(fn, batches, depth=depth, dtype=dtype, device=device)
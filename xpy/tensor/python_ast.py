@@ -1,8 +1,9 @@
 import ast
-from typing import Sequence, Any, Optional
-from .base import Tensor
-from ..base import Primitives
-from .build_graph import topo_sort, auto_index_leaves, assign_names
+from typing import Sequence, Optional
+import numpy as np
+from .base import Tensor, literal_to_ast
+from .build_graph import topo_sort, auto_index_leaves, assign_names, VIEW_OPS
+from .graph_store import GraphStore
 
 
 def _as_roots(root):
@@ -11,82 +12,295 @@ def _as_roots(root):
     return (root,)
 
 
+class Subgraph:
+    """
+    A graph used as a parameter of another node (loop bodies, branches).
+    - `inputs` become the helper's arguments, `outputs` are always returned
+      as a tuple.
+    - `build_ast` emits it once as a module-level helper function; calling
+      the object directly compiles it on first use (used for eager evaluation).
+    """
+    __slots__ = ('inputs', 'outputs', '_fns')
+
+    def __init__(self, inputs: Sequence[Tensor], outputs: Sequence[Tensor]):
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self._fns = {}
+
+    def function_def(self, name: str, helpers: list) -> ast.FunctionDef:
+        return _graph_function(self.outputs, name, self.inputs, None, helpers, as_tuple=True)
+
+    def __call__(self, *args):
+        from ..backend import get_array_module
+        from ..base import primitives
+        device = "cuda" if get_array_module(*args).__name__ == "cupy" else "cpu"
+        fn = self._fns.get(device)
+        if fn is None:
+            helpers = []
+            func_def = self.function_def("subgraph", helpers)
+            module = ast.fix_missing_locations(ast.Module(body=helpers + [func_def], type_ignores=[]))
+            namespace = {"PRIM": primitives(device)}
+            exec(compile(module, filename="subgraph", mode="exec"), namespace)
+            fn = self._fns[device] = namespace["subgraph"]
+        return fn(*args)
+
+
+def _prim_assign(target: str, prim: str, args: Sequence[str], kwds: dict) -> ast.Assign:
+    """`target = PRIM.<prim>(*args, **kwds)` where `kwds` already holds AST nodes."""
+    call = ast.Call(
+        func=ast.Attribute(
+            value=ast.Name(id="PRIM", ctx=ast.Load()),
+            attr=prim,
+            ctx=ast.Load(),
+        ),
+        args=[ast.Name(id=a, ctx=ast.Load()) for a in args],
+        keywords=[ast.keyword(k, v) for k, v in kwds.items()],
+    )
+    return ast.Assign(targets=[ast.Name(id=target, ctx=ast.Store())], value=call)
+
+
+def _return(names: Sequence[str], as_tuple: bool = False) -> ast.Return:
+    if len(names) == 1 and not as_tuple:
+        return ast.Return(value=ast.Name(id=names[0], ctx=ast.Load()))
+    return ast.Return(value=ast.Tuple(
+        elts=[ast.Name(id=n, ctx=ast.Load()) for n in names],
+        ctx=ast.Load(),
+    ))
+
+
+def _function_def(name: str, args: Sequence[str], body: list) -> ast.FunctionDef:
+    return ast.FunctionDef(
+        name=name,
+        args=ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg(arg=a) for a in args],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[],
+        ),
+        body=body,
+        decorator_list=[],
+    )
+
+
+def _wrap_consts(name: str, func_def: ast.FunctionDef, const_names: Sequence[str]) -> ast.FunctionDef:
+    if not const_names:
+        return func_def
+    return _function_def(
+        f"make_{name}",
+        const_names,
+        [func_def, ast.Return(value=ast.Name(id=name, ctx=ast.Load()))],
+    )
+
+
+def _kwds(params: dict, helpers: list) -> dict:
+    """
+    AST keywords for a node's params. `Subgraph` values are emitted once as
+    module-level helper functions (appended to `helpers`) and passed by name.
+    """
+    kwds = {}
+    for k, v in params.items():
+        if isinstance(v, Subgraph):
+            index = len(helpers)
+            helper = f"_sub{index}"
+            helpers.append(None)  # reserve the slot; nested subgraphs append after it
+            helpers[index] = v.function_def(helper, helpers)
+            kwds[k] = ast.Name(id=helper, ctx=ast.Load())
+        else:
+            kwds[k] = literal_to_ast(v)
+    return kwds
+
+
+def _writes_out(prim: str) -> bool:
+    """Primitives that take `out=` and stay correct when it overlaps an operand (elementwise ufuncs)."""
+    from ..base import elementwise_ops
+    return prim in elementwise_ops and isinstance(getattr(np, prim, None), np.ufunc)
+
+
+def _value_dtype(value):
+    """dtype of a baked value, or None; Python scalars stay weakly typed (their type), as NumPy treats them."""
+    if isinstance(value, (int, float, complex)) and not isinstance(value, bool):
+        return type(value)
+    dtype = getattr(value, 'dtype', None)
+    if dtype is None:
+        try:
+            dtype = np.result_type(value)
+        except TypeError:
+            return None
+    return dtype
+
+
+def _result_dtypes(topo, known: dict) -> dict:
+    """
+    Result dtypes of the nodes of `topo` that resolve from `known` (node ->
+    dtype) and constant leaves: views keep their operand's, ufuncs follow
+    NumPy's type resolution. Other nodes are left out.
+    """
+    out = dict(known)
+    for n in topo:
+        if n in out:
+            continue
+        if n.parents == ():
+            if n.is_const:
+                out[n] = _value_dtype(n.value)
+            continue
+        operands = [out.get(p) for p in n.parents]
+        if any(o is None for o in operands):
+            continue
+        if n.prim in VIEW_OPS:
+            out[n] = operands[0]
+            continue
+        ufunc = getattr(np, n.prim, None)
+        if isinstance(ufunc, np.ufunc) and ufunc.nout == 1 and ufunc.nin == len(operands) and not n.params:
+            try:
+                out[n] = ufunc.resolve_dtypes(tuple(operands) + (None,))[-1]
+            except Exception:
+                pass
+    return out
+
+
+def _donations(topo, roots, donate, skip, dtypes: dict) -> dict:
+    """
+    Map output nodes to the donated input they can be written into: a
+    ufunc result of the same shape and of exactly the input's dtype
+    (resolved from `dtypes`, node -> dtype of the inputs), computed no
+    earlier than the last read of the input or of any view of it. Each
+    input is used at most once. An output whose dtype can't be resolved is
+    not donated, so donating never changes what is returned.
+    """
+    position = {n: i for i, n in enumerate(topo)}
+    alias = {d: d for d in donate}
+    last = {d: -1 for d in donate}
+    for i, n in enumerate(topo):
+        for p in n.parents:
+            if p in alias:
+                last[alias[p]] = i
+        if n.prim in VIEW_OPS and n.parents and n.parents[0] in alias:
+            alias[n] = alias[n.parents[0]]
+    for r in roots:
+        if r in alias:
+            last[alias[r]] = len(topo)
+
+    result = _result_dtypes(topo, dtypes)
+
+    def same_dtype(r, d):
+        return isinstance(result.get(r), np.dtype) and result[r] == dtypes.get(d)
+
+    free = list(donate)
+    out = {}
+    for r in roots:
+        if r in out or r in skip or r.parents == () or r.shape is None or not _writes_out(r.prim):
+            continue
+        for d in free:
+            if d.shape is not None and tuple(d.shape) == tuple(r.shape) and last[d] <= position[r] \
+                    and same_dtype(r, d):
+                out[r] = d
+                free.remove(d)
+                break
+    return out
+
+
 def build_ast(
-    root: Tensor | Sequence[Tensor],
+    root: Tensor | Sequence[Tensor] | GraphStore,
     name: Optional[str] = None,
-    inputs: Optional[Sequence[Tensor]] = None
+    inputs: Optional[Sequence[Tensor]] = None,
+    consts: Optional[Sequence[Tensor]] = None,
+    donate: Sequence[Tensor] = (),
+    dtypes: Optional[dict] = None,
 ) -> ast.Module:
     """
     Build a Python AST for a computation graph rooted at `root`.
     - `inputs` can be specified explicitly to control function signature.
+      Interior nodes may be listed too; their parents are then not emitted.
+    - `consts` are nodes whose values are known ahead of time. Their parents
+      are not emitted; the function is wrapped in a `make_<name>(c0, c1, ...)`
+      factory that closes over the values.
+    - `donate` lists inputs whose buffers the function may overwrite:
+      same-shape elementwise outputs are written into them with `out=`
+      (see `_donations`). The caller must not use a donated array after the
+      call. `dtypes`, mapping the inputs (and constants) to their dtypes,
+      is required with `donate`: an output is only donated a buffer of its
+      own result dtype.
+    - `root` may also be a `GraphStore`, in which case `inputs`/`consts` are node ids.
     """
     name = name or "compiledfunction"
-    roots = _as_roots(root)
+    helpers = []
+    if donate and dtypes is None:
+        raise ValueError("donate needs the dtypes of the inputs")
+    if isinstance(root, GraphStore):
+        if donate:
+            raise ValueError("donate is not supported for GraphStore graphs")
+        func_def = _build_ast_store(root, name, inputs, consts, helpers)
+    else:
+        func_def = _graph_function(_as_roots(root), name, inputs, consts, helpers, donate=donate, dtypes=dtypes)
+    return ast.fix_missing_locations(ast.Module(body=helpers + [func_def], type_ignores=[]))
+
+
+def _graph_function(roots, name, inputs, consts, helpers, as_tuple=False, donate=(), dtypes=None) -> ast.FunctionDef:
+    consts = list(consts or ())
 
     # Auto index leaves for temp variables
     auto_index_leaves(roots)
-    topo = topo_sort(roots)
-    names = assign_names(topo)
+    topo = topo_sort(roots, stop=consts + list(inputs or ()))
+    names = assign_names(topo, consts)
+    is_const = set(consts)
 
     body = []
 
     # Map leaves in inputs to their function argument names
     if inputs is not None:
-        input_names = {t: names[t] for t in inputs}
+        # inputs pruned from the graph still keep their slot in the signature
+        input_names = {t: names.get(t, f"u{i}") for i, t in enumerate(inputs)}
     else:
-        input_names = {t: names[t] for t in topo if t.parents == ()}
+        input_names = {t: names[t] for t in topo if t.parents == () and t not in is_const}
+
+    for d in donate:
+        if d not in input_names:
+            raise ValueError("donated tensors must be function inputs")
+    donations = _donations(topo, roots, donate, is_const | set(input_names), dtypes) if donate else {}
 
     # Generate AST for all intermediate nodes
     for node in topo:
-        if node.parents == ():  # skip leaves
+        # skip leaves, baked values and interior nodes passed in as inputs
+        if node.parents == () or node in is_const or node in input_names:
             continue
+        # If parent is a function input, use its argument name; else use temp var
+        args = [input_names.get(p, names[p]) for p in node.parents]
+        kwds = _kwds(node.params, helpers)
+        if node in donations:
+            kwds['out'] = ast.Name(id=input_names[donations[node]], ctx=ast.Load())
+        body.append(_prim_assign(names[node], node.prim, args, kwds))
 
-        call = ast.Call(
-            func=ast.Attribute(
-                value=ast.Name(id="PRIM", ctx=ast.Load()),
-                attr=node.prim,
-                ctx=ast.Load(),
-            ),
-            args=[
-                # If parent is a function input, use its argument name; else use temp var
-                ast.Name(id=input_names.get(p, names[p]), ctx=ast.Load())
-                for p in node.parents
-            ],
-            keywords=[ast.keyword(k, v) for k, v in node.kwds.items()],
-        )
-
-        body.append(
-            ast.Assign(
-                targets=[ast.Name(id=names[node], ctx=ast.Store())],
-                value=call,
-            )
-        )
-
-    # Return statement
-    if len(roots) == 1:
-        ret = ast.Name(id=names[roots[0]], ctx=ast.Load())
-    else:
-        ret = ast.Tuple(
-            elts=[ast.Name(id=names[r], ctx=ast.Load()) for r in roots],
-            ctx=ast.Load(),
-        )
-    body.append(ast.Return(value=ret))
+    body.append(_return([input_names.get(r, names[r]) for r in roots], as_tuple))
 
     # Function arguments
-    func_args = [ast.arg(arg=input_names[t]) for t in (inputs or [n for n in topo if n.parents == ()])]
+    func_args = [input_names[t] for t in (inputs or list(input_names))]
+    return _wrap_consts(name, _function_def(name, func_args, body), [names[c] for c in consts])
 
-    func_def = ast.FunctionDef(
-        name=name,
-        args=ast.arguments(
-            posonlyargs=[],
-            args=func_args,
-            kwonlyargs=[],
-            kw_defaults=[],
-            defaults=[],
-        ),
-        body=body,
-        decorator_list=[],
-    )
 
-    return ast.fix_missing_locations(ast.Module(body=[func_def], type_ignores=[]))
+def _build_ast_store(store: GraphStore, name: str, inputs, consts, helpers) -> ast.FunctionDef:
+    """`build_ast` over a `GraphStore`, reading opcodes and CSR parents directly."""
+    consts = list(consts or ())
+    order = topo_sort(store, stop=consts)
+
+    names = {c: f"c{i}" for i, c in enumerate(consts)}
+    for ordinal, nid in enumerate(store.leaves):
+        names.setdefault(nid, f"x{ordinal}")
+
+    body = []
+    ops, opcodes, indptr, indices = store.ops, store.opcodes, store.indptr, store.indices
+    for nid in order:
+        op = opcodes[nid]
+        if op == GraphStore.LEAF or nid in names:
+            continue
+        names[nid] = f"t{nid}"
+        args = [names[indices[k]] for k in range(indptr[nid], indptr[nid + 1])]
+        body.append(_prim_assign(names[nid], ops[op], args, _kwds(store.params(nid), helpers)))
+
+    body.append(_return([names[r] for r in store.roots]))
 
+    if inputs is None:
+        is_const = set(consts)
+        inputs = [n for n in order if opcodes[n] == GraphStore.LEAF and n not in is_const]
+    func_def = _function_def(name, [names[n] for n in inputs], body)
+    return _wrap_consts(name, func_def, [names[c] for c in consts])
@@ -0,0 +1,121 @@
+import functools
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from .base import Tensor, as_tensor
+from .api import specialize
+from .. import metrics
+
+
+def _is_array(value) -> bool:
+    import numpy as np
+    from ..sparse import SparseMatrix
+    if isinstance(value, (np.ndarray, SparseMatrix)):
+        return True
+    return hasattr(value, "__cuda_array_interface__")
+
+
+class Traced:
+    """
+    Callable produced by `trace`.
+
+    Array arguments become placeholder `Tensor`s; every other argument
+    (and all keyword arguments) is static and part of the cache key.
+    The traced-and-compiled function is cached per signature, so repeated
+    calls with the same shapes/dtypes/static values skip tracing.
+    `donate` are positional argument indices whose arrays the compiled
+    code may overwrite (see `build_ast`).
+    """
+
+    def __init__(self, fn: Callable, device: str = "cpu", donate: Sequence[int] = ()):
+        functools.update_wrapper(self, fn)
+        self.fn = fn
+        self.device = device
+        self.donate = tuple(donate)
+        self.cache: Dict[Any, Callable] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def signature(self, args, kwargs) -> Tuple:
+        key = []
+        for a in args:
+            if _is_array(a):
+                key.append(("array", type(a), tuple(a.shape), a.dtype.str))
+            else:
+                # 1, 1.0 and True compare equal but trace to different graphs
+                key.append(("static", type(a), a))
+        key.append(tuple(sorted((k, type(v), v) for k, v in kwargs.items())))
+        key = tuple(key)
+        try:
+            hash(key)
+        except TypeError:
+            raise TypeError(f"{self.__name__}: non-array arguments must be hashable to be traced") from None
+        return key
+
+    def graph(self, *args, **kwargs):
+        """
+        Run the Python function on placeholders.
+        Returns `(inputs, outputs, multi)`: the placeholder leaves, the output
+        nodes and whether the function returned a tuple/list.
+        """
+        inputs = []
+        targs = []
+        for a in args:
+            if _is_array(a):
+                t = Tensor(shape=tuple(a.shape))
+                inputs.append(t)
+                targs.append(t)
+            else:
+                targs.append(a)
+
+        out = self.fn(*targs, **kwargs)
+        multi = isinstance(out, (tuple, list))
+        outputs = [as_tensor(o) for o in (out if multi else (out,))]
+        return inputs, outputs, multi
+
+    @property
+    def compiled_name(self) -> str:
+        return self.fn.__name__ if self.fn.__name__.isidentifier() else "traced"
+
+    def compile(self, *args, **kwargs) -> Callable:
+        inputs, outputs, multi = self.graph(*args, **kwargs)
+        name = self.compiled_name
+        # donated positions among the array arguments only
+        arrays = [i for i, a in enumerate(args) if _is_array(a)]
+        donate = [arrays.index(i) for i in self.donate if i in arrays]
+        dtypes = [args[i].dtype for i in arrays] if donate else None
+        compiled = specialize(outputs, {}, inputs=inputs, name=name, device=self.device, donate=donate, dtypes=dtypes)
+        if multi and len(outputs) == 1:
+            return lambda *a: (compiled(*a),)
+        return compiled
+
+    def __call__(self, *args, **kwargs):
+        key = self.signature(args, kwargs)
+        compiled = self.cache.get(key)
+        metrics.registry.get(self.compiled_name).record_cache(compiled is not None)
+        if compiled is None:
+            self.misses += 1
+            compiled = self.cache[key] = self.compile(*args, **kwargs)
+        else:
+            self.hits += 1
+        return compiled(*[a for a in args if _is_array(a)])
+
+    def cache_info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.cache)}
+
+    def clear_cache(self):
+        self.cache.clear()
+        self.hits = self.misses = 0
+
+
+def trace(fn: Optional[Callable] = None, *, device: str = "cpu", donate: Sequence[int] = ()):
+    """
+    Trace `fn` into a graph on first call and compile it; usable as
+    `@trace` or `@trace(device="cuda")`.
+    - Tensor operators (`+`, `@`, `[]`, ...) and `xpy.tensor.functions`
+      map onto the registered primitives.
+    - `donate` marks positional arguments whose buffers may be reused for
+      outputs of the same shape and dtype; donated arrays must not be used
+      after the call.
+    """
+    if fn is None:
+        return lambda f: Traced(f, device=device, donate=donate)
+    return Traced(fn, device=device, donate=donate)
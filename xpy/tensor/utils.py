@@ -43,14 +43,34 @@ def broadcast_shape(shape1, shape2):
 
 
 def matmul_shape(shape1, shape2):
-    import numpy as np
     """
     Infer the result shape of a matmul operation given two input shapes.
 
     """
-    dummy1 = np.empty(shape1, dtype=bool)
-    dummy2 = np.empty(shape2, dtype=bool)
-    return (dummy1 @ dummy2).shape
+    a, b = tuple(shape1), tuple(shape2)
+    if not a or not b:
+        raise ShapeError("matmul does not accept 0-d operands")
+    vec_a, vec_b = len(a) == 1, len(b) == 1
+    if vec_a:
+        a = (1,) + a
+    if vec_b:
+        b = b + (1,)
+    if a[-1] != b[-2]:
+        raise ShapeError(f"matmul: contraction mismatch {tuple(shape1)} @ {tuple(shape2)}")
+    out = broadcast_shape(a[:-2], b[:-2]) + (a[-2], b[-1])
+    if vec_a:
+        out = out[:-2] + out[-1:]
+    if vec_b:
+        out = out[:-1]
+    return out
+
+def dot_shape(shape1, shape2):
+    a, b = tuple(shape1), tuple(shape2)
+    if not a or not b:
+        return broadcast_shape(a, b)
+    if a[-1] != b[-2 if len(b) > 1 else -1]:
+        raise ShapeError(f"dot: contraction mismatch {a} . {b}")
+    return a[:-1] + b[:-2] + b[-1:] if len(b) > 1 else a[:-1]
 
 
 def reshape_shape(input_shape, new_shape):
@@ -183,3 +203,174 @@ def infer_getitem_shape(shape, index):
    import numpy as np
    dummy = np.empty(shape)
    return dummy[*index].shape
+
+
+def conv_shape(x_shape, w_shape, stride=1, padding=0, dilation=1):
+    from ..convolution import conv_params
+    nd = len(x_shape) - 2
+    if nd < 1 or len(w_shape) != len(x_shape):
+        raise ShapeError(f"conv expects x (N, C, *spatial) and w (C_out, C_in, *kernel), "
+                         f"got {x_shape} and {w_shape}")
+    if x_shape[1] != w_shape[1]:
+        raise ShapeError(f"channel mismatch: x has {x_shape[1]}, w expects {w_shape[1]}")
+    stride, padding, dilation = conv_params(nd, stride, padding, dilation)
+
+    out = []
+    for n, k, s, (b, a), d in zip(x_shape[2:], w_shape[2:], stride, padding, dilation):
+        span = d * (k - 1) + 1
+        if n + b + a < span:
+            raise ShapeError(f"kernel span {span} larger than padded input {n + b + a}")
+        out.append((n + b + a - span) // s + 1)
+    return (x_shape[0], w_shape[0]) + tuple(out)
+
+def conv_transpose_shape(x_shape, w_shape, stride=1, padding=0, dilation=1, output_padding=0):
+    from ..convolution import conv_params
+    nd = len(x_shape) - 2
+    if nd < 1 or len(w_shape) != len(x_shape):
+        raise ShapeError(f"conv_transpose expects x (N, C, *spatial) and w (C_in, C_out, *kernel), "
+                         f"got {x_shape} and {w_shape}")
+    if x_shape[1] != w_shape[0]:
+        raise ShapeError(f"channel mismatch: x has {x_shape[1]}, w expects {w_shape[0]}")
+    stride, padding, dilation = conv_params(nd, stride, padding, dilation)
+    if isinstance(output_padding, int):
+        output_padding = (output_padding,) * nd
+
+    out = []
+    for n, k, s, (b, a), d, op in zip(x_shape[2:], w_shape[2:], stride, padding, dilation, output_padding):
+        out.append((n - 1) * s - b - a + d * (k - 1) + 1 + op)
+    return (x_shape[0], w_shape[1]) + tuple(out)
+
+
+# ============ SHAPE RULES ============
+# prim name -> rule(shapes, params) giving the output shape of a graph node
+
+def _elementwise_rule(shapes, params):
+    out = tuple(shapes[0])
+    for s in shapes[1:]:
+        out = broadcast_shape(out, s)
+    return out
+
+def _reduction_rule(shapes, params):
+    return reduced_shape(tuple(shapes[0]), params.get('axis'), params.get('keepdims', False))
+
+def _max_min_rule(shapes, params):
+    return max_min_shape(tuple(shapes[0]), params.get('axis'), params.get('keepdims', False))
+
+def _reshape_rule(shapes, params):
+    new = params.get('shape', params.get('newshape'))
+    return reshape_shape(shapes[0], (new,) if isinstance(new, int) else new)
+
+def _transpose_rule(shapes, params):
+    axes = params.get('axes')
+    shape = tuple(shapes[0])
+    if axes is None:
+        return shape[::-1]
+    return tuple(shape[a] for a in axes)
+
+def _expand_dims_rule(shapes, params):
+    axis = params['axis']
+    axes = (axis,) if isinstance(axis, int) else tuple(axis)
+    ndim = len(shapes[0]) + len(axes)
+    axes = {a % ndim for a in axes}
+    it = iter(shapes[0])
+    return tuple(1 if i in axes else next(it) for i in range(ndim))
+
+def _squeeze_rule(shapes, params):
+    shape = tuple(shapes[0])
+    axis = params.get('axis')
+    if axis is None:
+        return tuple(s for s in shape if s != 1)
+    axes = {a % len(shape) for a in ((axis,) if isinstance(axis, int) else axis)}
+    return tuple(s for i, s in enumerate(shape) if i not in axes)
+
+def _tensordot_rule(shapes, params):
+    a, b = tuple(shapes[0]), tuple(shapes[1])
+    axes = params.get('axes', 2)
+    if isinstance(axes, int):
+        axes_a, axes_b = list(range(len(a) - axes, len(a))), list(range(axes))
+    else:
+        axes_a, axes_b = axes
+        axes_a = [axes_a] if isinstance(axes_a, int) else list(axes_a)
+        axes_b = [axes_b] if isinstance(axes_b, int) else list(axes_b)
+    axes_a = [x % len(a) for x in axes_a]
+    axes_b = [x % len(b) for x in axes_b]
+    if [a[i] for i in axes_a] != [b[i] for i in axes_b]:
+        raise ShapeError(f"tensordot: contraction mismatch {a} and {b} over {axes}")
+    return tuple(s for i, s in enumerate(a) if i not in axes_a) \
+        + tuple(s for i, s in enumerate(b) if i not in axes_b)
+
+def _trace_rule(shapes, params):
+    shape = tuple(shapes[0])
+    a1, a2 = params.get('axis1', 0) % len(shape), params.get('axis2', 1) % len(shape)
+    return tuple(s for i, s in enumerate(shape) if i not in (a1, a2))
+
+def _diag_rule(shapes, params):
+    shape, k = tuple(shapes[0]), params.get('k', 0)
+    if len(shape) == 1:
+        return (shape[0] + abs(k),) * 2
+    rows, cols = shape
+    return (max(0, min(rows, cols - k) if k >= 0 else min(rows + k, cols)),)
+
+def _getitem_rule(shapes, params):
+    import numpy as np
+    # zero-stride view: indexing it costs nothing regardless of the shape
+    return np.broadcast_to(np.empty((), dtype=bool), shapes[0])[params['index']].shape
+
+def _conv_rule(shapes, params):
+    return conv_shape(shapes[0], shapes[1], **params)
+
+def _conv_transpose_rule(shapes, params):
+    return conv_transpose_shape(shapes[0], shapes[1], **params)
+
+def _sparse_rule(shapes, params):
+    # sparse matrices are 2-D; once converted, every other rule applies to them unchanged
+    if len(shapes[0]) != 2:
+        raise ShapeError(f"sparse matrices are 2-D, got shape {tuple(shapes[0])}")
+    return tuple(shapes[0])
+
+def _build_shape_rules():
+    from ..base import elementwise_ops
+    rules = {name: _elementwise_rule for name in elementwise_ops}
+    rules.update({name: _reduction_rule for name in ('sum', 'mean', 'prod', 'all', 'any')})
+    rules.update({
+        'max': _max_min_rule,
+        'min': _max_min_rule,
+        'matmul': lambda shapes, params: matmul_shape(shapes[0], shapes[1]),
+        'dot': lambda shapes, params: dot_shape(shapes[0], shapes[1]),
+        'tensordot': _tensordot_rule,
+        'transpose': _transpose_rule,
+        'trace': _trace_rule,
+        'diag': _diag_rule,
+        'reshape': _reshape_rule,
+        'expand_dims': _expand_dims_rule,
+        'squeeze': _squeeze_rule,
+        'where': _elementwise_rule,
+        'broadcast_to': lambda shapes, params: tuple(params['shape']),
+        'ascontiguousarray': lambda shapes, params: tuple(shapes[0]),
+        'stack_operands': lambda shapes, params: stack_shape([tuple(s) for s in shapes], params.get('axis', 0)),
+        'getitem': _getitem_rule,
+        'tocsr': _sparse_rule,
+        'tocoo': _sparse_rule,
+        'todense': lambda shapes, params: tuple(shapes[0]),
+        'softmax': _elementwise_rule,
+        'log_softmax': _elementwise_rule,
+        'conv': _conv_rule,
+        'conv_transpose': _conv_transpose_rule,
+    })
+    return rules
+
+shape_rules = _build_shape_rules()
+
+def infer_shape(prim, shapes, params):
+    """
+    Output shape of `prim` applied to operands of `shapes`, or None when
+    there is no rule or an operand shape is unknown. Shapes are advisory:
+    a mismatch also yields None and the primitive reports it at run time.
+    """
+    rule = shape_rules.get(prim)
+    if rule is None or any(s is None for s in shapes):
+        return None
+    try:
+        return tuple(rule(shapes, params))
+    except Exception:
+        return None